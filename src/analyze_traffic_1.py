@@ -1,20 +1,23 @@
-import pyshark
-import matplotlib.pyplot as plt
 import numpy as np
-import statistics
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
 
+import instrumentation
+from local_network import LOCAL_PREFIXES, local_network
+from metrics_io import write_metrics
+from packet_index import PROTOCOL_CLASSES, TRANSPORTS, load_index
+from packet_table import Column, inter_arrival_stats
+from pcap_reader import parse_tcp_flags_hex, read_packets, resolve_backend, split_capture
+from streaming_stats import InterArrivalTracker, RunningStats
+from timeseries import Timeline, TimelineBuffer
+from tcp_flags import (TCP_FLAGS_MAPPING, bit_counts, combination_counts, flag_histogram,
+                       histogram_from_counts, report_counts)
+
 # We assume that 'src' is the current folder.
 # 'res' is one level up: ../res
 out_dir = "../res"
-os.makedirs(out_dir, exist_ok=True)
-
-def save_fig(filename):
-    """Save the current matplotlib figure to the 'res' folder and close it."""
-    plt.ticklabel_format(style='plain', axis='y', useOffset=False)
-    plt.savefig(os.path.join(out_dir, filename), dpi=300)
-    plt.close()
 
 # Dictionary mapping application names to their .pcapng files
 # We assume that 'data' is also one level up: ../data
@@ -26,295 +29,353 @@ apps = {
     "zoom": "../data/zoom_videoConferencing.pcapng"
 }
 
-my_local_ip = "192.168.126.132"
-
-TCP_FLAGS_MAPPING = {
-    0x02: "SYN",
-    0x12: "SYN-ACK",
-    0x10: "ACK",
-    0x18: "ACK-PUSH",
-    0x11: "ACK-FIN",
-}
+# "native" reads the capture bytes directly, "pyshark" dissects with tshark,
+# "auto" uses the native reader and falls back to pyshark for unknown formats
+CAPTURE_BACKEND = "auto"
 
 def parse_tcp_flags(hex_str):
-    try:
-        val = int(hex_str, 16)
-        return TCP_FLAGS_MAPPING.get(val, "OTHER")
-    except:
-        return "OTHER"
-
-# Initialize data structure
-app_data = {}
-for app in apps:
-    app_data[app] = {
-        "tcp_window_sizes": [],
-        "ttl_values": [],
+    """Report name (TCP_FLAGS_MAPPING) of a tshark flags string such as '0x0018'."""
+    return TCP_FLAGS_MAPPING.get(parse_tcp_flags_hex(hex_str), "OTHER")
+
+# Captures larger than this are split into byte ranges that are read in parallel
+SPLIT_BYTES = 256 * 1024 * 1024
+
+
+def new_app_entry(streaming=False, timeline=False):
+    """Return an empty per-application result entry.
+
+    By default per-packet values are kept in columns. With streaming=True they
+    are only fed to one-pass accumulators, so memory stays constant however
+    long the capture is. With timeline=True the packets are also counted per
+    time interval (timeseries.Timeline).
+    """
+    if streaming:
+        values = {
+            "tcp_window_sizes": RunningStats(),
+            "ttl_values": RunningStats(),
+            "packet_sizes": RunningStats(),
+            "timestamps": InterArrivalTracker(),
+        }
+    else:
+        values = {
+            "tcp_window_sizes": Column('I'),
+            "ttl_values": Column('B'),
+            "packet_sizes": Column('I'),
+            "timestamps": Column('d'),
+        }
+    return {
+        "tcp_window_sizes": values["tcp_window_sizes"],
+        "ttl_values": values["ttl_values"],
         "incoming": 0,
         "outgoing": 0,
+        "ipv6_packets": 0,
         "protocol_counts": Counter(),
         "tls_count": 0,
-        "packet_sizes": [],
-        "timestamps": [],
+        "packet_sizes": values["packet_sizes"],
+        "timestamps": values["timestamps"],
         "total_packets": 0,
         "flow_volume": 0,
         "flow_size": 0,
         "avg_inter_arrival": 0,
         "bits_per_second": 0,
+        "tcp_flags": Counter(),         # TCP flags value (0-511) -> packets
         "tcp_flags_detail": Counter(),
+        "tcp_flag_bits": {},
+        "tcp_flag_combinations": {},
+        "timeline": Timeline() if timeline else None,
     }
 
-# Process each .pcapng file using pyshark
-for app, pcap_file in apps.items():
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False)
-    for pkt in cap:
-        app_data[app]["total_packets"] += 1
-
-        try:
-            size = int(pkt.length)
-            app_data[app]["packet_sizes"].append(size)
-        except:
-            pass
-
-        try:
-            ts = float(pkt.sniff_timestamp)
-            app_data[app]["timestamps"].append(ts)
-        except:
-            pass
-
-        try:
-            src_ip = pkt.ip.src
-            if src_ip == my_local_ip:
-                app_data[app]["outgoing"] += 1
-            else:
-                app_data[app]["incoming"] += 1
-        except:
-            pass
-
-        # Protocol identification
-        if 'QUIC' in pkt:
-            app_data[app]["protocol_counts"]['QUIC'] += 1
-        elif 'TLS' in pkt or 'SSL' in pkt:
-            app_data[app]["protocol_counts"]['TLS'] += 1
-            app_data[app]["tls_count"] += 1
-        elif 'TCP' in pkt:
-            app_data[app]["protocol_counts"]['TCP'] += 1
-        elif 'UDP' in pkt:
-            app_data[app]["protocol_counts"]['UDP'] += 1
-        else:
-            app_data[app]["protocol_counts"]['OTHER'] += 1
-
-        # TCP-specific fields
-        if 'TCP' in pkt:
-            try:
-                win_size = int(pkt.tcp.window_size)
-                app_data[app]["tcp_window_sizes"].append(win_size)
-            except:
-                pass
-
-            try:
-                flags_hex = pkt.tcp.flags
-                parsed_flag = parse_tcp_flags(flags_hex)
-                app_data[app]["tcp_flags_detail"][parsed_flag] += 1
-            except:
-                pass
-
-        # TTL if IP layer exists
-        if 'IP' in pkt:
-            try:
-                ttl = int(pkt.ip.ttl)
-                app_data[app]["ttl_values"].append(ttl)
-            except:
-                pass
-    cap.close()
-
-# Compute flow stats
-for app in app_data:
-    app_data[app]["flow_size"] = app_data[app]["total_packets"]
-    if app_data[app]["packet_sizes"]:
-        app_data[app]["flow_volume"] = sum(app_data[app]["packet_sizes"])
-    else:
-        app_data[app]["flow_volume"] = 0
-
-    times_sorted = sorted(app_data[app]["timestamps"])
-    if len(times_sorted) > 1:
-        diffs = [times_sorted[i + 1] - times_sorted[i] for i in range(len(times_sorted) - 1)]
-        app_data[app]["avg_inter_arrival"] = statistics.mean(diffs)
 
-        duration = times_sorted[-1] - times_sorted[0]
-        if duration > 0:
-            total_bytes = sum(app_data[app]["packet_sizes"])
-            app_data[app]["bits_per_second"] = (total_bytes * 8) / duration
-        else:
-            app_data[app]["bits_per_second"] = 0
+def analyze_capture(pcap_file, backend=CAPTURE_BACKEND, byte_range=None, streaming=False, local=LOCAL_PREFIXES,
+                    timeline=False):
+    """Read one capture (or one byte range of it) and return its app entry.
+
+    IPv4 and IPv6 packets sent from a 'local' prefix (see local_network.py)
+    count as outgoing, the other IP packets as incoming.
+    """
+    entry = new_app_entry(streaming, timeline)
+    is_local = local_network(local).is_local
+    bins = TimelineBuffer(entry["timeline"]) if timeline else None
+    with instrumentation.stage("accumulate"):
+        for pkt in read_packets(pcap_file, backend, byte_range):
+            entry["total_packets"] += 1
+
+            if pkt.length is not None:
+                entry["packet_sizes"].append(pkt.length)
+
+            direction = 0
+            if pkt.ip_version is not None:
+                if is_local(pkt.src_ip):
+                    entry["outgoing"] += 1
+                    direction = 1
+                else:
+                    entry["incoming"] += 1
+                    direction = -1
+                if pkt.ip_version == 6:
+                    entry["ipv6_packets"] += 1
+
+            if pkt.timestamp is not None:
+                entry["timestamps"].append(pkt.timestamp)
+                if bins is not None:
+                    bins.append(pkt.timestamp, pkt.length, direction)
+
+            # Protocol identification
+            entry["protocol_counts"][pkt.protocol] += 1
+            if pkt.protocol == "TLS":
+                entry["tls_count"] += 1
+
+            # TCP-specific fields
+            if pkt.transport == "TCP":
+                if pkt.tcp_window_size is not None:
+                    entry["tcp_window_sizes"].append(pkt.tcp_window_size)
+                if pkt.tcp_flags is not None:
+                    entry["tcp_flags"][pkt.tcp_flags] += 1
+
+            # TTL if IP layer exists
+            if pkt.ip_version == 4 and pkt.ttl is not None:
+                entry["ttl_values"].append(pkt.ttl)
+        if bins is not None:
+            bins.flush()
+    instrumentation.count("packets", entry["total_packets"])
+    return entry
+
+
+def analyze_index(pcap_file, backend=CAPTURE_BACKEND, rebuild=False, local=LOCAL_PREFIXES, timeline=False):
+    """Return the app entry of a capture computed from its sidecar index (see packet_index.py).
+
+    The index is built on the first run; later runs only memory-map the
+    columns and reduce them with NumPy instead of dissecting the capture.
+    """
+    with instrumentation.stage("read"):
+        index = load_index(pcap_file, backend, rebuild)
+    with instrumentation.stage("accumulate"):
+        entry = _index_entry(index, local_network(local), timeline)
+    instrumentation.count("packets", entry["total_packets"])
+    return entry
+
+
+def _index_entry(index, local, timeline=False):
+    """Reduce the columns of a PacketIndex to an app entry ('local' is a LocalNetwork)."""
+    entry = new_app_entry(timeline=timeline)
+    entry["total_packets"] = len(index)
+
+    length = index["length"]
+    entry["packet_sizes"].extend(length[length >= 0])
+    timestamp = index["timestamp"]
+    entry["timestamps"].extend(timestamp[~np.isnan(timestamp)])
+
+    # Direction: classify the (small) address table once, then look the codes up
+    ip_version = index["ip_version"]
+    ipv4 = ip_version == 4
+    src_ip = index["src_ip"]
+    is_ip = (ip_version != 0) & (src_ip >= 0)
+    local_codes = local.local_mask(index.addresses)
+    outgoing = int(np.count_nonzero(local_codes[src_ip[is_ip]])) if len(local_codes) else 0
+    entry["outgoing"] = outgoing
+    entry["incoming"] = int(np.count_nonzero(is_ip)) - outgoing
+    entry["ipv6_packets"] = int(np.count_nonzero(ip_version == 6))
+    if timeline:
+        direction = np.zeros(len(index), dtype=np.int8)
+        if len(local_codes):
+            direction[is_ip] = np.where(local_codes[src_ip[is_ip]], 1, -1)
+        entry["timeline"].add(timestamp, length, direction)
+
+    protocol_counts = np.bincount(index["protocol"], minlength=len(PROTOCOL_CLASSES))
+    for protocol, count in zip(PROTOCOL_CLASSES, protocol_counts):
+        if count:
+            entry["protocol_counts"][protocol] = int(count)
+    entry["tls_count"] = entry["protocol_counts"]["TLS"]
+
+    tcp = index["transport"] == TRANSPORTS.index("TCP")
+    window = index["tcp_window_size"]
+    entry["tcp_window_sizes"].extend(window[tcp & (window >= 0)])
+    flag_counts = flag_histogram(index["tcp_flags"][tcp])
+    for value in np.flatnonzero(flag_counts):
+        entry["tcp_flags"][int(value)] = int(flag_counts[value])
+
+    ttl = index["ttl"]
+    entry["ttl_values"].extend(ttl[ipv4 & (ttl >= 0)])
+    return entry
+
+
+def merge_app_entries(entry, other):
+    """Add the packets counted in 'other' (a partial result) to 'entry'."""
+    for key, value in other.items():
+        if isinstance(value, Counter):
+            entry[key].update(value)
+        elif hasattr(value, "merge"):
+            entry[key].merge(value)
+        elif key in ("incoming", "outgoing", "ipv6_packets", "tls_count", "total_packets"):
+            entry[key] += value
+    return entry
+
+
+@instrumentation.timed("aggregate")
+def compute_flow_stats(entry):
+    """Fill in the flow statistics of an entry (vectorized over the packet columns)."""
+    flags = histogram_from_counts(entry["tcp_flags"])
+    entry["tcp_flags_detail"] = Counter(report_counts(flags))
+    entry["tcp_flag_bits"] = bit_counts(flags)
+    entry["tcp_flag_combinations"] = combination_counts(flags)
+
+    entry["flow_size"] = entry["total_packets"]
+    entry["flow_volume"] = int(entry["packet_sizes"].sum())
+
+    if isinstance(entry["timestamps"], InterArrivalTracker):
+        avg_inter_arrival, duration = entry["timestamps"].mean(), entry["timestamps"].duration()
     else:
-        app_data[app]["avg_inter_arrival"] = 0
-        app_data[app]["bits_per_second"] = 0
-
-# ----- Start plotting and saving -----
-
-apps_list = list(apps.keys())
-x = np.arange(len(apps_list))
-
-# (1) Average TCP Window Size
-avg_win_sizes = [
-    statistics.mean(app_data[a]["tcp_window_sizes"]) if app_data[a]["tcp_window_sizes"] else 0
-    for a in apps_list
-]
-plt.figure()
-plt.bar(apps_list, avg_win_sizes, color='pink')
-plt.xlabel("Application")
-plt.ylabel("Average TCP Window Size (bytes)")
-plt.title("Average TCP Window Size by Application")
-save_fig("Average_TCP_Window_Size.png")
-
-# (2) Average TTL
-avg_ttl_vals = [
-    statistics.mean(app_data[a]["ttl_values"]) if app_data[a]["ttl_values"] else 0
-    for a in apps_list
-]
-plt.figure()
-plt.bar(apps_list, avg_ttl_vals, color='purple')
-plt.xlabel("Application")
-plt.ylabel("Average TTL")
-plt.title("Average TTL by Application")
-save_fig("Average_TTL.png")
-
-# (3) Protocol Distribution (stacked)
-protocols = ["TCP", "UDP", "TLS", "QUIC"]
-prot_dist = {p: [] for p in protocols}
-for app in apps_list:
-    total = app_data[app]["total_packets"]
-    for p in protocols:
-        cnt = app_data[app]["protocol_counts"][p]
-        perc = (cnt / total * 100) if total > 0 else 0
-        prot_dist[p].append(perc)
-
-plt.figure()
-bottom = np.zeros(len(apps_list))
-bar_width = 0.5
-for p in protocols:
-    plt.bar(x, prot_dist[p], bar_width, bottom=bottom, label=p)
-    bottom += prot_dist[p]
-plt.xticks(x, apps_list)
-plt.xlabel("Application")
-plt.ylabel("Percentage of Packets (%)")
-plt.title("Protocol Distribution by Application")
-plt.legend()
-save_fig("Protocol_Distribution.png")
-
-# (4) TLS Usage
-tls_perc_list = []
-for app in apps_list:
-    total = app_data[app]["total_packets"]
-    tls_count = app_data[app]["tls_count"]
-    tls_perc_list.append((tls_count / total) * 100 if total else 0)
-
-plt.figure()
-plt.bar(apps_list, tls_perc_list, color='green')
-plt.xlabel("Application")
-plt.ylabel("TLS Packets (%)")
-plt.title("TLS Usage by Application")
-save_fig("TLS_Usage_Percentage.png")
-
-# (5) Flow Volume (Total Bytes)
-flow_vols = [app_data[a]["flow_volume"] for a in apps_list]
-plt.figure()
-plt.bar(apps_list, flow_vols, color='magenta')
-plt.xlabel("Application")
-plt.ylabel("Total Bytes (Flow Volume)")
-plt.title("Flow Volume by Application")
-save_fig("Flow_Volume_Total_Bytes_Transmitted.png")
-
-# (6) Flow Size (Total Packets)
-flow_sizes = [app_data[a]["flow_size"] for a in apps_list]
-plt.figure()
-plt.bar(apps_list, flow_sizes, color='orange')
-plt.xlabel("Application")
-plt.ylabel("Number of Packets (Flow Size)")
-plt.title("Flow Size (Total Packets) by Application")
-save_fig("Flow_Size_Total_Packets_Transmitted.png")
-
-# (7) Average Inter-Arrival Time
-avg_iat = [app_data[a]["avg_inter_arrival"] for a in apps_list]
-plt.figure()
-plt.bar(apps_list, avg_iat, color='blue')
-plt.xlabel("Application")
-plt.ylabel("Avg Inter-Arrival Time (seconds)")
-plt.title("Average Inter-Arrival Time by Application")
-save_fig("Average_Inter_Time_Between_Packets.png")
-
-# (8) Traffic Direction (Incoming vs Outgoing)
-incoming_ratio = []
-outgoing_ratio = []
-for app in apps_list:
-    inc = app_data[app]["incoming"]
-    out = app_data[app]["outgoing"]
-    tot = inc + out
-    if tot > 0:
-        incoming_ratio.append((inc / tot) * 100)
-        outgoing_ratio.append((out / tot) * 100)
+        avg_inter_arrival, duration = inter_arrival_stats(entry["timestamps"].to_numpy())
+    entry["avg_inter_arrival"] = avg_inter_arrival
+    if duration > 0:
+        entry["bits_per_second"] = (entry["flow_volume"] * 8) / duration
+    else:
+        entry["bits_per_second"] = 0
+    return entry
+
+
+def _capture_tasks(apps, backend, workers, streaming, local, timeline=False):
+    """Return (app, pcap_file, backend, byte_range, streaming, local, timeline) tasks, splitting large native captures."""
+    tasks = []
+    for app, pcap_file in apps.items():
+        if workers > 1 and resolve_backend(pcap_file, backend) == "native":
+            parts = min(workers, max(1, -(-os.path.getsize(pcap_file) // SPLIT_BYTES)))
+            for byte_range in split_capture(pcap_file, parts):
+                tasks.append((app, pcap_file, "native", byte_range, streaming, local, timeline))
+        else:
+            tasks.append((app, pcap_file, backend, None, streaming, local, timeline))
+    return tasks
+
+
+def collect_app_data(apps, backend=CAPTURE_BACKEND, workers=1, streaming=False, use_index=False,
+                     rebuild_index=False, local=LOCAL_PREFIXES, timeline=False):
+    """Analyze every capture in 'apps' and return the app_data dictionary.
+
+    With workers > 1 the captures, and byte ranges of large captures, are read
+    concurrently in a process pool and the partial results are merged.
+    With use_index the per-packet columns come from each capture's sidecar
+    index (one task per capture); streaming always reads the captures.
+    With timeline each entry also gets the per-interval counts of its capture.
+    """
+    app_data = {app: new_app_entry(streaming, timeline) for app in apps}
+    local = local_network(local)
+    if use_index and not streaming:
+        function = analyze_index
+        tasks = [(app, pcap_file, backend, rebuild_index, local, timeline) for app, pcap_file in apps.items()]
     else:
-        incoming_ratio.append(0)
-        outgoing_ratio.append(0)
-
-plt.figure()
-plt.bar(x, incoming_ratio, label='Incoming', color='orange')
-plt.bar(x, outgoing_ratio, bottom=incoming_ratio, label='Outgoing', color='blue')
-plt.xticks(x, apps_list)
-plt.xlabel("Application")
-plt.ylabel("Traffic Direction (%)")
-plt.title("Traffic Direction (Incoming vs Outgoing) by Application")
-plt.legend()
-save_fig("Traffic_Direction.png")
-
-# (9) Average Packet Size
-avg_pkt_size = []
-for app in apps_list:
-    pkts = app_data[app]["packet_sizes"]
-    if pkts:
-        avg_pkt_size.append(statistics.mean(pkts))
+        function = analyze_capture
+        tasks = _capture_tasks(apps, backend, workers, streaming, local, timeline)
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(task[0], instrumentation.submit(pool, function, *task[1:])) for task in tasks]
+            for app, future in futures:
+                merge_app_entries(app_data[app], future.result())
     else:
-        avg_pkt_size.append(0)
-
-plt.figure()
-plt.bar(apps_list, avg_pkt_size, color='cyan')
-plt.xlabel("Application")
-plt.ylabel("Average Packet Size (bytes)")
-plt.title("Average Packet Size by Application")
-save_fig("Average_Packet_Size.png")
-
-# (10) Bits per Second (Throughput)
-bps_vals = [app_data[a]["bits_per_second"] for a in apps_list]
-plt.figure()
-plt.bar(apps_list, bps_vals, color='red')
-plt.xlabel("Application")
-plt.ylabel("Bits per Second")
-plt.title("Network Throughput (Bits per Second) by Application")
-save_fig("Bit_Rate_Per_Sec.png")
-
-# (11) TCP Flags Distribution (stacked)
-flag_categories = ["SYN", "SYN-ACK", "ACK", "ACK-PUSH", "ACK-FIN"]
-x_idx = np.arange(len(apps_list))
-bar_width = 0.5
-
-plt.figure(figsize=(10, 6))
-bottom = np.zeros(len(apps_list))
-for flag in flag_categories:
-    flag_percents = []
-    for app in apps_list:
-        total_flags = sum(app_data[app]["tcp_flags_detail"].values())
-        count = app_data[app]["tcp_flags_detail"].get(flag, 0)
-        percentage = (count / total_flags) * 100 if total_flags > 0 else 0
-        flag_percents.append(percentage)
-    plt.bar(x_idx, flag_percents, bar_width, bottom=bottom, label=flag)
-    bottom += np.array(flag_percents)
-
-plt.xticks(x_idx, apps_list, rotation=30, ha="right")
-plt.xlabel("Application")
-plt.ylabel("Percentage of TCP Flags (%)")
-plt.title("TCP Flags Distribution by Application (Stacked)")
-plt.legend(loc='upper left', bbox_to_anchor=(1, 1), title="TCP Flags", fontsize=8)
-plt.tight_layout(rect=[0, 0, 0.8, 1])
-save_fig("TCP_Flags_Distribution_Stacked.png")
-
-print("All graphs have been generated and saved in the '../res' folder!")
+        for app, *task in tasks:
+            merge_app_entries(app_data[app], function(*task))
+
+    for app in app_data:
+        compute_flow_stats(app_data[app])
+    return app_data
+
+
+@instrumentation.timed("aggregate")
+def app_metrics(app_data):
+    """Return the values plotted for each application as plain numbers and dicts.
+
+    This is the data behind the figures of render_figures.PCAP_FIGURES; it
+    can be saved with metrics_io.write_metrics and needs no matplotlib.
+    """
+    metrics = {}
+    for app, entry in app_data.items():
+        total = entry["total_packets"]
+        direction_total = entry["incoming"] + entry["outgoing"]
+        flags_total = sum(entry["tcp_flags_detail"].values())
+        metrics[app] = {
+            "avg_tcp_window_size": float(entry["tcp_window_sizes"].mean()),
+            "avg_ttl": float(entry["ttl_values"].mean()),
+            "total_packets": total,
+            "protocol_counts": dict(entry["protocol_counts"]),
+            "protocol_percent": {
+                p: (entry["protocol_counts"][p] / total * 100) if total > 0 else 0
+                for p in ["TCP", "UDP", "TLS", "QUIC"]
+            },
+            "tls_percent": (entry["tls_count"] / total) * 100 if total else 0,
+            "flow_volume": entry["flow_volume"],
+            "flow_size": entry["flow_size"],
+            "avg_inter_arrival": float(entry["avg_inter_arrival"]),
+            "bits_per_second": float(entry["bits_per_second"]),
+            "incoming": entry["incoming"],
+            "outgoing": entry["outgoing"],
+            "ipv6_packets": entry["ipv6_packets"],
+            "incoming_percent": (entry["incoming"] / direction_total) * 100 if direction_total > 0 else 0,
+            "outgoing_percent": (entry["outgoing"] / direction_total) * 100 if direction_total > 0 else 0,
+            "avg_packet_size": float(entry["packet_sizes"].mean()),
+            "tcp_flags_detail": dict(entry["tcp_flags_detail"]),
+            "tcp_flags_percent": {
+                flag: (count / flags_total) * 100 if flags_total > 0 else 0
+                for flag, count in entry["tcp_flags_detail"].items()
+            },
+            # Every TCP packet with the bit set, and every combination seen (e.g. "RST-ACK")
+            "tcp_flag_bits": entry["tcp_flag_bits"],
+            "tcp_flag_bits_percent": {
+                flag: (count / flags_total) * 100 if flags_total > 0 else 0
+                for flag, count in entry["tcp_flag_bits"].items()
+            },
+            "tcp_flag_combinations": entry["tcp_flag_combinations"],
+        }
+        if entry["timeline"] is not None:
+            # Throughput per second (peak, p95, median) and the inter-arrival histogram
+            metrics[app].update(entry["timeline"].summary())
+    return metrics
+
+
+def save_timelines(app_data, directory):
+    """Save the timeline of each application as DIRECTORY/<app>.timeline.npz (see timeseries.py show)."""
+    os.makedirs(directory, exist_ok=True)
+    for app, entry in app_data.items():
+        if entry["timeline"] is not None:
+            entry["timeline"].save(os.path.join(directory, app.replace(" ", "_") + ".timeline.npz"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the .pcapng captures of each application.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to read the captures (default: 1)")
+    parser.add_argument("--backend", choices=["auto", "native", "pyshark"], default=CAPTURE_BACKEND,
+                        help="capture reader backend (default: %(default)s)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="use constant-memory one-pass statistics instead of keeping per-packet columns")
+    parser.add_argument("--no-index", action="store_true",
+                        help="dissect the captures every time instead of using the cached sidecar index")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="dissect the captures again and rewrite their sidecar index")
+    parser.add_argument("--local-ip", nargs="+", default=LOCAL_PREFIXES, metavar="PREFIX",
+                        help="addresses or CIDR prefixes (IPv4/IPv6) of the capturing host, "
+                             "for incoming/outgoing (default: %(default)s)")
+    parser.add_argument("--timeline-dir",
+                        help="also count the packets per 10 ms to 60 s interval and save the timelines here")
+    parser.add_argument("--out-dir", default=out_dir, help="folder for the figures (default: %(default)s)")
+    parser.add_argument("--metrics", help="also save the metrics to this .json or .parquet file")
+    parser.add_argument("--no-render", action="store_true", help="only compute the metrics, draw no figures")
+    parser.add_argument("--render-workers", type=int,
+                        help="number of processes drawing the figures (default: one per CPU)")
+    args = parser.parse_args()
+
+    app_data = collect_app_data(apps, args.backend, max(1, args.workers), args.streaming,
+                                not args.no_index, args.rebuild_index, args.local_ip, bool(args.timeline_dir))
+    if args.timeline_dir:
+        save_timelines(app_data, args.timeline_dir)
+        print(f"Timelines saved in '{args.timeline_dir}'")
+    metrics = app_metrics(app_data)
+    if args.metrics:
+        write_metrics(metrics, args.metrics)
+        print(f"Metrics saved to {args.metrics}")
+    if not args.no_render:
+        from render_figures import PCAP_FIGURES, render
+        render(PCAP_FIGURES, metrics, args.out_dir, args.render_workers)
+        print(f"All graphs have been generated and saved in the '{args.out_dir}' folder!")
+
+
+if __name__ == "__main__":
+    main()
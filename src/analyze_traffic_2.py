@@ -1,24 +1,20 @@
-import matplotlib
-matplotlib.use('TkAgg')  # Use "TkAgg" backend to avoid the InterAgg error
-
-import os
+import argparse
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from csv_loader import CAPTURE_CSV_SCHEMA, iter_csv
+from metrics_io import write_metrics
+from streaming_stats import HeavyHitters
 
 # We assume that 'src' is the current folder.
 # So data is one level up in the 'data' folder,
 # and res is also one level up in 'res' folder.
+# The figures are drawn by render_figures.py (Agg backend, no display needed).
 
 out_dir = "../res"
-os.makedirs(out_dir, exist_ok=True)
-
-def save_fig(filename):
-    """Saves the current matplotlib figure to the 'res' folder and closes it."""
-    plt.savefig(os.path.join(out_dir, filename), dpi=300)
-    plt.close()
 
 # File paths (relative) for CSV data
 file_paths = {
@@ -29,177 +25,236 @@ file_paths = {
     "Chrome": "../data/csv_chrome.csv"
 }
 
-# Load CSV files into DataFrames for each service
-dataframes = {name: pd.read_csv(path) for name, path in file_paths.items()}
-
-# Dictionary to store percentage of TLS handshake features by service
-tls_handshake_counts = {}
 tls_features = ["Client Hello", "Server Hello"]
 
-# Collect TLS handshake counts (excluding 'Finished') and compute percentages
-for name, df in dataframes.items():
-    if "Protocol" in df.columns and "Info" in df.columns:
-        counts = {}
-        for feature in tls_features:
-            count_feature = len(
-                df[
-                    df["Protocol"].str.contains("TLS", na=False) &
-                    df["Info"].str.contains(feature, na=False)
-                ]
-            )
-            counts[feature] = count_feature
-
-        total = sum(counts.values())
-        if total > 0:
-            tls_handshake_counts[name] = {k: (v / total) * 100 for k, v in counts.items()}
-        else:
-            tls_handshake_counts[name] = {k: 0 for k in counts}
-
-# Convert TLS handshake data into a DataFrame
-tls_handshake_percent_df = pd.DataFrame(tls_handshake_counts).T
-
-# TLS Handshake Features per Service (Percentage)
-plt.figure(figsize=(10, 5))
-tls_handshake_percent_df.plot(kind="bar", stacked=True, figsize=(10, 5))
-plt.title("TLS Handshake Features per Service (Percentage)")
-plt.xlabel("Service")
-plt.ylabel("Percentage of TLS Handshake Packets (%)")
-plt.legend(title="TLS Feature")
-plt.grid(axis='y')
-plt.tight_layout()
-save_fig("TLS_Handshake_Features_per_Service.png")
-
-# Compare PSH vs SYN,ACK in TCP packets (percentage per service)
-push_counts = {}
-syn_ack_counts = {}
-
-for name, df in dataframes.items():
+# Only these columns of the exports are used by the plots
+CSV_COLUMNS = ["Source", "Destination", "Protocol", "Info"]
+
+# Ports, addresses and endpoints are counted in fixed-size heavy-hitter
+# summaries (streaming_stats.HeavyHitters) that keep the TOP_K most frequent
+# items of each service, whatever the length of the export.
+TOP_K = 1000
+
+# One compiled pattern extracts both ports from the Info column:
+# the source port ("443 > ...") and the destination port ("... > 443").
+PORT_PATTERN = re.compile(r'^(?:\s*(?P<source_port>\d+)\s*(?=>))?(?:.*?>\s*(?P<destination_port>\d+))?', re.S)
+
+# Info flags, each only searched in the rows of the protocol it belongs to
+INFO_FLAGS = {
+    "PSH": "Is TCP",
+    "SYN, ACK": "Is TCP",
+    "Client Hello": "Is TLS",
+    "Server Hello": "Is TLS",
+}
+
+
+def _category_mask(series, pattern):
+    """Vectorized str.contains evaluated once per distinct value of a categorical column."""
+    categories = series.cat.categories.str.contains(pattern, regex=False)
+    codes = series.cat.codes.to_numpy()
+    return pd.Series(np.where(codes >= 0, categories[codes], False), index=series.index)
+
+
+def parse_info_columns(df):
+    """Parse the Protocol and Info columns once into typed columns that every plot reuses.
+
+    Returns a DataFrame with the Protocol as a category, "Is TCP" / "Is TLS"
+    masks, boolean PSH / SYN, ACK / Client Hello / Server Hello columns and the
+    source/destination ports as nullable integers.
+    """
+    parsed = pd.DataFrame(index=df.index)
+    has_protocol = "Protocol" in df.columns
+    if has_protocol:
+        protocol = df["Protocol"].astype("category")
+        parsed["Protocol"] = protocol
+        parsed["Is TCP"] = _category_mask(protocol, "TCP")
+        parsed["Is TLS"] = _category_mask(protocol, "TLS")
+
+    if "Info" in df.columns:
+        info = df["Info"]
+        for flag, protocol_mask in INFO_FLAGS.items():
+            rows = parsed[protocol_mask] if has_protocol else slice(None)
+            column = pd.Series(False, index=df.index)
+            column[rows] = info[rows].str.contains(flag, na=False, regex=False)
+            parsed[flag] = column
+
+        # Ports only exist in rows with a '>' (TCP/UDP summaries)
+        parsed["Source Port"] = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        parsed["Destination Port"] = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        rows = info.str.contains(">", na=False, regex=False)
+        ports = info[rows].str.extract(PORT_PATTERN)
+        parsed.loc[rows, "Source Port"] = pd.to_numeric(ports["source_port"]).astype("Int64")
+        parsed.loc[rows, "Destination Port"] = pd.to_numeric(ports["destination_port"]).astype("Int64")
+    return parsed
+
+
+def _count_chunk(df):
+    """Compute the per-service counts used by the plots for one chunk of an export."""
+    with instrumentation.stage("decode"):
+        parsed = parse_info_columns(df)
+    result = {
+        "tls_handshake_counts": None,
+        "push_count": None,
+        "syn_ack_count": None,
+        "tls_version_counts": None,
+        "source_ports": HeavyHitters(TOP_K),
+        "destination_ports": HeavyHitters(TOP_K),
+        "source_ips": HeavyHitters(TOP_K),
+        "destination_ips": HeavyHitters(TOP_K),
+        "endpoints": HeavyHitters(TOP_K),
+    }
+
     if "Protocol" in df.columns and "Info" in df.columns:
-        push_count = len(
-            df[
-                df["Protocol"].str.contains("TCP", na=False) &
-                df["Info"].str.contains("PSH", na=False)
-            ]
-        )
-        syn_ack_count = len(
-            df[
-                df["Protocol"].str.contains("TCP", na=False) &
-                df["Info"].str.contains("SYN, ACK", na=False)
-            ]
-        )
-        push_counts[name] = push_count
-        syn_ack_counts[name] = syn_ack_count
-
-comparison_df_abs = pd.DataFrame({
-    "PSH": push_counts,
-    "SYN, ACK": syn_ack_counts
-})
-
-# Convert to percentage counts
-comparison_percent_df = comparison_df_abs.astype("float64")
-for service in comparison_percent_df.index:
-    total = comparison_percent_df.loc[service].sum()
-    if total > 0:
-        comparison_percent_df.loc[service] = (comparison_percent_df.loc[service] / total) * 100
-    else:
-        comparison_percent_df.loc[service] = 0
-
-# Comparison of PSH vs. SYN, ACK Packets per Service (Percentage)
-plt.figure(figsize=(10, 5))
-comparison_percent_df.plot(kind="bar", figsize=(10, 5))
-plt.title("Comparison of PSH vs. SYN, ACK Packets per Service (Percentage)")
-plt.xlabel("Service")
-plt.ylabel("Percentage of Packets (%)")
-plt.legend(title="TCP Feature")
-plt.grid(axis='y')
-plt.tight_layout()
-save_fig("Comparison_of_PSH_vs_SYN_ACK.png")
-
-# Analyze TLS versions per service (normalized percentages)
-tls_versions_counts = {}
-for name, df in dataframes.items():
+        # Collect TLS handshake counts (excluding 'Finished')
+        result["tls_handshake_counts"] = {
+            feature: int((parsed["Is TLS"] & parsed[feature]).sum()) for feature in tls_features
+        }
+
+        # PSH vs SYN,ACK in TCP packets
+        result["push_count"] = int((parsed["Is TCP"] & parsed["PSH"]).sum())
+        result["syn_ack_count"] = int((parsed["Is TCP"] & parsed["SYN, ACK"]).sum())
+
     if "Protocol" in df.columns:
-        tls_versions = df[df["Protocol"].str.contains("TLS", na=False)]["Protocol"]
-        version_counts = tls_versions.value_counts().to_dict()
-        tls_versions_counts[name] = version_counts
-
-tls_versions_df = pd.DataFrame(tls_versions_counts).fillna(0).T
-tls_versions_df = tls_versions_df.div(tls_versions_df.sum(axis=1), axis=0) * 100
-
-# TLS Version Distribution per Service (Percentage)
-plt.figure(figsize=(12, 6))
-tls_versions_df.plot(kind="bar", stacked=True, figsize=(12, 6))
-plt.title("TLS Version Distribution per Service (Percentage)")
-plt.xlabel("Service")
-plt.ylabel("Percentage of TLS Packets (%)")
-plt.legend(title="TLS Version")
-plt.grid(axis='y')
-plt.tight_layout()
-save_fig("TLS_Version_Distribution_per_Service.png")
-
-# Helper functions to extract source/destination ports from the Info column
-def extract_source_port(info):
-    if isinstance(info, str):
-        match = re.match(r'\s*(\d+)\s*>', info)
-        if match:
-            return int(match.group(1))
-    return None
-
-def extract_destination_port(info):
-    if isinstance(info, str):
-        match = re.search(r'>\s*(\d+)', info)
-        if match:
-            return int(match.group(1))
-    return None
-
-source_port_list = []
-destination_port_list = []
-
-for service_name, df in dataframes.items():
-    temp_df = df.copy()
-    temp_df["Source Port"] = temp_df["Info"].apply(extract_source_port)
-    temp_df["Destination Port"] = temp_df["Info"].apply(extract_destination_port)
-    temp_df.dropna(subset=["Source Port", "Destination Port"], how="all", inplace=True)
-    temp_df["Service"] = service_name
-
-    sp_df = temp_df.dropna(subset=["Source Port"])[["Service", "Source Port"]]
-    source_port_list.append(sp_df)
-
-    dp_df = temp_df.dropna(subset=["Destination Port"])[["Service", "Destination Port"]]
-    destination_port_list.append(dp_df)
-
-source_port_combined = pd.concat(source_port_list, ignore_index=True)
-destination_port_combined = pd.concat(destination_port_list, ignore_index=True)
-
-def plot_top_10_ports_overall(df, port_col, title, filename):
-    top_10_ports = df[port_col].value_counts().nlargest(10).index
-    df_filtered = df[df[port_col].isin(top_10_ports)]
-    pivot_df = df_filtered.groupby(["Service", port_col]).size().unstack(fill_value=0)
-    pivot_percent = pivot_df.div(pivot_df.sum(axis=1), axis=0) * 100
-
-    fig, ax = plt.subplots(figsize=(12, 6))
-    colors = sns.color_palette("tab10", n_colors=len(pivot_percent.columns))
-    pivot_percent.plot(kind="barh", stacked=True, ax=ax, color=colors)
-    ax.set_title(title, pad=15)
-    ax.set_xlabel("Percentage of Packets (%)")
-    ax.set_ylabel("Service")
-    ax.legend(title=port_col, bbox_to_anchor=(1.02, 1), loc="upper left", borderaxespad=0)
-    ax.grid(axis="x")
-    plt.tight_layout(rect=[0, 0, 0.8, 1])
-    save_fig(filename)
-
-# Top 10 Source Ports (Overall)
-plot_top_10_ports_overall(
-    source_port_combined,
-    "Source Port",
-    "Top 10 Source Ports (Overall) Distribution per Service (Percentage)",
-    "Top_10_Source_Ports_Overall.png"
-)
-
-# Top 10 Destination Ports (Overall)
-plot_top_10_ports_overall(
-    destination_port_combined,
-    "Destination Port",
-    "Top 10 Destination Ports (Overall) Distribution per Service (Percentage)",
-    "Top_10_Destination_Ports_Overall.png"
-)
+        tls_versions = parsed.loc[parsed["Is TLS"], "Protocol"]
+        version_counts = tls_versions.value_counts()
+        result["tls_version_counts"] = version_counts[version_counts > 0].to_dict()
+
+    if "Info" in df.columns:
+        result["source_ports"].add_values(parsed["Source Port"].dropna().astype("int64"))
+        result["destination_ports"].add_values(parsed["Destination Port"].dropna().astype("int64"))
+
+    if "Source" in df.columns and "Destination" in df.columns:
+        result["source_ips"].add_values(df["Source"])
+        result["destination_ips"].add_values(df["Destination"])
+        if "Info" in df.columns:
+            # Destination address:port pairs, counted per distinct pair before building the names
+            # (observed=True: only the pairs that occur, not every address category x port)
+            pairs = df.groupby([df["Destination"], parsed["Destination Port"]], observed=True).size()
+            names = [("[%s]:%d" if ":" in str(ip) else "%s:%d") % (ip, port) for ip, port in pairs.index]
+            result["endpoints"].add(names, pairs.to_numpy())
+
+    return result
+
+
+def _merge_counts(total, part):
+    """Add the counts of one chunk to the running total."""
+    if total is None:
+        return part
+    for key, value in part.items():
+        if value is None:
+            continue
+        if total[key] is None:
+            total[key] = value
+        elif isinstance(value, HeavyHitters):
+            total[key].merge(value)
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                total[key][k] = total[key].get(k, 0) + v
+        else:
+            total[key] += value
+    return total
+
+
+def analyze_csv(path):
+    """Load one CSV export chunk by chunk and compute the per-service counts used by the plots.
+
+    The export is read with a typed schema and only the needed columns (and
+    from the Parquet cache on repeated runs). Only small results (counts) are
+    returned, so this can run in a worker process and files larger than RAM
+    are handled one chunk at a time.
+    """
+    result = None
+    chunks = iter_csv(path, usecols=CSV_COLUMNS, dtype=CAPTURE_CSV_SCHEMA)
+    while True:
+        with instrumentation.stage("read"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        instrumentation.count("rows", len(chunk))
+        with instrumentation.stage("accumulate"):
+            result = _merge_counts(result, _count_chunk(chunk))
+    if result is None:
+        result = _count_chunk(pd.DataFrame(columns=CSV_COLUMNS))
+    return result
+
+
+def collect_results(file_paths, workers=1):
+    """Run analyze_csv for every service, concurrently when workers > 1."""
+    if workers > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {name: instrumentation.submit(pool, analyze_csv, path) for name, path in file_paths.items()}
+            return {name: future.result() for name, future in futures.items()}
+    return {name: analyze_csv(path) for name, path in file_paths.items()}
+
+
+def merged_counts(results, key):
+    """Per-service {item: count} for the top items of one heavy-hitter summary, merged across services.
+
+    Each service reports its own top items plus its estimated count of the
+    items that are frequent over all services, so per-service shares of the
+    overall top-N stay comparable.
+    """
+    merged = HeavyHitters(TOP_K)
+    for result in results.values():
+        merged.merge(result[key])
+    overall = list(merged.top())
+    counts = {}
+    for name, result in results.items():
+        service = result[key].top()
+        for item in overall:
+            if item not in service:
+                estimate = result[key].estimate(item)
+                if estimate:
+                    service[item] = estimate
+        counts[name] = service
+    return counts
+
+
+@instrumentation.timed("aggregate")
+def csv_metrics(results):
+    """Return the per-service counts as plain numbers and dicts (the data behind render_figures.CSV_FIGURES)."""
+    metrics = {}
+    top = {key: merged_counts(results, key)
+           for key in ("source_ports", "destination_ports", "source_ips", "destination_ips", "endpoints")}
+    for name, result in results.items():
+        metrics[name] = {
+            "tls_handshake_counts": result["tls_handshake_counts"],
+            "push_count": result["push_count"],
+            "syn_ack_count": result["syn_ack_count"],
+            "tls_version_counts": (
+                None if result["tls_version_counts"] is None
+                else {str(k): int(v) for k, v in result["tls_version_counts"].items()}
+            ),
+            # Heavy-hitter counts (exact while a service has at most TOP_K distinct values)
+            "source_port_counts": {int(k): v for k, v in top["source_ports"][name].items()},
+            "destination_port_counts": {int(k): v for k, v in top["destination_ports"][name].items()},
+            "top_source_ips": {str(k): v for k, v in top["source_ips"][name].items()},
+            "top_destination_ips": {str(k): v for k, v in top["destination_ips"][name].items()},
+            "top_endpoints": top["endpoints"][name],
+        }
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the CSV exports of each service.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes used to analyze the CSV files (default: 1)")
+    parser.add_argument("--out-dir", default=out_dir, help="folder for the figures (default: %(default)s)")
+    parser.add_argument("--metrics", help="also save the metrics to this .json or .parquet file")
+    parser.add_argument("--no-render", action="store_true", help="only compute the metrics, draw no figures")
+    parser.add_argument("--render-workers", type=int,
+                        help="number of processes drawing the figures (default: one per CPU)")
+    args = parser.parse_args()
+
+    results = collect_results(file_paths, max(1, args.workers))
+    metrics = csv_metrics(results)
+    if args.metrics:
+        write_metrics(metrics, args.metrics)
+        print(f"Metrics saved to {args.metrics}")
+    if not args.no_render:
+        from render_figures import CSV_FIGURES, render
+        render(CSV_FIGURES, metrics, args.out_dir, args.render_workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Benchmarks of the main code paths on synthetic data (see synthetic_data.py):
+#   pcap        analyze_traffic_1 on a .pcapng (direct dissection)
+#   pcap-index  analyze_traffic_1 from the cached sidecar index
+#   csv         analyze_traffic_2 on a CSV export (cold: CSV parse + Parquet cache write)
+#   csv-cached  analyze_traffic_2 from the Parquet cache
+#   classifier  traffic_classifier: load, fit and batch predict
+# Every benchmark runs in a fresh process so its peak RSS is its own. Results
+# are appended to a history file, and each run is compared with the previous
+# one to flag throughput regressions.
+
+BENCHMARKS = ["pcap", "pcap-index", "csv", "csv-cached", "classifier"]
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+CLASSIFIER_MAX_ROWS = 1_000_000
+CLASSIFIER_MODEL = "XGBoost Classifier"
+REGRESSION_THRESHOLD = 0.2
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def data_file(workdir, kind, size, seed=0):
+    """Generate the synthetic input of a benchmark once and return its path."""
+    from synthetic_data import write_capture_csv, write_flow_dataset, write_pcapng
+
+    extension = {"pcapng": "pcapng", "csv": "csv", "flows": "csv"}[kind]
+    path = os.path.join(workdir, "%s-%d-%d.%s" % (kind, size, seed, extension))
+    if not os.path.exists(path):
+        writer = {"pcapng": write_pcapng, "csv": write_capture_csv, "flows": write_flow_dataset}[kind]
+        writer(path + ".tmp", size, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def _drop_cache(path):
+    """Remove the .cache entries (Parquet cache, sidecar index) of one input file."""
+    import shutil
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.startswith(os.path.basename(path) + "-"):
+                target = os.path.join(cache_dir, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target)
+                else:
+                    os.remove(target)
+
+
+def run_benchmark(name, size, workdir, classifier_model=CLASSIFIER_MODEL):
+    """Run one benchmark in this process and return its result dict."""
+    if name in ("pcap", "pcap-index"):
+        from analyze_traffic_1 import analyze_capture, analyze_index, compute_flow_stats
+        path = data_file(workdir, "pcapng", size)
+        if name == "pcap-index":
+            analyze_index(path, "native", rebuild=True)
+        start = time.perf_counter()
+        entry = analyze_index(path, "native") if name == "pcap-index" else analyze_capture(path, "native")
+        compute_flow_stats(entry)
+        seconds = time.perf_counter() - start
+        items, unit = entry["total_packets"], "packets/s"
+
+    elif name in ("csv", "csv-cached"):
+        from analyze_traffic_2 import analyze_csv
+        path = data_file(workdir, "csv", size)
+        _drop_cache(path)
+        if name == "csv-cached":
+            analyze_csv(path)
+        start = time.perf_counter()
+        analyze_csv(path)
+        seconds = time.perf_counter() - start
+        items, unit = size, "rows/s"
+
+    elif name == "classifier":
+        from sklearn.model_selection import train_test_split
+        from traffic_classifier import build_classifiers, load_dataset, prepare_data_for_classification
+        rows = min(size, CLASSIFIER_MAX_ROWS)
+        path = data_file(workdir, "flows", rows)
+        start = time.perf_counter()
+        X, y, _ = prepare_data_for_classification(load_dataset(path))
+        X_train, X_test, y_train, _ = train_test_split(X, y, test_size=0.8, random_state=42, stratify=y)
+        clf = build_classifiers(svc_probability=False)[classifier_model]
+        clf.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+        predict_start = time.perf_counter()
+        clf.predict(X_test)
+        predict_seconds = time.perf_counter() - predict_start
+        seconds = time.perf_counter() - start
+        items, unit = rows, "rows/s"
+
+    else:
+        raise ValueError("unknown benchmark: %r" % name)
+
+    result = {
+        "benchmark": name,
+        "size": size,
+        "seconds": seconds,
+        "rate": items / seconds if seconds > 0 else 0,
+        "unit": unit,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if name == "classifier":
+        result.update(rows=rows, model=classifier_model, fit_seconds=fit_seconds,
+                      predict_rows_s=len(X_test) / predict_seconds if predict_seconds > 0 else 0)
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, threshold=REGRESSION_THRESHOLD):
+    """Return the results whose rate dropped by more than 'threshold' since the previous run."""
+    before = {(r["benchmark"], r["size"]): r for r in (previous or {}).get("results", [])}
+    regressions = []
+    for result in results:
+        old = before.get((result["benchmark"], result["size"]))
+        if old and old["rate"] > 0 and result["rate"] < old["rate"] * (1 - threshold):
+            regressions.append((result, old))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis scripts and the classifier on synthetic data.")
+    parser.add_argument("--benchmarks", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--sizes", nargs="+", type=float, default=DEFAULT_SIZES,
+                        help="packets/rows per input, e.g. 1e4 1e6 1e8 (default: 1e4 1e5 1e6)")
+    parser.add_argument("--workdir", default="../bench", help="folder for the generated data (default: %(default)s)")
+    parser.add_argument("--history", default="../bench/history.json",
+                        help="JSON file the results of every run are appended to (default: %(default)s)")
+    parser.add_argument("--model", default=CLASSIFIER_MODEL, help="classifier to benchmark (default: %(default)s)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative throughput drop reported as a regression (default: %(default)s)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    sizes = [int(s) for s in args.sizes]
+    results = []
+    print(f"{'Benchmark':<14}{'size':>12}{'seconds':>10}{'rate':>16}  {'unit':<10}{'peak MB':>9}")
+    for size in sizes:
+        for name in args.benchmarks:
+            # A fresh process per benchmark, so the peak memory belongs to that benchmark only
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_benchmark, name, size, args.workdir, args.model).result()
+            results.append(result)
+            print(f"{name:<14}{size:>12,}{result['seconds']:>10.2f}{result['rate']:>16,.0f}  "
+                  f"{result['unit']:<10}{result['peak_rss_mb']:>9.0f}")
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    previous = history[-1] if history else None
+    regressions = compare(results, previous, args.threshold)
+    for result, old in regressions:
+        print(f"REGRESSION {result['benchmark']} size={result['size']:,}: "
+              f"{result['rate']:,.0f} {result['unit']} (was {old['rate']:,.0f} at {previous.get('revision')})")
+
+    history.append({"time": time.time(), "revision": _git_revision(), "results": results})
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from data_paths import DATASET, labelled_inputs
+
+# Single command-line entry point:
+#   python cli.py analyze pcap [NAME=PATH ...]    (analyze_traffic_1.py)
+#   python cli.py analyze csv [NAME=PATH ...]     (analyze_traffic_2.py)
+#   python cli.py classify train|predict|evaluate (traffic_classifier.py)
+#   python cli.py fingerprint learn|show          (handshake.py)
+#   python cli.py early train|evaluate|predict    (early_flow.py)
+#   python cli.py cold-start                      (import time of each subcommand)
+# --report run.json (before the command) records per-stage timings, counters
+# and memory of the run (instrumentation.py); --profile adds a profile.
+# Only the standard library is imported here; each subcommand imports the
+# modules it needs when it runs, so e.g. 'analyze pcap' never loads sklearn.
+
+# Modules imported by each subcommand (measured by 'cold-start')
+COMMAND_MODULES = {
+    "analyze pcap": ["analyze_traffic_1"],
+    "analyze pcap + render": ["analyze_traffic_1", "render_figures"],
+    "analyze csv": ["analyze_traffic_2"],
+    "analyze csv + render": ["analyze_traffic_2", "render_figures"],
+    "classify train": ["traffic_classifier", "xgboost", "imblearn.over_sampling", "sklearn.ensemble"],
+    "classify predict": ["traffic_classifier"],
+    "fingerprint": ["handshake"],
+    "early": ["early_flow", "traffic_classifier"],
+}
+
+
+def _render(figures_name, metrics, args):
+    if args.metrics:
+        from metrics_io import write_metrics
+        write_metrics(metrics, args.metrics)
+        print(f"Metrics saved to {args.metrics}")
+    if not args.no_render:
+        import render_figures
+        render_figures.render(getattr(render_figures, figures_name), metrics, args.out_dir, args.render_workers)
+        print(f"Figures saved in '{args.out_dir}'")
+
+
+def analyze_pcap(args):
+    import analyze_traffic_1
+    from local_network import LOCAL_PREFIXES
+
+    captures = labelled_inputs(args.inputs, analyze_traffic_1.apps, args.data_dir)
+    local = args.local_ip or LOCAL_PREFIXES
+    app_data = analyze_traffic_1.collect_app_data(
+        captures, args.backend, max(1, args.workers), args.streaming,
+        not args.no_index, args.rebuild_index, local, bool(args.timeline_dir),
+    )
+    if args.timeline_dir:
+        analyze_traffic_1.save_timelines(app_data, args.timeline_dir)
+        print(f"Timelines saved in '{args.timeline_dir}'")
+    _render("PCAP_FIGURES", analyze_traffic_1.app_metrics(app_data), args)
+
+
+def analyze_csv(args):
+    import analyze_traffic_2
+
+    exports = labelled_inputs(args.inputs, analyze_traffic_2.file_paths, args.data_dir)
+    results = analyze_traffic_2.collect_results(exports, max(1, args.workers))
+    _render("CSV_FIGURES", analyze_traffic_2.csv_metrics(results), args)
+
+
+def _check_models(parser, names):
+    """parser.error for names that are not models of traffic_classifier.py, before any data is read."""
+    from traffic_classifier import MODEL_NAMES
+
+    for name in names:
+        if name not in MODEL_NAMES:
+            parser.error("unknown model %r (choose from %s)" % (name, ", ".join(MODEL_NAMES)))
+
+
+def classify(args, parser):
+    if args.action in ("evaluate", "train"):
+        _check_models(parser, [args.model] if args.action == "train" else args.models or [])
+    import traffic_classifier
+
+    traffic_classifier.run(args)
+
+
+def fingerprint(args):
+    import handshake
+
+    handshake.run(args)
+
+
+def early(args, parser):
+    if args.action != "predict":
+        _check_models(parser, [args.model])
+    import early_flow
+
+    early_flow.run(args)
+
+
+def cold_start(args):
+    """Time a fresh interpreter importing what each subcommand needs (best of 'repeat' runs)."""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def best_time(code):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=src_dir, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    print(f"{'Subcommand':<25}{'cold start (s)':>15}")
+    print(f"{'(interpreter only)':<25}{best_time('pass'):>15.2f}")
+    print(f"{'cli.py':<25}{best_time('import cli'):>15.2f}")
+    for command, modules in COMMAND_MODULES.items():
+        code = "import cli; " + "; ".join("import %s" % m for m in modules)
+        print(f"{command:<25}{best_time(code):>15.2f}")
+
+
+def _add_analyze_options(parser, workers_help):
+    parser.add_argument("inputs", nargs="*", metavar="NAME=PATH",
+                        help="files to analyze, labelled NAME (default: the script's files in ../data)")
+    parser.add_argument("--data-dir", help="folder holding the default files (default: ../data)")
+    parser.add_argument("--out-dir", default="../res", help="folder for the figures (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, help=workers_help)
+    parser.add_argument("--metrics", help="also save the metrics to this .json or .parquet file")
+    parser.add_argument("--no-render", action="store_true", help="only compute the metrics, draw no figures")
+    parser.add_argument("--render-workers", type=int,
+                        help="number of processes drawing the figures (default: one per CPU)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traffic analysis and classification.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    analyze = commands.add_parser("analyze", help="compute the metrics and figures of the captures or CSV exports")
+    sources = analyze.add_subparsers(dest="source", required=True)
+    pcap_parser = sources.add_parser("pcap", help=".pcap/.pcapng captures (analyze_traffic_1.py)")
+    _add_analyze_options(pcap_parser, "number of processes reading the captures (default: 1)")
+    pcap_parser.add_argument("--local-ip", nargs="+", metavar="PREFIX",
+                      help="addresses or CIDR prefixes (IPv4/IPv6) of the capturing host "
+                           "(default: LOCAL_PREFIXES of local_network.py)")
+    pcap_parser.add_argument("--backend", choices=["auto", "native", "pyshark"], default="auto")
+    pcap_parser.add_argument("--streaming", action="store_true", help="constant-memory one-pass statistics")
+    pcap_parser.add_argument("--no-index", action="store_true", help="do not use the cached sidecar index")
+    pcap_parser.add_argument("--rebuild-index", action="store_true", help="rewrite the sidecar index")
+    pcap_parser.add_argument("--timeline-dir", help="also count the packets per 10 ms to 60 s interval and save the timelines here")
+    csv_parser = sources.add_parser("csv", help="Wireshark CSV exports (analyze_traffic_2.py)")
+    _add_analyze_options(csv_parser, "number of processes reading the CSV files (default: 1)")
+
+    classify_parser = commands.add_parser("classify", help="train, evaluate or apply the traffic classifier")
+    actions = classify_parser.add_subparsers(dest="action", required=True)
+    evaluate = actions.add_parser("evaluate", help="train and evaluate the models on a dataset")
+    evaluate.add_argument("--data", default=DATASET,
+                          help="dataset CSV or binary '.flows' dataset (flow_records.py, default: %(default)s)")
+    evaluate.add_argument("--models", nargs="+", help="model names (default: the four of the report)")
+    train = actions.add_parser("train", help="fit one model and save it")
+    train.add_argument("--data", default=DATASET,
+                       help="dataset CSV or binary '.flows' dataset (flow_records.py, default: %(default)s)")
+    train.add_argument("--model", default="Random Forest")
+    train.add_argument("--output", default="traffic_model.joblib")
+    predict = actions.add_parser("predict", help="classify flow records with a saved model")
+    predict.add_argument("--model", default="traffic_model.joblib", help="file written by 'classify train'")
+    source = predict.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV of flow records with the feature columns")
+    source.add_argument("--capture", help=".pcap/.pcapng file to turn into flows and classify")
+    predict.add_argument("--output", help="CSV to write the predictions to (default: stdout)")
+    predict.add_argument("--chunk-size", type=int, default=100_000)
+
+    fingerprint_parser = commands.add_parser("fingerprint", help="TLS/QUIC handshake fingerprints and their labels")
+    fingerprint_actions = fingerprint_parser.add_subparsers(dest="action", required=True)
+    learn = fingerprint_actions.add_parser("learn", help="learn the labels of the handshakes in labelled captures")
+    learn.add_argument("inputs", nargs="*", metavar="LABEL=PATH",
+                       help="labelled captures (default: the captures of analyze_traffic_1.py in ../data)")
+    learn.add_argument("--data-dir", help="folder holding the default captures (default: ../data)")
+    show = fingerprint_actions.add_parser("show", help="list the handshakes of a capture with their learned label")
+    show.add_argument("capture")
+    show.add_argument("--output", help="CSV to write (default: stdout)")
+    for action in (learn, show):
+        action.add_argument("--db", default="fingerprints.json", help="label database (default: %(default)s)")
+
+    early_parser = commands.add_parser("early", help="classify flows from their first packets (early_flow.py)")
+    early_actions = early_parser.add_subparsers(dest="action", required=True)
+    early_train = early_actions.add_parser("train", help="fit the per-checkpoint models on labelled captures")
+    early_train.add_argument("--threshold", type=float, default=0.9, help="confidence saved with the model")
+    early_train.add_argument("--output", default="early_model.joblib")
+    early_evaluate = early_actions.add_parser("evaluate", help="accuracy vs packets needed and time to decision")
+    early_evaluate.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95])
+    for action in (early_train, early_evaluate):
+        action.add_argument("inputs", nargs="*", metavar="LABEL=PATH",
+                            help="labelled captures (default: the captures of analyze_traffic_1.py in ../data)")
+        action.add_argument("--data-dir", help="folder holding the default captures (default: ../data)")
+        action.add_argument("--model", default="Random Forest")
+        action.add_argument("--max-packets", type=int, default=32)
+        action.add_argument("--checkpoints", type=int, nargs="+", help="packet counts at which flows are scored")
+    early_predict = early_actions.add_parser("predict", help="label the flows of a capture as early as possible")
+    early_predict.add_argument("capture")
+    early_predict.add_argument("--model", default="early_model.joblib", help="file written by 'early train'")
+    early_predict.add_argument("--threshold", type=float, help="confidence needed (default: the one saved in the model)")
+    early_predict.add_argument("--output", help="CSV to write the decisions to (default: stdout)")
+
+    timing = commands.add_parser("cold-start", help="measure the import time of each subcommand")
+    timing.add_argument("--repeat", type=int, default=3)
+
+    parser.add_argument("--report", help="write a JSON report with stage timings, counters and memory")
+    parser.add_argument("--profile", choices=["cprofile", "sample"],
+                        help="add a profile to the report: cProfile (exact, slower) or a stack sampler")
+    parser.add_argument("--profile-output", help="also save the cProfile statistics (pstats format) here")
+
+    args = parser.parse_args()
+    if args.report or args.profile:
+        import instrumentation
+        instrumentation.start(profile=args.profile)
+    try:
+        run(args, parser)
+    finally:
+        if args.report or args.profile:
+            result = instrumentation.stop(args.report, args.profile_output)
+            print_report(result)
+
+
+def print_report(result):
+    """Short summary of an instrumentation report on stderr."""
+    print(f"\nwall time {result['wall_seconds']:.2f}s, peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+    for name, stage_result in result["stages"].items():
+        print(f"  {name:<12}{stage_result['seconds']:>9.3f}s  ({stage_result['calls']} calls)", file=sys.stderr)
+    for name, value in result["counters"].items():
+        print(f"  {name:<12}{value:>12,}", file=sys.stderr)
+
+
+def run(args, parser):
+    if args.command == "analyze" and args.source == "pcap":
+        analyze_pcap(args)
+    elif args.command == "analyze":
+        analyze_csv(args)
+    elif args.command == "classify":
+        classify(args, parser)
+    elif args.command == "fingerprint":
+        fingerprint(args)
+    elif args.command == "early":
+        early(args, parser)
+    else:
+        cold_start(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import hashlib
+import glob
+import os
+
+import pandas as pd
+
+# CSV loading with an explicit schema, column pruning, chunked reading and an
+# on-disk Parquet cache. The cache sits in a '.cache' folder next to the CSV
+# and is keyed on the file size, modification time and requested columns, so
+# it is rebuilt automatically when the CSV changes. Parquet needs pyarrow;
+# without it the CSV is simply parsed every time.
+
+# Wireshark "Export Packet Dissections > As CSV" columns
+CAPTURE_CSV_SCHEMA = {
+    "No.": "Int64",
+    "Time": "float64",
+    "Source": "category",
+    "Destination": "category",
+    "Protocol": "category",
+    "Length": "Int32",
+    "Info": "string",
+}
+
+CHUNK_ROWS = 1_000_000
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _digest(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+
+
+def _cache_path(path, usecols, dtype):
+    """Return the cache folder, the file name prefix of the CSV, the column key and the cache file.
+
+    Cache files are named '<csv name>-<state of the CSV>-<columns and schema>.parquet',
+    so caches of other column sets of the same CSV can be told apart from stale ones.
+    """
+    stat = os.stat(path)
+    source = _digest((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    columns = _digest((sorted(usecols) if usecols else None, sorted((dtype or {}).items())))
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    name = os.path.basename(path)
+    return cache_dir, name, columns, os.path.join(cache_dir, "%s-%s-%s.parquet" % (name, source, columns))
+
+
+def _apply_schema(df, dtype):
+    """Strip the column names and convert the columns present in the schema."""
+    df.columns = df.columns.str.strip()
+    for column, column_type in (dtype or {}).items():
+        if column in df.columns and str(df[column].dtype) != column_type:
+            df[column] = df[column].astype(column_type)
+    return df
+
+
+def _cache_schema(schema, dtype):
+    """Schema of the cache file for the first chunk's schema.
+
+    Integer columns without a type in 'dtype' are stored as float64: pandas
+    reads a later chunk with a missing value or a decimal in them as float64.
+    """
+    import pyarrow as pa
+
+    fields = [
+        field.with_type(pa.float64()) if pa.types.is_integer(field.type) and field.name not in (dtype or {}) else field
+        for field in schema
+    ]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def _read_chunks(path, usecols, dtype, chunksize):
+    """Read the CSV itself in chunks with pruned columns and the schema applied."""
+    wanted = set(usecols) if usecols else None
+    # Categories are applied after reading, since each chunk has its own categories
+    read_dtype = {
+        column: ("string" if column_type == "category" else column_type)
+        for column, column_type in (dtype or {}).items()
+    }
+    reader = pd.read_csv(
+        path,
+        usecols=(lambda c: c.strip() in wanted) if wanted else None,
+        dtype=read_dtype or None,
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        yield _apply_schema(chunk, dtype)
+
+
+def iter_csv(path, usecols=None, dtype=None, chunksize=CHUNK_ROWS, use_cache=True):
+    """Yield a CSV file as DataFrames of at most 'chunksize' rows.
+
+    When the Parquet cache is valid the chunks come from it, otherwise the CSV
+    is parsed and the cache is written on the way.
+    """
+    if not (use_cache and parquet_available()):
+        yield from _read_chunks(path, usecols, dtype, chunksize)
+        return
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    cache_dir, name, columns, cache_file = _cache_path(path, usecols, dtype)
+    if os.path.exists(cache_file):
+        parquet_file = pq.ParquetFile(cache_file)
+        for batch in parquet_file.iter_batches(batch_size=chunksize):
+            yield _apply_schema(batch.to_pandas(), dtype)
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = cache_file + ".tmp"
+    writer = None
+    caching = True
+    try:
+        for chunk in _read_chunks(path, usecols, dtype, chunksize):
+            if caching:
+                # Categories differ between chunks, so they are stored as plain strings
+                stored = chunk.astype({c: "string" for c in chunk.columns if chunk[c].dtype == "category"})
+                table = pa.Table.from_pandas(stored, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_file, _cache_schema(table.schema, dtype))
+                try:
+                    table = table.cast(writer.schema)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    # A column changed type between chunks (e.g. text in a numeric column):
+                    # this CSV is not cached and is parsed again next time
+                    writer.close()
+                    os.remove(tmp_file)
+                    writer, caching = None, False
+                else:
+                    writer.write_table(table)
+            yield chunk
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    if writer is None:
+        return
+    writer.close()
+
+    # Drop the caches of older versions of this CSV with the same columns
+    pattern = "%s-%s-%s.parquet" % (glob.escape(name), "?" * 16, columns)
+    for old_file in glob.glob(os.path.join(cache_dir, pattern)):
+        os.remove(old_file)
+    os.replace(tmp_file, cache_file)
+
+
+def load_csv(path, usecols=None, dtype=None, use_cache=True):
+    """Load a whole CSV file into one DataFrame (see iter_csv)."""
+    chunks = list(iter_csv(path, usecols, dtype, use_cache=use_cache))
+    if not chunks:
+        return _apply_schema(pd.read_csv(path, nrows=0), None)
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks, ignore_index=True)
+    return _apply_schema(df, {c: t for c, t in (dtype or {}).items() if t == "category"})
@@ -0,0 +1,29 @@
+import os
+
+# Default input files shared by the scripts and cli.py.
+# As everywhere else, 'src' is assumed to be the current folder, with the
+# data one level up in '../data'. Only the standard library is used here, so
+# cli.py can read the defaults while building its parser without importing
+# the analysis modules.
+
+# Flow dataset of traffic_classifier.py and the training scripts built on it
+DATASET = "../data/traffic_dataset.csv"
+
+
+def labelled_inputs(pairs, defaults, data_dir=None):
+    """Turn NAME=PATH arguments into a {name: path} dict.
+
+    A PATH without 'NAME=' is named after its file. Without arguments the
+    script's default files are used, moved to data_dir when it is given.
+    """
+    if not pairs:
+        if data_dir is None:
+            return dict(defaults)
+        return {name: os.path.join(data_dir, os.path.basename(path)) for name, path in defaults.items()}
+    inputs = {}
+    for pair in pairs:
+        name, sep, path = pair.partition("=")
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(pair))[0], pair
+        inputs[name] = path
+    return inputs
@@ -0,0 +1,416 @@
+import argparse
+import csv
+import sys
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from data_paths import labelled_inputs
+from flow_table import flow_key
+from pcap_reader import read_packets
+
+# Early-flow classification.
+# The flow-record classifier of traffic_classifier.py needs the whole flow,
+# so a long Zoom call or YouTube session is only labelled when it ends. Here
+# each flow keeps its first MAX_PACKETS packets (size signed by direction:
+# positive from the side that sent the first packet, and arrival time), and
+# at each checkpoint (2, 4, 8, ... packets) the model trained on flows cut at
+# that length scores it. The flow is labelled at the first checkpoint whose
+# confidence (highest class probability) reaches the threshold, at the last
+# checkpoint, or when the flow ends, whichever comes first.
+# The models are trained with prepare_data_for_classification and
+# train_and_evaluate_model on the prefix features instead of FEATURE_COLUMNS.
+
+MAX_PACKETS = 32
+CHECKPOINTS = (2, 4, 8, 16, 32)
+THRESHOLD = 0.9
+IDLE_TIMEOUT = 30.0
+
+# Size of packet i (+ forward, - reverse, 0 if the flow has fewer packets),
+# gap before packet i (seconds), and totals over the packets seen
+SUMMARY_COLUMNS = ['PREFIX_BYTES', 'PREFIX_BYTES_REV', 'PREFIX_PACKETS', 'PREFIX_PACKETS_REV', 'PREFIX_DURATION']
+
+
+def early_columns(max_packets=MAX_PACKETS):
+    return (['SIZE_%d' % i for i in range(1, max_packets + 1)]
+            + ['IAT_%d' % i for i in range(2, max_packets + 1)]
+            + SUMMARY_COLUMNS)
+
+
+DECISION_COLUMNS = ['SRC_IP', 'SRC_PORT', 'DST_IP', 'DST_PORT', 'PROTOCOL', 'START',
+                    'PACKETS', 'DECISION_TIME', 'PREDICTED_TYPE', 'CONFIDENCE', 'REASON']
+
+
+class PrefixFlow:
+    """The first packets of one bidirectional flow."""
+
+    __slots__ = ("src_ip", "src_port", "dst_ip", "dst_port", "protocol", "start", "last",
+                 "sizes", "times", "packets", "decided")
+
+    def __init__(self, pkt):
+        self.src_ip, self.src_port = pkt.src_ip, pkt.src_port
+        self.dst_ip, self.dst_port = pkt.dst_ip, pkt.dst_port
+        self.protocol = pkt.transport or "IP"
+        self.start = self.last = pkt.timestamp
+        self.sizes = []
+        self.times = []
+        self.packets = 0
+        self.decided = False
+
+    def add(self, pkt, max_packets):
+        self.packets += 1
+        self.last = max(self.last, pkt.timestamp)
+        if len(self.sizes) < max_packets:
+            size = pkt.length or 0
+            forward = pkt.src_ip == self.src_ip and pkt.src_port == self.src_port
+            self.sizes.append(size if forward else -size)
+            self.times.append(pkt.timestamp)
+
+    def features(self, packets, max_packets):
+        """Feature vector (early_columns order) of the first 'packets' packets."""
+        sizes = np.array(self.sizes[:packets], dtype=np.float64)
+        times = np.array(self.times[:packets], dtype=np.float64)
+        n = len(sizes)
+        values = np.zeros(2 * max_packets - 1 + len(SUMMARY_COLUMNS))
+        values[:n] = sizes
+        if n > 1:
+            values[max_packets:max_packets + n - 1] = np.maximum(np.diff(times), 0.0)
+        summary = values[2 * max_packets - 1:]
+        summary[0] = sizes[sizes > 0].sum()
+        summary[1] = -sizes[sizes < 0].sum()
+        summary[2] = (sizes > 0).sum()
+        summary[3] = (sizes < 0).sum()
+        summary[4] = times[n - 1] - times[0] if n else 0.0
+        return values
+
+    def elapsed(self, packets):
+        """Seconds from the first packet to packet number 'packets' (or the last one kept)."""
+        return self.times[min(packets, len(self.times)) - 1] - self.start
+
+
+class PrefixTable:
+    """Active flows by 5-tuple, expired after 'idle_timeout' seconds without packets (as in flow_table.FlowTable)."""
+
+    def __init__(self, max_packets=MAX_PACKETS, idle_timeout=IDLE_TIMEOUT):
+        self.max_packets = max_packets
+        self.idle_timeout = idle_timeout
+        self.flows = OrderedDict()
+
+    def add(self, pkt):
+        """Add a PacketRecord; returns (its flow or None, flows that ended because of it)."""
+        if pkt.src_ip is None or pkt.timestamp is None:
+            return None, []
+        finished = self.expire(pkt.timestamp)
+        key = flow_key(pkt)
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = PrefixFlow(pkt)
+        else:
+            self.flows.move_to_end(key)
+        flow.add(pkt, self.max_packets)
+        return flow, finished
+
+    def expire(self, now):
+        finished = []
+        flows = self.flows
+        while flows:
+            key, flow = next(iter(flows.items()))
+            if now - flow.last <= self.idle_timeout:
+                break
+            del flows[key]
+            finished.append(flow)
+        return finished
+
+    def flush(self):
+        finished = list(self.flows.values())
+        self.flows.clear()
+        return finished
+
+
+def capture_prefixes(captures, max_packets=MAX_PACKETS, idle_timeout=IDLE_TIMEOUT):
+    """(label, PrefixFlow) of every flow of labelled captures ({label: path})."""
+    prefixes = []
+    for label, path in captures.items():
+        table = PrefixTable(max_packets, idle_timeout)
+        with instrumentation.stage("read"):
+            for pkt in read_packets(path):
+                _, finished = table.add(pkt)
+                prefixes.extend((label, flow) for flow in finished)
+            prefixes.extend((label, flow) for flow in table.flush())
+    return prefixes
+
+
+def prefix_dataset(prefixes, packets, max_packets=MAX_PACKETS):
+    """DataFrame with TYPE, the early_columns of every flow cut at 'packets' packets, and DECISION_TIME."""
+    columns = early_columns(max_packets)
+    features = np.array([flow.features(packets, max_packets) for _, flow in prefixes]).reshape(-1, len(columns))
+    df = pd.DataFrame(features, columns=columns)
+    df.insert(0, 'TYPE', pd.Categorical([label for label, _ in prefixes]))
+    df['PACKETS'] = [min(packets, len(flow.sizes)) for _, flow in prefixes]
+    df['DECISION_TIME'] = [flow.elapsed(packets) for _, flow in prefixes]
+    return df
+
+
+def _fit_checkpoint(train_df, model_name, columns, report=False):
+    """Fit one model on flows cut at one checkpoint; returns (model, scaler, label_mapping_inv, accuracies).
+
+    With 'report', the accuracies of train_and_evaluate_model's split of the
+    (resampled) flows are computed first; the model returned is always fitted
+    on all of them.
+    """
+    from traffic_classifier import build_classifiers, prepare_data_for_classification, train_and_evaluate_model
+
+    X, y, label_mapping_inv, scaler = prepare_data_for_classification(train_df, return_scaler=True, feature_cols=columns)
+    clf = build_classifiers()[model_name]
+    if not hasattr(clf, "predict_proba"):
+        raise ValueError(f"{model_name} gives no class probabilities, which early decisions need")
+    accuracies = train_and_evaluate_model(clf, X, y, label_mapping_inv) if report else None
+    with instrumentation.stage("train"):
+        clf.fit(X, y)
+    return clf, scaler, label_mapping_inv, accuracies
+
+
+def train(prefixes, model_name="Random Forest", checkpoints=CHECKPOINTS, max_packets=MAX_PACKETS, threshold=THRESHOLD):
+    """Fit one model per checkpoint and return the artifact to save (see EarlyClassifier)."""
+    from traffic_classifier import attach_flat_model
+
+    columns = early_columns(max_packets)
+    models = {}
+    label_mapping_inv = None
+    for packets in checkpoints:
+        clf, scaler, label_mapping_inv, _ = _fit_checkpoint(prefix_dataset(prefixes, packets, max_packets), model_name, columns)
+        models[packets] = attach_flat_model({"model": clf, "scaler": scaler})
+    return {
+        "model_name": model_name,
+        "models": models,
+        "label_mapping_inv": label_mapping_inv,
+        "feature_columns": columns,
+        "max_packets": max_packets,
+        "threshold": threshold,
+    }
+
+
+def save_model(artifact, path):
+    joblib.dump(artifact, path)
+
+
+def load_model(path):
+    artifact = joblib.load(path)
+    if "models" not in artifact or artifact.get("feature_columns") != early_columns(artifact["max_packets"]):
+        raise ValueError(f"{path} is not an early-flow model (written by 'early_flow.py train')")
+    return artifact
+
+
+def _probabilities(entry, X):
+    """Class probabilities of feature rows with one checkpoint's scaler and model."""
+    from traffic_classifier import flat_max_rows
+
+    # The same arithmetic as StandardScaler.transform, without its checks on every flow
+    scaler = entry["scaler"]
+    X = (np.asarray(X, dtype=np.float64) - scaler.mean_) / scaler.scale_
+    model = entry["flat_model"] if len(X) <= flat_max_rows(entry) else entry["model"]
+    return model.predict_proba(X)
+
+
+class EarlyClassifier:
+    """Labels each flow of a packet stream as early as the threshold allows.
+
+    add() and flush() return decision dicts (DECISION_COLUMNS); REASON is
+    CONFIDENT (threshold reached), LIMIT (last checkpoint) or END (the flow
+    ended first).
+    """
+
+    def __init__(self, artifact, threshold=None, idle_timeout=IDLE_TIMEOUT):
+        self.artifact = artifact
+        self.threshold = artifact["threshold"] if threshold is None else threshold
+        self.checkpoints = sorted(artifact["models"])
+        self.max_packets = artifact["max_packets"]
+        self.table = PrefixTable(self.max_packets, idle_timeout)
+
+    def _decide(self, flow, packets, reason):
+        checkpoint = next(c for c in self.checkpoints if c >= min(packets, self.checkpoints[-1]))
+        x = flow.features(packets, self.max_packets)[None, :]
+        probabilities = _probabilities(self.artifact["models"][checkpoint], x)[0]
+        best = int(probabilities.argmax())
+        if reason is None:
+            if probabilities[best] < self.threshold:
+                return None
+            reason = "CONFIDENT"
+        flow.decided = True
+        instrumentation.count("flows_decided")
+        return {
+            'SRC_IP': flow.src_ip, 'SRC_PORT': flow.src_port,
+            'DST_IP': flow.dst_ip, 'DST_PORT': flow.dst_port,
+            'PROTOCOL': flow.protocol, 'START': flow.start,
+            'PACKETS': min(packets, len(flow.sizes)), 'DECISION_TIME': flow.elapsed(packets),
+            'PREDICTED_TYPE': self.artifact["label_mapping_inv"][best],
+            'CONFIDENCE': float(probabilities[best]), 'REASON': reason,
+        }
+
+    def _ended(self, flows):
+        decisions = []
+        for flow in flows:
+            if not flow.decided:
+                decisions.append(self._decide(flow, len(flow.sizes), "END"))
+        return decisions
+
+    def add(self, pkt):
+        flow, finished = self.table.add(pkt)
+        decisions = self._ended(finished)
+        if flow is not None and not flow.decided and flow.packets in self.checkpoints:
+            reason = "LIMIT" if flow.packets == self.checkpoints[-1] else None
+            decision = self._decide(flow, flow.packets, reason)
+            if decision is not None:
+                decisions.append(decision)
+        return decisions
+
+    def flush(self):
+        return self._ended(self.table.flush())
+
+
+def iter_decisions(artifact, packets, threshold=None, idle_timeout=IDLE_TIMEOUT):
+    """Yield the decision of every flow of a stream of PacketRecord tuples as soon as it is made."""
+    classifier = EarlyClassifier(artifact, threshold, idle_timeout)
+    for pkt in packets:
+        yield from classifier.add(pkt)
+    yield from classifier.flush()
+
+
+def simulate(probabilities, packets, times, flow_packets, threshold, checkpoints):
+    """Decisions an EarlyClassifier would make, from per-checkpoint class probabilities of the same flows.
+
+    probabilities[i] (flows x classes), packets[i] and times[i] belong to checkpoints[i];
+    returns (predicted class, packets used, time to decision, confident) arrays.
+    """
+    n = len(flow_packets)
+    decided = np.zeros(n, dtype=bool)
+    predicted = np.zeros(n, dtype=np.intp)
+    used = np.zeros(n, dtype=np.intp)
+    elapsed = np.zeros(n)
+    confident = np.zeros(n, dtype=bool)
+    for i, checkpoint in enumerate(checkpoints):
+        sure = probabilities[i].max(axis=1) >= threshold
+        # Flows that reached the threshold here, or end by this checkpoint, or hit the last one
+        now = ~decided & (sure | (flow_packets <= checkpoint) | (i == len(checkpoints) - 1))
+        predicted[now] = probabilities[i][now].argmax(axis=1)
+        used[now] = packets[i][now]
+        elapsed[now] = times[i][now]
+        confident[now] = sure[now]
+        decided |= now
+    return predicted, used, elapsed, confident
+
+
+def evaluate(prefixes, model_name="Random Forest", checkpoints=CHECKPOINTS, max_packets=MAX_PACKETS,
+             thresholds=(0.5, 0.7, 0.8, 0.9, 0.95), test_size=0.3):
+    """Accuracy per checkpoint and, per threshold, accuracy vs packets needed and time to decision.
+
+    The flows are split once; the models are trained on the training flows
+    (reporting the usual train_and_evaluate_model accuracy) and the early
+    decisions are simulated on the held-out flows.
+    """
+    from sklearn.model_selection import train_test_split
+
+    columns = early_columns(max_packets)
+    labels = np.array([label for label, _ in prefixes])
+    train_index, test_index = train_test_split(np.arange(len(prefixes)), test_size=test_size,
+                                               random_state=42, stratify=labels)
+    train_flows = [prefixes[i] for i in train_index]
+    test_flows = [prefixes[i] for i in test_index]
+    flow_packets = np.array([len(flow.sizes) for _, flow in test_flows])
+
+    print(f"{len(train_flows)} training flows, {len(test_flows)} held-out flows\n")
+    print(f"{'packets':>8}{'train split acc':>17}{'held-out acc':>14}")
+    probabilities, packets, times = [], [], []
+    y_test = None
+    for checkpoint in checkpoints:
+        clf, scaler, label_mapping_inv, (_, split_accuracy) = _fit_checkpoint(
+            prefix_dataset(train_flows, checkpoint, max_packets), model_name, columns, report=True)
+        test_df = prefix_dataset(test_flows, checkpoint, max_packets)
+        if y_test is None:
+            index = {label: i for i, label in label_mapping_inv.items()}
+            y_test = np.array([index[label] for label in test_df['TYPE'].astype(str)])
+        with instrumentation.stage("predict"):
+            probabilities.append(_probabilities({"model": clf, "scaler": scaler}, test_df[columns]))
+        packets.append(test_df['PACKETS'].to_numpy())
+        times.append(test_df['DECISION_TIME'].to_numpy())
+        held_out = (probabilities[-1].argmax(axis=1) == y_test).mean()
+        print(f"{checkpoint:>8}{split_accuracy:>17.4f}{held_out:>14.4f}")
+
+    print(f"\n{'threshold':>10}{'accuracy':>10}{'confident':>11}{'acc (conf.)':>13}"
+          f"{'packets mean':>14}{'p50':>6}{'p90':>6}{'time p50 (s)':>14}{'time p90 (s)':>14}")
+    for threshold in thresholds:
+        predicted, used, elapsed, confident = simulate(
+            probabilities, packets, times, flow_packets, threshold, checkpoints)
+        correct = predicted == y_test
+        confident_accuracy = correct[confident].mean() if confident.any() else float("nan")
+        print(f"{threshold:>10.2f}{correct.mean():>10.4f}{confident.mean():>11.1%}{confident_accuracy:>13.4f}"
+              f"{used.mean():>14.1f}{np.percentile(used, 50):>6.0f}{np.percentile(used, 90):>6.0f}"
+              f"{np.percentile(elapsed, 50):>14.3f}{np.percentile(elapsed, 90):>14.3f}")
+
+
+def checkpoints_for(values, max_packets):
+    """Sorted checkpoints from --checkpoints (default: CHECKPOINTS below max_packets, then max_packets)."""
+    checkpoints = sorted(set(values or [c for c in CHECKPOINTS if c < max_packets] + [max_packets]))
+    if checkpoints[-1] > max_packets or checkpoints[0] < 1:
+        raise SystemExit(f"checkpoints must be between 1 and --max-packets ({max_packets})")
+    return checkpoints
+
+
+def run(args):
+    """Run the train, evaluate or predict action of the parsed arguments (main, cli.py early)."""
+    if args.action == "predict":
+        artifact = load_model(args.model)
+        out = open(args.output, "w", newline="") if args.output else sys.stdout
+        try:
+            writer = csv.DictWriter(out, fieldnames=DECISION_COLUMNS)
+            writer.writeheader()
+            for decision in iter_decisions(artifact, read_packets(args.capture), args.threshold):
+                writer.writerow(decision)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        return
+
+    from analyze_traffic_1 import apps
+    checkpoints = checkpoints_for(args.checkpoints, args.max_packets)
+    prefixes = capture_prefixes(labelled_inputs(args.inputs, apps, args.data_dir), args.max_packets)
+    if args.action == "evaluate":
+        evaluate(prefixes, args.model, checkpoints, args.max_packets, args.thresholds)
+        return
+    artifact = train(prefixes, args.model, checkpoints, args.max_packets, args.threshold)
+    save_model(artifact, args.output)
+    print(f"Saved {args.model} ({len(checkpoints)} checkpoints) to {args.output}")
+
+
+def main():
+    from traffic_classifier import MODEL_NAMES
+
+    parser = argparse.ArgumentParser(description="Classify flows from their first packets.")
+    commands = parser.add_subparsers(dest="action", required=True)
+    train_parser = commands.add_parser("train", help="fit the per-checkpoint models on labelled captures and save them")
+    evaluate_parser = commands.add_parser("evaluate", help="accuracy vs packets needed and time to decision")
+    for command in (train_parser, evaluate_parser):
+        command.add_argument("inputs", nargs="*", metavar="LABEL=PATH",
+                             help="labelled captures (default: the captures of analyze_traffic_1.py)")
+        command.add_argument("--data-dir", help="folder holding the default captures (default: ../data)")
+        command.add_argument("--model", default="Random Forest", choices=MODEL_NAMES,
+                             help="model of traffic_classifier.py (default: %(default)s)")
+        command.add_argument("--max-packets", type=int, default=MAX_PACKETS)
+        command.add_argument("--checkpoints", type=int, nargs="+",
+                             help="packet counts at which flows are scored (default: 2 4 8 16 32, up to --max-packets)")
+    train_parser.add_argument("--threshold", type=float, default=THRESHOLD, help="default confidence (default: %(default)s)")
+    train_parser.add_argument("--output", default="early_model.joblib")
+    evaluate_parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95])
+    predict_parser = commands.add_parser("predict", help="label the flows of a capture as early as possible")
+    predict_parser.add_argument("capture")
+    predict_parser.add_argument("--model", default="early_model.joblib", help="file written by 'train'")
+    predict_parser.add_argument("--threshold", type=float, help="confidence needed (default: the one saved in the model)")
+    predict_parser.add_argument("--output", help="CSV to write the decisions to (default: stdout)")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from csv_loader import iter_csv
+from flow_table import FEATURE_COLUMNS
+
+# Compact binary flow datasets for the classifier.
+# A dataset is a folder '<name>.flows' holding
+#   features.f32  the FEATURE_COLUMNS of every flow as float32 rows (little-endian),
+#   type.u8       the TYPE of every flow as a code into the 'labels' of meta.json
+#                 (UNLABELLED when the flow has none),
+#   meta.json     format version, feature columns, labels and number of rows.
+# Loading memory-maps both files, so there is no text parsing or numeric
+# coercion and the rows are only paged in when they are used. Converters read
+# the Kaggle-style dataset CSV, flow_table.py exports and captures in chunks.
+
+FORMAT_VERSION = 1
+UNLABELLED = 255
+MAX_LABELS = 255
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap")
+CHUNK_ROWS = 1_000_000
+
+
+def is_flow_records(path):
+    """True if 'path' is a binary flow dataset (a '.flows' folder)."""
+    return os.path.isfile(os.path.join(path, "meta.json")) or path.rstrip("/\\").endswith(".flows")
+
+
+class FlowRecords:
+    """A loaded dataset: 'features' (rows x FEATURE_COLUMNS, float32), 'codes' (uint8) and 'labels'."""
+
+    def __init__(self, features, codes, labels):
+        self.features = features
+        self.codes = codes
+        self.labels = labels
+
+    def __len__(self):
+        return len(self.codes)
+
+    def type_labels(self, start=0, stop=None):
+        """The TYPE of rows start:stop as strings (None for unlabelled rows)."""
+        names = np.array(list(self.labels) + [None] * (UNLABELLED + 1 - len(self.labels)), dtype=object)
+        return names[self.codes[start:stop]]
+
+    def to_frame(self):
+        """DataFrame with TYPE (categorical) and the feature columns, sharing memory with the mapped file."""
+        df = pd.DataFrame(self.features, columns=FEATURE_COLUMNS, copy=False)
+        codes = np.where(self.codes == UNLABELLED, -1, self.codes).astype(np.int16)
+        df.insert(0, "TYPE", pd.Categorical.from_codes(codes, categories=self.labels))
+        return df
+
+
+def load_flow_records(path):
+    """Memory-map a binary flow dataset written by FlowRecordWriter."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported flow dataset version {meta.get('version')}")
+    if meta["feature_columns"] != list(FEATURE_COLUMNS):
+        raise ValueError(f"{path} has different feature columns: {meta['feature_columns']}")
+    rows, width = meta["rows"], len(FEATURE_COLUMNS)
+    if rows == 0:
+        return FlowRecords(np.zeros((0, width), dtype=np.float32), np.zeros(0, dtype=np.uint8), meta["labels"])
+    features = np.memmap(os.path.join(path, "features.f32"), dtype="<f4", mode="r", shape=(rows, width))
+    codes = np.memmap(os.path.join(path, "type.u8"), dtype=np.uint8, mode="r", shape=(rows,))
+    return FlowRecords(features, codes, meta["labels"])
+
+
+class FlowRecordWriter:
+    """Writes a binary flow dataset chunk by chunk; the folder appears complete on close()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_dir = path.rstrip("/\\") + ".tmp%d" % os.getpid()
+        os.makedirs(self.tmp_dir)
+        self._features = open(os.path.join(self.tmp_dir, "features.f32"), "wb")
+        self._codes = open(os.path.join(self.tmp_dir, "type.u8"), "wb")
+        self.labels = {}
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _codes_of(self, types):
+        """uint8 codes of a column of labels, adding new labels to the table."""
+        types = pd.Series(types, dtype=object)
+        missing = types.isna()
+        uniques = pd.unique(types[~missing].astype(str))
+        for label in uniques:
+            if label not in self.labels:
+                if len(self.labels) >= MAX_LABELS:
+                    raise ValueError(f"more than {MAX_LABELS} TYPE values")
+                self.labels[label] = len(self.labels)
+        codes = np.full(len(types), UNLABELLED, dtype=np.uint8)
+        if len(uniques):
+            codes[~missing.to_numpy()] = types[~missing].astype(str).map(self.labels).to_numpy(np.uint8)
+        return codes
+
+    def write_frame(self, df, label=None):
+        """Append the flows of a DataFrame with the FEATURE_COLUMNS and optionally TYPE.
+
+        Features are converted to numbers like traffic_classifier.feature_matrix
+        (invalid values become 0); 'label' is used when there is no TYPE column.
+        """
+        missing = [column for column in FEATURE_COLUMNS if column not in df.columns]
+        if missing:
+            raise ValueError(f"missing feature columns: {missing}")
+        features = df[FEATURE_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+        self._features.write(np.ascontiguousarray(features.to_numpy(dtype="<f4")).tobytes())
+        types = df['TYPE'] if 'TYPE' in df.columns else [label] * len(df)
+        self._codes.write(self._codes_of(types).tobytes())
+        self.rows += len(df)
+
+    def close(self):
+        self._features.close()
+        self._codes.close()
+        with open(os.path.join(self.tmp_dir, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "feature_columns": list(FEATURE_COLUMNS),
+                       "labels": list(self.labels), "rows": self.rows}, f)
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self.tmp_dir, self.path)
+
+    def abort(self):
+        self._features.close()
+        self._codes.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def _capture_frames(capture, chunk_size):
+    """DataFrames of the flow records of a capture (see flow_table.iter_flows)."""
+    from flow_table import iter_flows
+    from pcap_reader import read_packets
+
+    batch = []
+    for record in iter_flows(read_packets(capture)):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
+
+
+def convert(inputs, output, label=None, chunk_size=CHUNK_ROWS):
+    """Write the flows of CSV datasets/flow exports and captures into one binary dataset.
+
+    'label' is the TYPE of inputs that have no TYPE column (e.g. a capture of one application).
+    Returns the number of rows written.
+    """
+    wanted = set(FEATURE_COLUMNS) | {'TYPE'}
+    with FlowRecordWriter(output) as writer:
+        for path in inputs:
+            if path.lower().endswith(CAPTURE_EXTENSIONS):
+                frames = _capture_frames(path, chunk_size)
+            else:
+                frames = iter_csv(path, usecols=wanted, chunksize=chunk_size, use_cache=False)
+            for df in frames:
+                writer.write_frame(df, label)
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert flow datasets to the binary format read by traffic_classifier.py.")
+    parser.add_argument("inputs", nargs="+", help="dataset CSVs, flow_table.py exports or captures")
+    parser.add_argument("-o", "--output", required=True, help="dataset folder to write, e.g. ../data/traffic_dataset.flows")
+    parser.add_argument("--label", help="TYPE of the flows of inputs without a TYPE column")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    rows = convert(args.inputs, args.output, args.label, args.chunk_size)
+    print(f"Wrote {rows} flows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import csv
+import sys
+from collections import OrderedDict
+
+from pcap_reader import read_packets
+from streaming_stats import IntervalStats
+from tcp_flags import TCP_FLAG_BITS
+
+# Bidirectional flow aggregation.
+# Packets are grouped by their 5-tuple (both directions map to one flow) in a
+# hash table; flows are closed by idle/active timeouts or TCP FIN/RST and
+# written out as records with the feature columns of traffic_classifier.py.
+# TCP flows also get their handshake and teardown timing from the same pass.
+
+FEATURE_COLUMNS = [
+    'BYTES', 'BYTES_REV', 'INTERVALS_MEAN',
+    'INTERVALS_MAX', 'INTERVALS_STD', 'INTERVALS_25', 'INTERVALS_50', 'INTERVALS_75'
+]
+
+FLOW_ID_COLUMNS = [
+    'SRC_IP', 'SRC_PORT', 'DST_IP', 'DST_PORT', 'PROTOCOL',
+    'START', 'END', 'PACKETS', 'PACKETS_REV',
+]
+
+# TCP_FLAGS: every flag seen in the flow (bitwise OR)
+# HANDSHAKE_RTT: seconds from the first SYN to the first SYN-ACK in the other direction
+# TEARDOWN: seconds from the first FIN to the last packet of the flow
+# CLOSE: why the flow ended: FIN (both sides), RST, IDLE, ACTIVE (timeouts) or END (of the capture)
+TCP_COLUMNS = ['TCP_FLAGS', 'HANDSHAKE_RTT', 'TEARDOWN', 'CLOSE']
+
+TCP_FIN = TCP_FLAG_BITS["FIN"]
+TCP_SYN = TCP_FLAG_BITS["SYN"]
+TCP_RST = TCP_FLAG_BITS["RST"]
+TCP_ACK = TCP_FLAG_BITS["ACK"]
+
+# Seconds as in the capture timestamps; 1000 would give milliseconds
+INTERVAL_SCALE = 1.0
+
+# Seconds a flow is kept after both sides sent a FIN (like TCP's TIME_WAIT), so
+# the last ACK and retransmitted FINs are counted in it instead of starting new flows
+FIN_GRACE = 2.0
+
+
+class Flow:
+    """Counters of one bidirectional flow. 'Forward' is the direction of its first packet."""
+
+    __slots__ = ("src_ip", "src_port", "dst_ip", "dst_port", "protocol", "start", "end",
+                 "packets", "packets_rev", "bytes", "bytes_rev", "intervals", "fin_forward", "fin_reverse",
+                 "tcp_flags", "syn_time", "syn_forward", "handshake_rtt", "fin_time", "close")
+
+    def __init__(self, pkt):
+        self.src_ip, self.src_port = pkt.src_ip, pkt.src_port
+        self.dst_ip, self.dst_port = pkt.dst_ip, pkt.dst_port
+        self.protocol = pkt.transport or "IP"
+        self.start = self.end = pkt.timestamp
+        self.packets = self.packets_rev = 0
+        self.bytes = self.bytes_rev = 0
+        self.intervals = IntervalStats()
+        self.fin_forward = self.fin_reverse = False
+        self.tcp_flags = 0
+        self.syn_time = self.handshake_rtt = self.fin_time = None
+        self.syn_forward = True
+        self.close = None
+
+    def add(self, pkt):
+        if self.packets or self.packets_rev:
+            self.intervals.append(max(pkt.timestamp - self.end, 0.0))
+        self.end = max(self.end, pkt.timestamp)
+        size = pkt.length or 0
+        forward = pkt.src_ip == self.src_ip and pkt.src_port == self.src_port
+        if forward:
+            self.packets += 1
+            self.bytes += size
+        else:
+            self.packets_rev += 1
+            self.bytes_rev += size
+
+        flags = pkt.tcp_flags
+        if flags:
+            self.tcp_flags |= flags
+            if flags & TCP_SYN:
+                if not flags & TCP_ACK:
+                    if self.syn_time is None:
+                        self.syn_time = pkt.timestamp
+                        self.syn_forward = forward
+                elif self.handshake_rtt is None and self.syn_time is not None and forward != self.syn_forward:
+                    self.handshake_rtt = max(pkt.timestamp - self.syn_time, 0.0)
+            if flags & TCP_FIN:
+                if self.fin_time is None:
+                    self.fin_time = pkt.timestamp
+                if forward:
+                    self.fin_forward = True
+                else:
+                    self.fin_reverse = True
+
+    def record(self, interval_scale=INTERVAL_SCALE):
+        """Return the flow as a dict with FLOW_ID_COLUMNS + TCP_COLUMNS + FEATURE_COLUMNS."""
+        row = {
+            'SRC_IP': self.src_ip, 'SRC_PORT': self.src_port,
+            'DST_IP': self.dst_ip, 'DST_PORT': self.dst_port,
+            'PROTOCOL': self.protocol, 'START': self.start, 'END': self.end,
+            'PACKETS': self.packets, 'PACKETS_REV': self.packets_rev,
+            'TCP_FLAGS': self.tcp_flags if self.protocol == "TCP" else None,
+            'HANDSHAKE_RTT': self.handshake_rtt,
+            'TEARDOWN': None if self.fin_time is None else self.end - self.fin_time,
+            'CLOSE': self.close,
+            'BYTES': self.bytes, 'BYTES_REV': self.bytes_rev,
+        }
+        row.update(self.intervals.features(interval_scale))
+        return row
+
+
+def flow_key(pkt):
+    """Direction-independent 5-tuple key of a packet."""
+    a = (pkt.src_ip, pkt.src_port or 0)
+    b = (pkt.dst_ip, pkt.dst_port or 0)
+    if a <= b:
+        return a + b + (pkt.transport,)
+    return b + a + (pkt.transport,)
+
+
+class FlowTable:
+    """Hash table of active flows with idle and active timeouts.
+
+    Flows are kept in an OrderedDict in least-recently-seen order, so expiring
+    idle flows only looks at the front of the table. TCP flows whose two sides
+    both sent a FIN move to 'closing' and are written out once they have been
+    quiet for fin_grace seconds.
+    """
+
+    def __init__(self, idle_timeout=30.0, active_timeout=300.0, interval_scale=INTERVAL_SCALE,
+                 fin_grace=FIN_GRACE):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.interval_scale = interval_scale
+        self.fin_grace = fin_grace
+        self.flows = OrderedDict()
+        self.closing = OrderedDict()
+
+    def add(self, pkt):
+        """Add a PacketRecord and return the records of flows that ended because of it."""
+        if pkt.src_ip is None or pkt.timestamp is None:
+            return []
+        now = pkt.timestamp
+        finished = self.expire(now)
+
+        key = flow_key(pkt)
+        flow = self.closing.get(key)
+        if flow is not None:
+            flags = pkt.tcp_flags or 0
+            if flags & TCP_SYN and not flags & TCP_ACK:
+                # The port pair is reused by a new connection
+                finished.append(self._close(self.closing.pop(key), "FIN"))
+            else:
+                flow.add(pkt)
+                self.closing.move_to_end(key)
+                return finished
+
+        flow = self.flows.get(key)
+        if flow is not None and now - flow.start > self.active_timeout:
+            finished.append(self._close(self.flows.pop(key), "ACTIVE"))
+            flow = None
+        if flow is None:
+            flow = Flow(pkt)
+            self.flows[key] = flow
+        else:
+            self.flows.move_to_end(key)
+        flow.add(pkt)
+
+        if pkt.transport == "TCP" and pkt.tcp_flags:
+            if pkt.tcp_flags & TCP_RST:
+                finished.append(self._close(self.flows.pop(key), "RST"))
+            elif pkt.tcp_flags & TCP_FIN and flow.fin_forward and flow.fin_reverse:
+                self.closing[key] = self.flows.pop(key)
+        return finished
+
+    def _close(self, flow, reason):
+        flow.close = reason
+        return flow.record(self.interval_scale)
+
+    def expire(self, now):
+        """Close the flows that have been idle for longer than idle_timeout
+        and the closing flows that have been quiet for longer than fin_grace."""
+        finished = []
+        closing = self.closing
+        while closing:
+            key, flow = next(iter(closing.items()))
+            if now - flow.end <= self.fin_grace:
+                break
+            del closing[key]
+            finished.append(self._close(flow, "FIN"))
+        flows = self.flows
+        while flows:
+            key, flow = next(iter(flows.items()))
+            if now - flow.end <= self.idle_timeout:
+                break
+            del flows[key]
+            finished.append(self._close(flow, "IDLE"))
+        return finished
+
+    def flush(self):
+        """Close every remaining flow (end of the capture)."""
+        finished = [self._close(flow, "FIN") for flow in self.closing.values()]
+        finished += [self._close(flow, "END") for flow in self.flows.values()]
+        self.closing.clear()
+        self.flows.clear()
+        return finished
+
+
+def iter_flows(packets, idle_timeout=30.0, active_timeout=300.0, interval_scale=INTERVAL_SCALE):
+    """Yield completed flow records from a stream of PacketRecord tuples."""
+    table = FlowTable(idle_timeout, active_timeout, interval_scale)
+    for pkt in packets:
+        yield from table.add(pkt)
+    yield from table.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate a capture into bidirectional flow records.")
+    parser.add_argument("capture", help=".pcap/.pcapng file")
+    parser.add_argument("-o", "--output", help="CSV file to write (default: stdout)")
+    parser.add_argument("--label", help="value of the TYPE column (e.g. the application name)")
+    parser.add_argument("--idle-timeout", type=float, default=30.0, help="seconds (default: 30)")
+    parser.add_argument("--active-timeout", type=float, default=300.0, help="seconds (default: 300)")
+    parser.add_argument("--interval-scale", type=float, default=INTERVAL_SCALE,
+                        help="multiplier for the INTERVALS_* columns, e.g. 1000 for ms (default: 1)")
+    parser.add_argument("--backend", choices=["auto", "native", "pyshark"], default="auto")
+    args = parser.parse_args()
+
+    columns = FLOW_ID_COLUMNS + TCP_COLUMNS + FEATURE_COLUMNS + (['TYPE'] if args.label else [])
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        packets = read_packets(args.capture, args.backend)
+        for row in iter_flows(packets, args.idle_timeout, args.active_timeout, args.interval_scale):
+            if args.label:
+                row['TYPE'] = args.label
+            writer.writerow(row)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,688 @@
+import argparse
+import csv
+import hashlib
+import hmac
+import json
+import os
+import struct
+import sys
+from collections import Counter, OrderedDict
+
+from data_paths import labelled_inputs
+from pcap_reader import iter_packets
+
+# Handshake parsing stage: reads TLS ClientHello/ServerHello messages straight
+# from TCP payloads and from QUIC Initial packets, and turns them into
+# SNI, ALPN, versions, cipher suites and JA3/JA3S/JA4 fingerprints per connection.
+#
+# The parser is fed by the native capture reader (pcap_reader.FrameDecoder),
+# only for packets that start a TLS record or a QUIC long header and for the
+# continuation segments of an incomplete hello, so the rest of the capture
+# costs one check per packet. A TLS hello split over several TCP segments is
+# reassembled in arrival order (retransmissions and reordering are not handled).
+# QUIC Initial packets are encrypted with keys derived from the connection ID;
+# decrypting them needs the 'cryptography' package, without it QUIC
+# connections are skipped.
+#
+# FingerprintLabels maps fingerprints (and SNI) to application labels learned
+# from labelled captures, so labelling a connection is a dictionary lookup.
+
+HANDSHAKE_COLUMNS = [
+    'CLIENT_IP', 'CLIENT_PORT', 'SERVER_IP', 'SERVER_PORT', 'TRANSPORT', 'TIME',
+    'SNI', 'ALPN', 'TLS_VERSION', 'CIPHER', 'JA3', 'JA4', 'JA3S',
+]
+
+TLS_HANDSHAKE = 22
+CLIENT_HELLO = 1
+SERVER_HELLO = 2
+
+EXT_SERVER_NAME = 0x0000
+EXT_SUPPORTED_GROUPS = 0x000A
+EXT_EC_POINT_FORMATS = 0x000B
+EXT_SIGNATURE_ALGORITHMS = 0x000D
+EXT_ALPN = 0x0010
+EXT_SUPPORTED_VERSIONS = 0x002B
+
+TLS_VERSIONS = {0x0304: "1.3", 0x0303: "1.2", 0x0302: "1.1", 0x0301: "1.0", 0x0300: "SSL3"}
+JA4_VERSIONS = {0x0304: "13", 0x0303: "12", 0x0302: "11", 0x0301: "10", 0x0300: "s3"}
+
+# Hellos larger than this (several records) are not reassembled
+MAX_HELLO_BYTES = 64 * 1024
+
+# Seconds without packets after which the state of a direction is forgotten (as flow_table's idle timeout)
+IDLE_TIMEOUT = 30.0
+
+# QUIC versions whose Initial packets can be decrypted: version -> (Initial type, salt, label prefix)
+QUIC_VERSIONS = {
+    0x00000001: (0, bytes.fromhex("38762cf7f55934b34d179ae6a4c80cadccbb7f0a"), b"quic "),
+    0x6B3343CF: (1, bytes.fromhex("0dede3def700a6db819381be6e269dcbf9bd2ed9"), b"quicv2 "),
+}
+
+# QUIC frame types found in Initial packets
+QUIC_PADDING = 0x00
+QUIC_PING = 0x01
+QUIC_ACK = 0x02
+QUIC_ACK_ECN = 0x03
+QUIC_CRYPTO = 0x06
+QUIC_CONNECTION_CLOSE = 0x1C
+
+
+def is_grease(value):
+    """GREASE values (RFC 8701: 0x0a0a, 0x1a1a, ...) are ignored in fingerprints."""
+    return (value & 0x0F0F) == 0x0A0A and (value >> 8) == (value & 0xFF)
+
+
+def quic_decryption_available():
+    try:
+        import cryptography.hazmat.primitives.ciphers.aead  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# ---- TLS messages ----
+
+class _Reader:
+    """Bounds-checked reads from a bytes object (ValueError when a field is truncated)."""
+
+    def __init__(self, data, pos=0, end=None):
+        self.data = data
+        self.pos = pos
+        self.end = len(data) if end is None else end
+
+    def take(self, n):
+        if self.pos + n > self.end:
+            raise ValueError("truncated handshake message")
+        start = self.pos
+        self.pos += n
+        return self.data[start:self.pos]
+
+    def u8(self):
+        return self.take(1)[0]
+
+    def u16(self):
+        return int.from_bytes(self.take(2), "big")
+
+    def vector(self, length_bytes):
+        return self.take(int.from_bytes(self.take(length_bytes), "big"))
+
+    def remaining(self):
+        return self.end - self.pos
+
+
+def _u16_list(data):
+    return [int.from_bytes(data[i:i + 2], "big") for i in range(0, len(data) - 1, 2)]
+
+
+def _extensions(r):
+    """Return the (type, data) list of a hello's extension block (empty if there is none)."""
+    extensions = []
+    if r.remaining() < 2:
+        return extensions
+    block = _Reader(r.vector(2))
+    while block.remaining() >= 4:
+        ext_type = block.u16()
+        extensions.append((ext_type, block.vector(2)))
+    return extensions
+
+
+def _server_name(data):
+    r = _Reader(_Reader(data).vector(2))
+    while r.remaining() >= 3:
+        name_type, name = r.u8(), r.vector(2)
+        if name_type == 0:
+            return name.decode("ascii", "replace")
+    return None
+
+
+def _alpn(data):
+    r = _Reader(_Reader(data).vector(2))
+    protocols = []
+    while r.remaining():
+        protocols.append(r.vector(1).decode("ascii", "replace"))
+    return protocols
+
+
+def parse_client_hello(body):
+    """Return the fields of a ClientHello message body as a dict."""
+    r = _Reader(body)
+    version = r.u16()
+    r.take(32)                      # random
+    r.vector(1)                     # session id
+    ciphers = _u16_list(r.vector(2))
+    r.vector(1)                     # compression methods
+    hello = {
+        "version": version, "ciphers": ciphers, "extensions": [], "sni": None, "alpn": [],
+        "groups": [], "point_formats": [], "signature_algorithms": [], "supported_versions": [],
+    }
+    for ext_type, data in _extensions(r):
+        hello["extensions"].append(ext_type)
+        if ext_type == EXT_SERVER_NAME and data:
+            hello["sni"] = _server_name(data)
+        elif ext_type == EXT_ALPN:
+            hello["alpn"] = _alpn(data)
+        elif ext_type == EXT_SUPPORTED_GROUPS:
+            hello["groups"] = _u16_list(_Reader(data).vector(2))
+        elif ext_type == EXT_EC_POINT_FORMATS:
+            hello["point_formats"] = list(_Reader(data).vector(1))
+        elif ext_type == EXT_SIGNATURE_ALGORITHMS:
+            hello["signature_algorithms"] = _u16_list(_Reader(data).vector(2))
+        elif ext_type == EXT_SUPPORTED_VERSIONS:
+            hello["supported_versions"] = _u16_list(_Reader(data).vector(1))
+    return hello
+
+
+def parse_server_hello(body):
+    """Return the fields of a ServerHello message body as a dict."""
+    r = _Reader(body)
+    version = r.u16()
+    r.take(32)
+    r.vector(1)
+    hello = {"version": version, "cipher": r.u16(), "extensions": [], "alpn": [], "selected_version": None}
+    r.u8()                          # compression method
+    for ext_type, data in _extensions(r):
+        hello["extensions"].append(ext_type)
+        if ext_type == EXT_SUPPORTED_VERSIONS and len(data) == 2:
+            hello["selected_version"] = int.from_bytes(data, "big")
+        elif ext_type == EXT_ALPN:
+            hello["alpn"] = _alpn(data)
+    return hello
+
+
+def handshake_message(stream):
+    """Return (type, body) of the first handshake message in a stream of handshake bytes, None if incomplete."""
+    if len(stream) < 4:
+        return None
+    length = int.from_bytes(stream[1:4], "big")
+    if len(stream) < 4 + length:
+        return None
+    return stream[0], bytes(stream[4:4 + length])
+
+
+def tls_handshake_bytes(records):
+    """Concatenate the payloads of the TLS handshake records at the start of a TCP stream.
+
+    A record cut off at the end of the stream contributes the bytes received
+    so far. Raises ValueError if the stream does not start with a handshake record.
+    """
+    out = bytearray()
+    pos = 0
+    while pos + 5 <= len(records):
+        content_type, major = records[pos], records[pos + 1]
+        if content_type != TLS_HANDSHAKE or major != 3:
+            if not out:
+                raise ValueError("not a TLS handshake record")
+            break
+        length = int.from_bytes(records[pos + 3:pos + 5], "big")
+        out += records[pos + 5:pos + 5 + length]
+        pos += 5 + length
+    return bytes(out)
+
+
+# ---- fingerprints ----
+
+def ja3(hello):
+    """JA3 string and MD5 of a ClientHello (GREASE values removed)."""
+    fields = [
+        str(hello["version"]),
+        "-".join(str(c) for c in hello["ciphers"] if not is_grease(c)),
+        "-".join(str(e) for e in hello["extensions"] if not is_grease(e)),
+        "-".join(str(g) for g in hello["groups"] if not is_grease(g)),
+        "-".join(str(p) for p in hello["point_formats"]),
+    ]
+    text = ",".join(fields)
+    return text, hashlib.md5(text.encode()).hexdigest()
+
+
+def ja3s(hello):
+    """JA3S string and MD5 of a ServerHello."""
+    text = "%d,%d,%s" % (hello["version"], hello["cipher"], "-".join(str(e) for e in hello["extensions"]))
+    return text, hashlib.md5(text.encode()).hexdigest()
+
+
+def _sha12(values):
+    if not values:
+        return "000000000000"
+    return hashlib.sha256(values.encode()).hexdigest()[:12]
+
+
+def ja4(hello, quic=False):
+    """JA4 fingerprint of a ClientHello: <proto><version><sni><#ciphers><#extensions><alpn>_<ciphers>_<extensions>."""
+    versions = [v for v in hello["supported_versions"] if not is_grease(v)]
+    version = max(versions) if versions else hello["version"]
+    ciphers = [c for c in hello["ciphers"] if not is_grease(c)]
+    extensions = [e for e in hello["extensions"] if not is_grease(e)]
+    alpn = hello["alpn"][0] if hello["alpn"] else ""
+    part_a = "%s%s%s%02d%02d%s" % (
+        "q" if quic else "t",
+        JA4_VERSIONS.get(version, "00"),
+        "d" if hello["sni"] else "i",
+        min(len(ciphers), 99),
+        min(len(extensions), 99),
+        (alpn[0] + alpn[-1]) if alpn else "00",
+    )
+    part_b = _sha12(",".join("%04x" % c for c in sorted(ciphers)))
+    signed = ",".join("%04x" % e for e in sorted(extensions) if e not in (EXT_SERVER_NAME, EXT_ALPN))
+    algorithms = ",".join("%04x" % s for s in hello["signature_algorithms"])
+    part_c = _sha12(signed + "_" + algorithms if algorithms else signed)
+    return "%s_%s_%s" % (part_a, part_b, part_c)
+
+
+# ---- QUIC Initial packets ----
+
+def _varint(data, pos):
+    """Decode a QUIC variable-length integer; return (value, next position)."""
+    if pos >= len(data):
+        raise ValueError("truncated QUIC packet")
+    length = 1 << (data[pos] >> 6)
+    if pos + length > len(data):
+        raise ValueError("truncated QUIC packet")
+    value = data[pos] & 0x3F
+    for i in range(1, length):
+        value = (value << 8) | data[pos + i]
+    return value, pos + length
+
+
+def _hkdf_expand_label(secret, label, length):
+    """TLS 1.3 HKDF-Expand-Label with SHA-256 and an empty context."""
+    full_label = b"tls13 " + label
+    info = struct.pack("!HB", length, len(full_label)) + full_label + b"\x00"
+    out, block, counter = b"", b"", 1
+    while len(out) < length:
+        block = hmac.new(secret, block + info + bytes([counter]), hashlib.sha256).digest()
+        out += block
+        counter += 1
+    return out[:length]
+
+
+def initial_keys(version, dcid, server=False):
+    """(key, iv, header protection key) protecting the Initial packets of one side of a connection."""
+    _, salt, prefix = QUIC_VERSIONS[version]
+    initial_secret = hmac.new(salt, dcid, hashlib.sha256).digest()
+    secret = _hkdf_expand_label(initial_secret, b"server in" if server else b"client in", 32)
+    return (_hkdf_expand_label(secret, prefix + b"key", 16),
+            _hkdf_expand_label(secret, prefix + b"iv", 12),
+            _hkdf_expand_label(secret, prefix + b"hp", 16))
+
+
+def quic_initial_header(packet):
+    """Parse the long header of a QUIC Initial packet.
+
+    Returns (version, dcid, packet number offset, end of the packet) or None
+    when the packet is not an Initial of a known version.
+    """
+    if len(packet) < 7 or not packet[0] & 0x80:
+        return None
+    version = int.from_bytes(packet[1:5], "big")
+    if version not in QUIC_VERSIONS or (packet[0] >> 4) & 0x03 != QUIC_VERSIONS[version][0]:
+        return None
+    pos = 5
+    dcid_len = packet[pos]
+    dcid = bytes(packet[pos + 1:pos + 1 + dcid_len])
+    pos += 1 + dcid_len
+    if pos >= len(packet):
+        return None
+    pos += 1 + packet[pos]                          # source connection ID
+    token_len, pos = _varint(packet, pos)
+    pos += token_len
+    length, pos = _varint(packet, pos)
+    return version, dcid, pos, min(pos + length, len(packet))
+
+
+def decrypt_initial(packet, keys):
+    """Remove the header protection of an Initial packet and decrypt its payload (needs 'cryptography')."""
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    header = quic_initial_header(packet)
+    if header is None:
+        raise ValueError("not a QUIC Initial packet")
+    _, _, pn_offset, end = header
+    key, iv, hp = keys
+    sample = bytes(packet[pn_offset + 4:pn_offset + 20])
+    if len(sample) < 16:
+        raise ValueError("truncated QUIC packet")
+    encryptor = Cipher(algorithms.AES(hp), modes.ECB()).encryptor()
+    mask = encryptor.update(sample) + encryptor.finalize()
+    first = packet[0] ^ (mask[0] & 0x0F)
+    pn_length = (first & 0x03) + 1
+    pn_bytes = bytes(b ^ m for b, m in zip(packet[pn_offset:pn_offset + pn_length], mask[1:1 + pn_length]))
+    aad = bytes([first]) + bytes(packet[1:pn_offset]) + pn_bytes
+    nonce = bytes(a ^ b for a, b in zip(iv, int.from_bytes(pn_bytes, "big").to_bytes(12, "big")))
+    try:
+        return AESGCM(key).decrypt(nonce, bytes(packet[pn_offset + pn_length:end]), aad)
+    except InvalidTag:
+        raise ValueError("QUIC Initial packet could not be decrypted")
+
+
+def crypto_frames(payload):
+    """Yield (offset, data) of the CRYPTO frames in a decrypted Initial payload."""
+    pos = 0
+    while pos < len(payload):
+        frame_type, pos = _varint(payload, pos)
+        if frame_type in (QUIC_PADDING, QUIC_PING):
+            continue
+        if frame_type == QUIC_CRYPTO:
+            offset, pos = _varint(payload, pos)
+            length, pos = _varint(payload, pos)
+            yield offset, payload[pos:pos + length]
+            pos += length
+        elif frame_type in (QUIC_ACK, QUIC_ACK_ECN):
+            _, pos = _varint(payload, pos)             # largest acknowledged
+            _, pos = _varint(payload, pos)             # ack delay
+            ranges, pos = _varint(payload, pos)
+            _, pos = _varint(payload, pos)             # first range
+            for _ in range(2 * ranges + (3 if frame_type == QUIC_ACK_ECN else 0)):
+                _, pos = _varint(payload, pos)
+        elif frame_type == QUIC_CONNECTION_CLOSE:
+            return
+        else:
+            raise ValueError("unexpected QUIC frame type 0x%x in an Initial packet" % frame_type)
+
+
+class _CryptoStream:
+    """CRYPTO frame data of one direction, reassembled by offset."""
+
+    def __init__(self):
+        self.fragments = {}
+
+    def add(self, offset, data):
+        self.fragments[offset] = bytes(data)
+
+    def contiguous(self):
+        out = bytearray()
+        while len(out) in self.fragments:
+            fragment = self.fragments[len(out)]
+            if not fragment:
+                break
+            out += fragment
+        return bytes(out)
+
+    def size(self):
+        return sum(len(data) for data in self.fragments.values())
+
+
+# ---- the parsing stage ----
+
+class HandshakeParser:
+    """Collects the hellos of every TLS/QUIC connection of a capture.
+
+    'connections' maps (client ip, client port, server ip, server port, transport)
+    to a dict with the parsed ClientHello ("client") and ServerHello ("server"),
+    their fingerprints and the time of the ClientHello.
+    The per-direction state ('pending', 'done', 'quic') is kept in last-seen
+    order and forgotten after idle_timeout seconds without packets; QUIC
+    decryption state is dropped as soon as both hellos are parsed.
+    """
+
+    def __init__(self, decrypt_quic=None, idle_timeout=IDLE_TIMEOUT):
+        self.connections = {}
+        self.pending = OrderedDict()    # (src, sport, dst, dport) -> (last seen, partial TCP stream bytes)
+        self.done = OrderedDict()       # directions whose hello was parsed (or given up on) -> last seen
+        self.quic = OrderedDict()       # client 4-tuple -> {"dcid", "version", "keys", "seen", "client", "server"}
+        self.decrypt_quic = quic_decryption_available() if decrypt_quic is None else decrypt_quic
+        self.idle_timeout = idle_timeout
+        self.now = 0.0                  # latest packet time (packets without a timestamp keep it)
+        self.errors = Counter()
+
+    def _expire(self, ts):
+        """Forget the state of directions that have been idle for longer than idle_timeout."""
+        if ts is not None:
+            self.now = ts
+        limit = self.now - self.idle_timeout
+        done, pending, quic = self.done, self.pending, self.quic
+        while done and next(iter(done.values())) < limit:
+            done.popitem(last=False)
+        while pending and next(iter(pending.values()))[0] < limit:
+            pending.popitem(last=False)
+        while quic and next(iter(quic.values()))["seen"] < limit:
+            quic.popitem(last=False)
+
+    def _finish(self, key):
+        """Mark the direction 'key' as done (or seen again)."""
+        self.done[key] = self.now
+        self.done.move_to_end(key)
+
+    def _connection(self, key, ts):
+        connection = self.connections.get(key)
+        if connection is None:
+            connection = self.connections[key] = {"time": ts, "client": None, "server": None}
+        return connection
+
+    def _hello(self, message, key, transport, ts):
+        """Store a handshake message sent in the direction 'key' = (src ip, src port, dst ip, dst port)."""
+        msg_type, body = message
+        if msg_type == CLIENT_HELLO:
+            connection = self._connection(key + (transport,), ts)
+            connection["time"] = ts
+            connection["client"] = parse_client_hello(body)
+        elif msg_type == SERVER_HELLO:
+            src_ip, sport, dst_ip, dport = key
+            connection = self._connection((dst_ip, dport, src_ip, sport, transport), ts)
+            connection["server"] = parse_server_hello(body)
+
+    def feed_tcp(self, ts, src_ip, sport, dst_ip, dport, buf, start, end):
+        """Add a TCP payload that starts a TLS record or continues a pending hello."""
+        if start >= end:
+            return
+        key = (src_ip, sport, dst_ip, dport)
+        self._expire(ts)
+        pending = self.pending.pop(key, None)
+        if pending is None:
+            if key in self.done:
+                self._finish(key)
+                return
+            if buf[start] != TLS_HANDSHAKE:
+                # Application data: the hello was before the start of the capture
+                self._finish(key)
+                return
+            stream = bytes(buf[start:end])
+        else:
+            stream = pending[1] + buf[start:end]
+        try:
+            message = handshake_message(tls_handshake_bytes(stream))
+            if message is None:
+                if len(stream) < MAX_HELLO_BYTES:
+                    # Wait for the next segments of this direction
+                    self.pending[key] = (self.now, stream)
+                    return
+                self.errors["oversized TLS hello"] += 1
+            else:
+                self._hello(message, key, "TLS", ts)
+        except ValueError:
+            self.errors["malformed TLS hello"] += 1
+        self._finish(key)
+
+    def feed_quic(self, ts, src_ip, sport, dst_ip, dport, buf, start, end):
+        """Add a UDP payload that starts with a QUIC long header."""
+        if not self.decrypt_quic:
+            return
+        key = (src_ip, sport, dst_ip, dport)
+        self._expire(ts)
+        if key in self.done:
+            self._finish(key)
+            return
+        packet = buf[start:end]
+        try:
+            header = quic_initial_header(packet)
+            if header is None:
+                return
+            version, dcid = header[0], header[1]
+            reverse = (dst_ip, dport, src_ip, sport)
+            client_key = key
+            state = self.quic.get(key)
+            server = False
+            if state is None:
+                state = self.quic.get(reverse)
+                server = state is not None
+                if server:
+                    client_key = reverse
+            if state is None:
+                # The first Initial of the client fixes the keys of both directions
+                state = self.quic[key] = {
+                    "version": version, "dcid": dcid,
+                    "keys": (initial_keys(version, dcid), initial_keys(version, dcid, server=True)),
+                    "client": _CryptoStream(), "server": _CryptoStream(),
+                }
+            state["seen"] = self.now
+            self.quic.move_to_end(client_key)
+            stream = state["server" if server else "client"]
+            for offset, data in crypto_frames(decrypt_initial(packet, state["keys"][server])):
+                stream.add(offset, data)
+        except ValueError:
+            # e.g. a server Initial whose client Initial was not captured, or a truncated datagram
+            self.errors["undecryptable QUIC Initial"] += 1
+            return
+        message = handshake_message(stream.contiguous())
+        if message is None:
+            if stream.size() >= MAX_HELLO_BYTES:
+                self.errors["oversized QUIC hello"] += 1
+                self._finish_quic(key, reverse, client_key)
+            return
+        try:
+            self._hello(message, key, "QUIC", ts)
+        except ValueError:
+            self.errors["malformed QUIC hello"] += 1
+        self._finish_quic(key, reverse, client_key)
+
+    def _finish_quic(self, key, reverse, client_key):
+        """Mark a QUIC direction as done; the decryption state goes once both directions are."""
+        self._finish(key)
+        if reverse in self.done:
+            self.quic.pop(client_key, None)
+
+    def handshakes(self):
+        """Yield one dict per connection with HANDSHAKE_COLUMNS (hellos missing on one side leave blanks)."""
+        for (client_ip, client_port, server_ip, server_port, transport), c in self.connections.items():
+            client, server = c["client"], c["server"]
+            row = dict.fromkeys(HANDSHAKE_COLUMNS)
+            row.update(CLIENT_IP=client_ip, CLIENT_PORT=client_port, SERVER_IP=server_ip,
+                       SERVER_PORT=server_port, TRANSPORT=transport, TIME=c["time"])
+            if client is not None:
+                row.update(SNI=client["sni"], ALPN=",".join(client["alpn"]) or None,
+                           JA3=ja3(client)[1], JA4=ja4(client, quic=transport == "QUIC"))
+            if server is not None:
+                version = server["selected_version"] or server["version"]
+                row.update(TLS_VERSION=TLS_VERSIONS.get(version, hex(version)),
+                           CIPHER="0x%04x" % server["cipher"], JA3S=ja3s(server)[1])
+                if server["alpn"]:
+                    row["ALPN"] = server["alpn"][0]
+            yield row
+
+
+def parse_handshakes(pcap_file, decrypt_quic=None):
+    """Read a capture with the native reader and return its HandshakeParser."""
+    parser = HandshakeParser(decrypt_quic)
+    for _ in iter_packets(pcap_file, handshakes=parser):
+        pass
+    return parser
+
+
+# ---- fingerprint -> label cache ----
+
+class FingerprintLabels:
+    """Application labels learned per fingerprint, looked up from the most to the least specific key.
+
+    Keys are JA4+SNI, SNI, JA4 and JA3; each keeps the count of every label
+    it was seen with and answers with the most frequent one.
+    """
+
+    def __init__(self, counts=None):
+        self.counts = {key: Counter(labels) for key, labels in (counts or {}).items()}
+        self._best = {key: labels.most_common(1)[0][0] for key, labels in self.counts.items()}
+
+    @staticmethod
+    def keys(handshake):
+        sni, ja4_value, ja3_value = handshake.get("SNI"), handshake.get("JA4"), handshake.get("JA3")
+        keys = []
+        if ja4_value and sni:
+            keys.append("ja4+sni:%s|%s" % (ja4_value, sni))
+        if sni:
+            keys.append("sni:" + sni)
+        if ja4_value:
+            keys.append("ja4:" + ja4_value)
+        if ja3_value:
+            keys.append("ja3:" + ja3_value)
+        return keys
+
+    def learn(self, handshake, label):
+        for key in self.keys(handshake):
+            counts = self.counts.setdefault(key, Counter())
+            counts[label] += 1
+            self._best[key] = counts.most_common(1)[0][0]
+
+    def label(self, handshake):
+        """Label of a handshake row (see HandshakeParser.handshakes), None if no key is known."""
+        best = self._best
+        for key in self.keys(handshake):
+            if key in best:
+                return best[key]
+        return None
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({key: dict(labels) for key, labels in self.counts.items()}, f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+def learn(inputs, db_path):
+    """Add the handshakes of labelled captures ({label: path}) to the label database at 'db_path'."""
+    labels = FingerprintLabels.load(db_path)
+    for label, path in inputs.items():
+        rows = list(parse_handshakes(path).handshakes())
+        for row in rows:
+            labels.learn(row, label)
+        print(f"{label}: {len(rows)} handshakes from {path}")
+    labels.save(db_path)
+
+
+def show(capture, db_path, out):
+    """Write the handshakes of a capture as CSV rows with HANDSHAKE_COLUMNS and their learned LABEL."""
+    labels = FingerprintLabels.load(db_path)
+    writer = csv.DictWriter(out, fieldnames=HANDSHAKE_COLUMNS + ['LABEL'])
+    writer.writeheader()
+    for row in parse_handshakes(capture).handshakes():
+        row['LABEL'] = labels.label(row)
+        writer.writerow(row)
+
+
+def run(args):
+    """Run the learn or show action of the parsed arguments (main, cli.py fingerprint)."""
+    if not quic_decryption_available():
+        print("'cryptography' is not installed: QUIC Initial packets are skipped", file=sys.stderr)
+    if args.action == "learn":
+        from analyze_traffic_1 import apps
+        learn(labelled_inputs(args.inputs, apps, args.data_dir), args.db)
+        return
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        show(args.capture, args.db, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TLS/QUIC handshake fingerprints (SNI, ALPN, JA3, JA4) per connection.")
+    commands = parser.add_subparsers(dest="action", required=True)
+    learn_parser = commands.add_parser("learn", help="add the fingerprints of labelled captures to the label database")
+    learn_parser.add_argument("inputs", nargs="*", metavar="LABEL=PATH",
+                              help="labelled captures (default: the captures of analyze_traffic_1.py)")
+    learn_parser.add_argument("--data-dir", help="folder holding the default captures (default: ../data)")
+    show_parser = commands.add_parser("show", help="write the handshakes of a capture as CSV, with their learned label")
+    show_parser.add_argument("capture")
+    show_parser.add_argument("-o", "--output", help="CSV file to write (default: stdout)")
+    for command in (learn_parser, show_parser):
+        command.add_argument("--db", default="fingerprints.json", help="label database (default: %(default)s)")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from csv_loader import iter_csv
+from data_paths import DATASET
+from flow_records import UNLABELLED, is_flow_records, load_flow_records
+from flow_table import FEATURE_COLUMNS
+from traffic_classifier import BoosterClassifier, attach_flat_model, feature_matrix, save_model
+
+# Out-of-core training for datasets that do not fit in memory.
+# The CSV (or binary dataset, see flow_records.py) is streamed in chunks three times:
+#   1. the StandardScaler is updated with partial_fit and the classes are counted,
+#   2. the model is trained chunk by chunk,
+#   3. the held-out rows are scored.
+# Class imbalance is handled with per-row weights (n / (k * count of the class))
+# instead of materializing SMOTE copies; --resample chunk applies SMOTE to each
+# chunk separately instead.
+
+TEST_EVERY = 5   # every 5th row is held out for evaluation
+CHUNK_ROWS = 200_000
+XGB_ROUNDS_PER_CHUNK = 20
+
+
+def _chunks(csv_path, chunk_size):
+    """Yield (feature DataFrame, labels, test mask) for each chunk of the dataset.
+
+    Rows without a TYPE are left out; the held-out rows are still chosen by
+    their position in the whole dataset.
+    """
+    if is_flow_records(csv_path):
+        # Binary datasets are sliced straight from the memory-mapped file
+        records = load_flow_records(csv_path)
+        for start in range(0, len(records), chunk_size):
+            labelled = records.codes[start:start + chunk_size] != UNLABELLED
+            X = pd.DataFrame(records.features[start:start + chunk_size][labelled],
+                             columns=FEATURE_COLUMNS).astype(np.float64)
+            labels = records.type_labels(start, start + chunk_size)[labelled].astype(str)
+            test = (np.arange(start, start + len(labelled))[labelled] % TEST_EVERY) == 0
+            yield X, labels, test
+        return
+    offset = 0
+    for chunk in iter_csv(csv_path, usecols=['TYPE'] + FEATURE_COLUMNS, dtype={'TYPE': 'category'},
+                          chunksize=chunk_size):
+        labelled = chunk['TYPE'].notna().to_numpy()
+        test = (np.arange(offset, offset + len(chunk))[labelled] % TEST_EVERY) == 0
+        offset += len(chunk)
+        if not labelled.all():
+            chunk = chunk[labelled]
+        X = feature_matrix(chunk).astype(np.float64)
+        labels = chunk['TYPE'].astype(str).to_numpy()
+        yield X, labels, test
+
+
+def fit_scaler_and_classes(csv_path, chunk_size=CHUNK_ROWS):
+    """First pass: running mean/variance of the training rows and the class counts."""
+    scaler = StandardScaler()
+    counts = Counter()
+    for X, labels, test in _chunks(csv_path, chunk_size):
+        if (~test).any():
+            scaler.partial_fit(X[~test])
+        counts.update(labels[~test])
+    return scaler, counts
+
+
+def class_weights(counts):
+    """Balanced weights, as class_weight='balanced' would compute them on the whole dataset."""
+    total = sum(counts.values())
+    return {label: total / (len(counts) * count) for label, count in counts.items()}
+
+
+def train_incremental(csv_path, model="sgd", chunk_size=CHUNK_ROWS, resample="weights", epochs=1):
+    """Train a model chunk by chunk and return (artifact, per-class accuracy, overall accuracy).
+
+    model: "sgd" (hinge-loss linear SVM with partial_fit) or "xgboost" (continued boosting).
+    resample: "weights" (per-row class weights) or "chunk" (SMOTE on each chunk).
+    The artifact has the same layout as traffic_classifier.train_model.
+    """
+    scaler, counts = fit_scaler_and_classes(csv_path, chunk_size)
+    classes = sorted(counts)
+    label_index = {label: i for i, label in enumerate(classes)}
+    weights = class_weights(counts)
+    weight_by_index = np.array([weights[label] for label in classes])
+
+    if model == "sgd":
+        clf = SGDClassifier(loss='hinge', alpha=1e-4, random_state=42)
+    elif model == "xgboost":
+        import xgboost as xgb
+        params = {"objective": "multi:softprob", "num_class": len(classes),
+                  "eval_metric": "mlogloss", "seed": 42}
+        booster = None
+    else:
+        raise ValueError(f"unknown incremental model: {model!r}")
+
+    for _ in range(epochs):
+        for X, labels, test in _chunks(csv_path, chunk_size):
+            train = ~test
+            if not train.any():
+                continue
+            X_train = scaler.transform(X[train])
+            y_train = np.array([label_index[label] for label in labels[train]])
+            sample_weight = weight_by_index[y_train]
+
+            if resample == "chunk" and len(np.unique(y_train)) > 1:
+                from imblearn.over_sampling import SMOTE
+                k = min(5, min(Counter(y_train).values()) - 1)
+                if k >= 1:
+                    X_train, y_train = SMOTE(random_state=42, k_neighbors=k).fit_resample(X_train, y_train)
+                sample_weight = None
+
+            if model == "sgd":
+                clf.partial_fit(X_train, y_train, classes=np.arange(len(classes)), sample_weight=sample_weight)
+            else:
+                dtrain = xgb.DMatrix(X_train, label=y_train, weight=sample_weight)
+                booster = xgb.train(params, dtrain, num_boost_round=XGB_ROUNDS_PER_CHUNK, xgb_model=booster)
+
+    if model == "xgboost":
+        clf = BoosterClassifier(booster)
+
+    # Third pass: score the held-out rows
+    correct = Counter()
+    seen = Counter()
+    for X, labels, test in _chunks(csv_path, chunk_size):
+        if not test.any():
+            continue
+        y_pred = clf.predict(scaler.transform(X[test]))
+        for label, predicted in zip(labels[test], y_pred):
+            seen[label] += 1
+            correct[label] += classes[predicted] == label
+    per_class = {label: correct[label] / seen[label] for label in classes if seen[label]}
+    overall = sum(correct.values()) / sum(seen.values()) if seen else 0
+
+    artifact = {
+        "model_name": f"incremental {model}",
+        "model": clf,
+        "scaler": scaler,
+        "label_mapping_inv": dict(enumerate(classes)),
+        "feature_columns": list(FEATURE_COLUMNS),
+    }
+    return attach_flat_model(artifact), per_class, overall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a traffic classifier chunk by chunk (out of core).")
+    parser.add_argument("--data", default=DATASET)
+    parser.add_argument("--model", choices=["sgd", "xgboost"], default="sgd")
+    parser.add_argument("--resample", choices=["weights", "chunk"], default="weights",
+                        help="class imbalance handling: per-row class weights or SMOTE per chunk")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--epochs", type=int, default=1, help="passes over the data for training")
+    parser.add_argument("--output", help="save the model for 'traffic_classifier.py predict'")
+    args = parser.parse_args()
+
+    artifact, per_class, overall = train_incremental(
+        args.data, args.model, args.chunk_size, args.resample, args.epochs
+    )
+    print(f"\n--- {artifact['model_name']} ---")
+    print("Per-Class Accuracy:")
+    for service, acc in per_class.items():
+        print(f"  {service}: {acc:.4f}")
+    print(f"Overall Model Accuracy: {overall:.4f}")
+    if args.output:
+        save_model(artifact, args.output)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
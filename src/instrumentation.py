@@ -0,0 +1,250 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Run instrumentation: per-stage timers, counters, memory sampling and an
+# optional profiler, written as one JSON report per run.
+#
+# Code marks its stages with 'with stage("read"):' or '@timed("read")' and
+# its work with 'count("packets", n)'. Nothing is recorded unless a report was
+# started with start(), so the hooks cost one check when instrumentation is off.
+# Stage times are exclusive: time spent in a nested stage is not counted
+# again in the enclosing one, so the stages add up to the measured total.
+# Stages used: read, decode, accumulate, aggregate, render, prepare, train, predict.
+
+_report = None
+
+
+class Report:
+    """Timers, counters and memory samples of one run."""
+
+    def __init__(self, sample_interval=0.1, profile=None):
+        self.started = time.time()
+        self.start_time = time.perf_counter()
+        self.stage_seconds = Counter()
+        self.stage_calls = Counter()
+        self.counters = Counter()
+        self._stack = []            # [stage name, start, time of nested stages]
+        self.sample_interval = sample_interval
+        self.memory_samples = []
+        self.peak_rss_mb = 0.0
+        self._stop = threading.Event()
+        self._sampler = None
+        self.profile = profile
+        self._profiler = None
+        self._samples = Counter()   # sampling profiler: (file, line, function) -> hits
+
+    # ---- timers and counters ----
+
+    def push(self, name):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def pop(self):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.stage_seconds[name] += elapsed - nested
+        self.stage_calls[name] += 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def add(self, name, seconds, calls=1):
+        """Add time measured elsewhere (e.g. inside a generator) to a stage."""
+        self.stage_seconds[name] += seconds
+        self.stage_calls[name] += calls
+        if self._stack:
+            self._stack[-1][2] += seconds
+
+    def merge(self, snapshot):
+        """Add the timers and counters of a worker process."""
+        self.stage_seconds.update(snapshot["stage_seconds"])
+        self.stage_calls.update(snapshot["stage_calls"])
+        self.counters.update(snapshot["counters"])
+        self.peak_rss_mb = max(self.peak_rss_mb, snapshot["peak_rss_mb"])
+
+    def snapshot(self):
+        return {
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_calls": dict(self.stage_calls),
+            "counters": dict(self.counters),
+            "peak_rss_mb": max(self.peak_rss_mb, _peak_rss_mb(resource.RUSAGE_SELF)),
+        }
+
+    # ---- memory sampling and profiling ----
+
+    def _sample(self, main_thread_id):
+        while not self._stop.wait(self.sample_interval):
+            rss = current_rss_mb()
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            self.memory_samples.append((round(time.perf_counter() - self.start_time, 3), round(rss, 1)))
+            if self.profile == "sample":
+                frame = sys._current_frames().get(main_thread_id)
+                if frame is not None:
+                    code = frame.f_code
+                    self._samples[(os.path.basename(code.co_filename), frame.f_lineno, code.co_name)] += 1
+
+    def begin(self):
+        if self.profile == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+        self._sampler.start()
+
+    def end(self, profile_output=None, top=25):
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._stop.set()
+        self._sampler.join()
+
+        total = time.perf_counter() - self.start_time
+        stage_total = sum(self.stage_seconds.values())
+        result = {
+            "started": self.started,
+            "wall_seconds": total,
+            "stages": {
+                name: {"seconds": self.stage_seconds[name], "calls": self.stage_calls[name]}
+                for name in sorted(self.stage_seconds, key=self.stage_seconds.get, reverse=True)
+            },
+            "unattributed_seconds": max(total - stage_total, 0.0),
+            "counters": dict(self.counters),
+            "rates": {},
+            "peak_rss_mb": max(self.peak_rss_mb, _peak_rss_mb(resource.RUSAGE_SELF)),
+            "peak_rss_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+            "memory_samples": self.memory_samples,
+        }
+        for name, value in self.counters.items():
+            result["rates"][name + "_per_s"] = value / total if total > 0 else 0
+
+        if self._profiler is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream).sort_stats("cumulative")
+            stats.print_stats(top)
+            result["profile"] = stream.getvalue().splitlines()
+            if profile_output:
+                stats.dump_stats(profile_output)
+        elif self.profile == "sample":
+            hits = sum(self._samples.values())
+            result["profile"] = [
+                {"file": f, "line": line, "function": function, "samples": n,
+                 "percent": n / hits * 100 if hits else 0}
+                for (f, line, function), n in self._samples.most_common(top)
+            ]
+        return result
+
+
+def _peak_rss_mb(who):
+    """Peak resident memory in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """Current resident memory of this process in MB (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return _peak_rss_mb(resource.RUSAGE_SELF)
+
+
+# ---- module-level hooks used by the rest of the code ----
+
+def active():
+    return _report is not None
+
+
+def start(profile=None, sample_interval=0.1):
+    """Start recording. profile: None, "cprofile" or "sample" (a low-overhead stack sampler)."""
+    global _report
+    _report = Report(sample_interval, profile)
+    _report.begin()
+    return _report
+
+
+def stop(path=None, profile_output=None):
+    """Stop recording and return the report; also write it as JSON when 'path' is given."""
+    global _report
+    report, _report = _report, None
+    if report is None:
+        return None
+    result = report.end(profile_output)
+    if path:
+        with open(path, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def stage(name):
+    """Context manager timing a stage (a no-op when no report is active)."""
+    if _report is None:
+        return nullcontext()
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name):
+    report = _report
+    report.push(name)
+    try:
+        yield
+    finally:
+        report.pop()
+
+
+def timed(name):
+    """Decorator timing every call of a function as stage 'name'."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _report is None:
+                return function(*args, **kwargs)
+            with _timed(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_time(name, seconds, calls=1):
+    if _report is not None:
+        _report.add(name, seconds, calls)
+
+
+def count(name, n=1):
+    if _report is not None:
+        _report.counters[name] += n
+
+
+def _run_instrumented(function, args):
+    start()
+    try:
+        value = function(*args)
+    finally:
+        snapshot = _report.snapshot()
+        stop()
+    return value, snapshot
+
+
+class _MergingFuture:
+    def __init__(self, future):
+        self.future = future
+
+    def result(self):
+        value, snapshot = self.future.result()
+        if _report is not None:
+            _report.merge(snapshot)
+        return value
+
+
+def submit(pool, function, *args):
+    """pool.submit that brings the worker's timers and counters back into the active report."""
+    if _report is None:
+        return pool.submit(function, *args)
+    return _MergingFuture(pool.submit(_run_instrumented, function, args))
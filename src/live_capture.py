@@ -0,0 +1,168 @@
+import argparse
+import json
+import socket
+import sys
+import time
+from collections import Counter, deque
+
+from local_network import LOCAL_PREFIXES, local_network
+from pcap_reader import LINKTYPE_ETHERNET, FrameDecoder, iter_stream_packets
+from tcp_flags import TCP_FLAGS_MAPPING
+
+# Live mode: the metrics of analyze_traffic_1.py over a sliding time window.
+# Packets come from a network interface (Linux AF_PACKET socket, needs root)
+# or from a pcap/pcapng stream such as 'tcpdump -w - | python live_capture.py --pcap-stream -'.
+
+ETH_P_ALL = 0x0003
+
+
+class RollingWindow:
+    """Protocol mix, TCP flags, direction, bit rate and inter-arrival time over the last 'window' seconds.
+
+    Counters are updated when a packet enters and again when it leaves the
+    window, so each packet costs O(1) and a report never rescans the window.
+    """
+
+    def __init__(self, window=10.0, local=LOCAL_PREFIXES):
+        self.window = window
+        self.local = local_network(local)
+        self._packets = deque()
+        self.protocol_counts = Counter()
+        self.tcp_flags_detail = Counter()
+        self.incoming = 0
+        self.outgoing = 0
+        self.total_bytes = 0
+
+    def _update(self, item, sign):
+        _, size, protocol, flag, direction = item
+        self.total_bytes += sign * size
+        self.protocol_counts[protocol] += sign
+        if flag is not None:
+            self.tcp_flags_detail[flag] += sign
+        if direction == "out":
+            self.outgoing += sign
+        elif direction == "in":
+            self.incoming += sign
+
+    def add(self, pkt):
+        """Add a PacketRecord and drop the packets that fell out of the window."""
+        flag = None
+        if pkt.transport == "TCP" and pkt.tcp_flags is not None:
+            flag = TCP_FLAGS_MAPPING.get(pkt.tcp_flags, "OTHER")
+        direction = self.local.direction(pkt.src_ip)
+        item = (pkt.timestamp, pkt.length or 0, pkt.protocol, flag, direction)
+        self._packets.append(item)
+        self._update(item, 1)
+        self.expire(pkt.timestamp)
+
+    def expire(self, now):
+        """Remove packets older than 'now - window'."""
+        packets = self._packets
+        while packets and packets[0][0] <= now - self.window:
+            self._update(packets.popleft(), -1)
+
+    def metrics(self, now):
+        """Return the current window metrics as a plain dictionary."""
+        total = len(self._packets)
+        direction_total = self.incoming + self.outgoing
+        flags_total = sum(self.tcp_flags_detail.values())
+        if total > 1:
+            avg_inter_arrival = (self._packets[-1][0] - self._packets[0][0]) / (total - 1)
+        else:
+            avg_inter_arrival = 0
+        return {
+            "time": now,
+            "window": self.window,
+            "packets": total,
+            "bits_per_second": self.total_bytes * 8 / self.window,
+            "avg_inter_arrival": avg_inter_arrival,
+            "protocol_percent": {
+                p: (c / total * 100) for p, c in self.protocol_counts.items() if c and total
+            },
+            "tcp_flags_percent": {
+                f: (c / flags_total * 100) for f, c in self.tcp_flags_detail.items() if c and flags_total
+            },
+            "incoming_percent": (self.incoming / direction_total * 100) if direction_total else 0,
+            "outgoing_percent": (self.outgoing / direction_total * 100) if direction_total else 0,
+        }
+
+
+def iter_interface_packets(interface, poll_interval=0.5):
+    """Yield PacketRecord tuples captured on a Linux network interface.
+
+    None is yielded when no packet arrived for 'poll_interval' seconds, so
+    the caller can still report on an idle link.
+    """
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.ntohs(ETH_P_ALL))
+    sock.bind((interface, 0))
+    sock.settimeout(poll_interval)
+    decoder = FrameDecoder()
+    try:
+        while True:
+            try:
+                frame = sock.recv(65535)
+            except socket.timeout:
+                yield None
+                continue
+            yield decoder.decode(LINKTYPE_ETHERNET, frame, 0, len(frame), time.time(), len(frame))
+    finally:
+        sock.close()
+
+
+def run(packets, window=10.0, step=1.0, local=LOCAL_PREFIXES, out=sys.stdout, use_packet_time=False):
+    """Feed packets into a RollingWindow and write one JSON report per 'step' seconds.
+
+    With use_packet_time the clock is the capture timestamps (for replayed
+    captures), otherwise it is the wall clock.
+    """
+    rolling = RollingWindow(window, local)
+    next_report = None
+    now = None
+    for pkt in packets:
+        if pkt is not None and pkt.timestamp is not None:
+            rolling.add(pkt)
+            now = pkt.timestamp if use_packet_time else time.time()
+        elif not use_packet_time:
+            now = time.time()
+        if now is None:
+            continue
+        if next_report is None:
+            next_report = now + step
+        while now >= next_report:
+            rolling.expire(next_report)
+            out.write(json.dumps(rolling.metrics(next_report)) + "\n")
+            out.flush()
+            next_report += step
+    if now is not None:
+        out.write(json.dumps(rolling.metrics(now)) + "\n")
+        out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live traffic metrics over a sliding time window.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--interface", help="network interface to capture from (Linux, needs root)")
+    source.add_argument("--pcap-stream", help="pcap/pcapng stream to read, '-' for stdin (e.g. a FIFO)")
+    parser.add_argument("--window", type=float, default=10.0, help="window length in seconds (default: 10)")
+    parser.add_argument("--step", type=float, default=1.0, help="seconds between reports (default: 1)")
+    parser.add_argument("--local-ip", nargs="+", default=LOCAL_PREFIXES, metavar="PREFIX",
+                        help="addresses or CIDR prefixes (IPv4/IPv6) of the local host (default: %(default)s)")
+    args = parser.parse_args()
+
+    try:
+        if args.interface:
+            run(iter_interface_packets(args.interface, min(args.step, 0.5)),
+                args.window, args.step, args.local_ip)
+        elif args.pcap_stream == "-":
+            run(iter_stream_packets(sys.stdin.buffer), args.window, args.step, args.local_ip,
+                use_packet_time=True)
+        else:
+            with open(args.pcap_stream, "rb") as stream:
+                run(iter_stream_packets(stream), args.window, args.step, args.local_ip,
+                    use_packet_time=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
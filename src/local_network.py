@@ -0,0 +1,89 @@
+import bisect
+import ipaddress
+
+import numpy as np
+
+# Incoming/outgoing direction from a set of local prefixes.
+# The prefixes (IPv4 and IPv6 CIDR blocks, or single addresses) are merged
+# into a sorted table of integer ranges per IP version; an address is local
+# when the range starting at or before it also ends after it (one bisect).
+# Lookups are memoized per address string, and a capture has few distinct
+# addresses, so classifying a packet is a dictionary lookup. A scan or a
+# spoofed source can bring millions of addresses, so the memo is emptied
+# whenever it reaches MAX_CACHED addresses.
+
+MAX_CACHED = 65536
+
+my_local_ip = "192.168.126.132"
+
+# Addresses of the capturing host: IPv4/IPv6 CIDR prefixes or single addresses.
+# Packets sent from one of them count as outgoing, the other IP packets as incoming.
+LOCAL_PREFIXES = [my_local_ip]
+
+
+class LocalNetwork:
+    """The addresses of the capturing host(s), given as CIDR prefixes or single addresses."""
+
+    def __init__(self, prefixes):
+        if isinstance(prefixes, str):
+            prefixes = [prefixes]
+        self.prefixes = [str(ipaddress.ip_network(p, strict=False)) for p in prefixes]
+        self._ranges = {4: ([], []), 6: ([], [])}    # version -> (starts, ends), sorted and disjoint
+        networks = sorted((ipaddress.ip_network(p) for p in self.prefixes),
+                          key=lambda n: (n.version, int(n.network_address)))
+        for network in networks:
+            starts, ends = self._ranges[network.version]
+            start, end = int(network.network_address), int(network.broadcast_address)
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self._cache = {}
+
+    def __repr__(self):
+        return "LocalNetwork(%r)" % (self.prefixes,)
+
+    def __getstate__(self):
+        # The memoized lookups are not sent to worker processes
+        return {"prefixes": self.prefixes}
+
+    def __setstate__(self, state):
+        self.__init__(state["prefixes"])
+
+    def _lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        starts, ends = self._ranges[address.version]
+        value = int(address)
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def is_local(self, ip):
+        """True if 'ip' (an address string) belongs to one of the local prefixes."""
+        try:
+            return self._cache[ip]
+        except KeyError:
+            if len(self._cache) >= MAX_CACHED:
+                self._cache.clear()
+            local = self._cache[ip] = ip is not None and self._lookup(ip)
+            return local
+
+    def direction(self, src_ip):
+        """'out' for packets sent from a local address, 'in' for the others, None if not IP."""
+        if src_ip is None:
+            return None
+        return "out" if self.is_local(src_ip) else "in"
+
+    def local_mask(self, addresses):
+        """Boolean array telling which entries of an address table are local."""
+        return np.fromiter((self.is_local(ip) for ip in addresses), dtype=bool, count=len(addresses))
+
+
+def local_network(value):
+    """Return 'value' as a LocalNetwork (it may be one already, a prefix string or a list of prefixes)."""
+    return value if isinstance(value, LocalNetwork) else LocalNetwork(value)
@@ -0,0 +1,63 @@
+import json
+import math
+
+# Saving and loading of the metrics computed by the analysis scripts.
+# Metrics are nested dictionaries: name (application/service) -> metric -> value,
+# where a value is a number, None, or a dict of counts (e.g. port -> packets).
+# A '.parquet' path stores them as a long table (name, metric, kind, key, value),
+# which needs pandas and pyarrow; any other path is written as JSON.
+
+
+def _to_builtin(value):
+    """Convert NumPy scalars to Python numbers so the metrics serialize as JSON."""
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def _rows(metrics):
+    for name, entry in metrics.items():
+        for metric, value in entry.items():
+            if isinstance(value, dict):
+                if not value:
+                    yield name, metric, "dict", None, math.nan
+                for key, count in value.items():
+                    yield name, metric, "dict", str(key), float(count)
+            elif value is None:
+                yield name, metric, "none", None, math.nan
+            else:
+                yield name, metric, "value", None, float(value)
+
+
+def write_metrics(metrics, path):
+    """Write metrics to a JSON file, or to a Parquet table when 'path' ends with .parquet."""
+    if path.endswith(".parquet"):
+        import pandas as pd
+        table = pd.DataFrame(list(_rows(metrics)), columns=["name", "metric", "kind", "key", "value"])
+        table.to_parquet(path, index=False)
+        return
+    with open(path, "w") as f:
+        json.dump(_to_builtin(metrics), f, indent=2)
+
+
+def read_metrics(path):
+    """Read metrics written by write_metrics (dict keys come back as strings)."""
+    if not path.endswith(".parquet"):
+        with open(path) as f:
+            return json.load(f)
+
+    import pandas as pd
+    metrics = {}
+    for name, metric, kind, key, value in pd.read_parquet(path).itertuples(index=False):
+        entry = metrics.setdefault(name, {})
+        if kind == "dict":
+            counts = entry.setdefault(metric, {})
+            if isinstance(key, str):
+                counts[key] = value
+        elif kind == "none":
+            entry[metric] = None
+        else:
+            entry[metric] = value
+    return metrics
@@ -0,0 +1,161 @@
+import argparse
+import json
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+from data_paths import DATASET
+from traffic_classifier import (
+    DEFAULT_MODELS, MODEL_NAMES, build_classifiers, load_dataset, per_class_accuracy, prepare_data_for_classification
+)
+
+# Trains and evaluates the classifiers of traffic_classifier.py concurrently
+# in a process pool (one model or one cross-validation fold per task) and
+# reports fit time, predict latency, throughput and peak memory next to the
+# per-class accuracy.
+# Every task runs in a fresh worker process, also with --workers 1, so the
+# peak memory of a task is not that of the dataset loading and SMOTE in the
+# main process or of the models evaluated before it.
+
+LATENCY_SAMPLES = 200
+
+
+def _peak_rss_mb():
+    """Peak resident memory of this process in MB (ru_maxrss is KB on Linux, bytes on macOS).
+
+    In a worker this includes the interpreter, the libraries and the task's split.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _single_threaded(clf):
+    """Avoid oversubscribing the CPUs when several models train at once."""
+    if "n_jobs" in clf.get_params():
+        clf.set_params(n_jobs=1)
+    return clf
+
+
+def evaluate_task(clf_name, X_train, y_train, X_test, y_test, label_mapping_inv, svc_probability, parallel):
+    """Fit and evaluate one model on one split; runs in a worker process."""
+    clf = build_classifiers(svc_probability)[clf_name]
+    if parallel:
+        _single_threaded(clf)
+    baseline_mb = _peak_rss_mb()
+
+    start = time.perf_counter()
+    clf.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = clf.predict(X_test)
+    batch_time = time.perf_counter() - start
+
+    # Latency of classifying one record at a time
+    latencies = []
+    for row in X_test[:LATENCY_SAMPLES]:
+        start = time.perf_counter()
+        clf.predict(row.reshape(1, -1))
+        latencies.append(time.perf_counter() - start)
+
+    accuracies, overall_accuracy = per_class_accuracy(y_test, y_pred, label_mapping_inv)
+    return {
+        "model": clf_name,
+        "fit_time_s": fit_time,
+        "predict_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else 0,
+        "predict_p99_ms": float(np.percentile(latencies, 99) * 1000) if latencies else 0,
+        "throughput_rows_s": len(X_test) / batch_time if batch_time > 0 else 0,
+        "peak_rss_mb": _peak_rss_mb(),
+        # Memory the fit and predictions added to the worker (its peak before them is the baseline)
+        "model_rss_mb": _peak_rss_mb() - baseline_mb,
+        "accuracy": overall_accuracy,
+        "per_class_accuracy": accuracies,
+    }
+
+
+def _splits(X, y, cv):
+    """The train/test split of train_and_evaluate_model, or stratified k folds."""
+    if cv > 1:
+        folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=42)
+        return [(X[train], y[train], X[test], y[test]) for train, test in folds.split(X, y)]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.8, random_state=42, stratify=y
+    )
+    return [(X_train, y_train, X_test, y_test)]
+
+
+def _average(results):
+    """Combine the results of the folds of one model."""
+    report = dict(results[0])
+    for key in ("fit_time_s", "predict_p50_ms", "predict_p99_ms", "throughput_rows_s", "accuracy"):
+        report[key] = float(np.mean([r[key] for r in results]))
+    report["peak_rss_mb"] = max(r["peak_rss_mb"] for r in results)
+    report["model_rss_mb"] = max(r["model_rss_mb"] for r in results)
+    report["per_class_accuracy"] = {
+        label: float(np.mean([r["per_class_accuracy"][label] for r in results]))
+        for label in results[0]["per_class_accuracy"]
+    }
+    report["folds"] = len(results)
+    return report
+
+
+def run_harness(X, y, label_mapping_inv, models=None, workers=1, cv=1, svc_probability=False):
+    """Evaluate the models (every fold of every model is one task) and return one report per model."""
+    models = models or DEFAULT_MODELS
+    splits = _splits(X, y, cv)
+    tasks = [(name, *split, label_mapping_inv, svc_probability, workers > 1)
+             for name in models for split in splits]
+
+    # max_tasks_per_child=1 (Python 3.11+) replaces each worker after one task, so
+    # ru_maxrss is the peak of that task alone. Such pools start their workers
+    # with 'spawn': every task re-imports the libraries and receives its split
+    # pickled, which takes a few seconds more per task but is outside the timings.
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        results = list(pool.map(evaluate_task, *zip(*tasks)))
+
+    return [_average([r for r in results if r["model"] == name]) for name in models]
+
+
+def print_report(reports):
+    for report in reports:
+        print(f"\n--- {report['model']} ---")
+        print("Per-Class Accuracy:")
+        for service, acc in report["per_class_accuracy"].items():
+            print(f"  {service}: {acc:.4f}")
+        print(f"Overall Model Accuracy: {report['accuracy']:.4f}")
+
+    print(f"\n{'Model':<25}{'fit (s)':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'rows/s':>12}{'peak MB':>10}"
+          f"{'model MB':>10}{'accuracy':>10}")
+    for r in reports:
+        print(f"{r['model']:<25}{r['fit_time_s']:>10.2f}{r['predict_p50_ms']:>10.3f}{r['predict_p99_ms']:>10.3f}"
+              f"{r['throughput_rows_s']:>12,.0f}{r['peak_rss_mb']:>10.0f}{r['model_rss_mb']:>10.0f}{r['accuracy']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and evaluate the traffic classifiers in parallel.")
+    parser.add_argument("--data", default=DATASET)
+    parser.add_argument("--workers", type=int, default=1, help="number of processes (default: 1)")
+    parser.add_argument("--cv", type=int, default=1,
+                        help="number of cross-validation folds (default: the single split of traffic_classifier)")
+    parser.add_argument("--models", nargs="+", choices=MODEL_NAMES,
+                        help="models to run (default: the models of traffic_classifier.py's report)")
+    parser.add_argument("--svc-probability", action="store_true",
+                        help="keep SVC(probability=True), which adds an internal 5-fold calibration")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    df = load_dataset(args.data)
+    X, y, label_mapping_inv = prepare_data_for_classification(df)
+    reports = run_harness(X, y, label_mapping_inv, args.models, max(1, args.workers), args.cv, args.svc_probability)
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
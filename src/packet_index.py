@@ -0,0 +1,167 @@
+import hashlib
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+from packet_table import Column
+from pcap_reader import PacketRecord, read_packets, resolve_backend
+
+# Sidecar index of a dissected capture.
+# The per-packet fields are stored once as binary columns (one .npy file per
+# field) in a '.cache' folder next to the capture and are memory-mapped on
+# later runs, so re-running an analysis does not parse the capture again.
+# The index is keyed on the capture's size, modification time, a hash of its
+# first megabyte and the reader backend; any change rebuilds it.
+
+INDEX_VERSION = 1
+HASH_BYTES = 1 << 20
+
+PROTOCOL_CLASSES = ["OTHER", "TCP", "UDP", "TLS", "QUIC"]
+TRANSPORTS = [None, "TCP", "UDP"]
+
+# Column name -> (array.array type code, PacketRecord field).
+# Missing values are stored as -1 (NaN for timestamps, 0 for ip_version).
+INDEX_COLUMNS = {
+    "timestamp": ("d", "timestamp"),
+    "length": ("i", "length"),
+    "src_ip": ("i", "src_ip"),          # position in the address table
+    "dst_ip": ("i", "dst_ip"),
+    "ip_version": ("B", "ip_version"),
+    "ttl": ("h", "ttl"),
+    "transport": ("B", "transport"),    # position in TRANSPORTS
+    "src_port": ("i", "src_port"),
+    "dst_port": ("i", "dst_port"),
+    "tcp_window_size": ("i", "tcp_window_size"),
+    "tcp_flags": ("h", "tcp_flags"),
+    "protocol": ("B", "protocol"),      # position in PROTOCOL_CLASSES
+}
+
+
+def _index_dir(pcap_file, backend):
+    """Return the cache folder, capture name and index folder for the current state of a capture."""
+    stat = os.stat(pcap_file)
+    with open(pcap_file, "rb") as f:
+        head_hash = hashlib.sha1(f.read(HASH_BYTES)).hexdigest()
+    key = repr((INDEX_VERSION, os.path.abspath(pcap_file), stat.st_size, stat.st_mtime_ns,
+                head_hash, backend))
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(pcap_file)), ".cache")
+    name = os.path.basename(pcap_file)
+    return cache_dir, name, os.path.join(cache_dir, "%s-%s.index" % (name, digest))
+
+
+class PacketIndex:
+    """The columns of an indexed capture as (memory-mapped) NumPy arrays.
+
+    'addresses' maps the integer codes of src_ip/dst_ip back to strings.
+    """
+
+    def __init__(self, columns, addresses):
+        self.columns = columns
+        self.addresses = addresses
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def address_code(self, ip):
+        """Integer code of an address, -1 if it never appears in the capture."""
+        try:
+            return self.addresses.index(ip)
+        except ValueError:
+            return -1
+
+    def records(self):
+        """Yield the packets back as PacketRecord tuples (for per-packet consumers)."""
+        cols = [self.columns[name].tolist() for name in INDEX_COLUMNS]
+        addresses = self.addresses
+        for ts, length, src, dst, ver, ttl, transport, sport, dport, win, flags, proto in zip(*cols):
+            yield PacketRecord(
+                None if ts != ts else ts,
+                None if length < 0 else length,
+                None if src < 0 else addresses[src],
+                None if dst < 0 else addresses[dst],
+                ver or None,
+                None if ttl < 0 else ttl,
+                TRANSPORTS[transport],
+                None if sport < 0 else sport,
+                None if dport < 0 else dport,
+                None if win < 0 else win,
+                None if flags < 0 else flags,
+                PROTOCOL_CLASSES[proto],
+            )
+
+
+def _encode(packets):
+    """Turn PacketRecord tuples into typed columns and an address table."""
+    columns = {name: Column(typecode) for name, (typecode, _) in INDEX_COLUMNS.items()}
+    appenders = [columns[name].append for name in INDEX_COLUMNS]
+    addresses = {}
+    protocol_codes = {p: i for i, p in enumerate(PROTOCOL_CLASSES)}
+    transport_codes = {t: i for i, t in enumerate(TRANSPORTS)}
+    for pkt in packets:
+        src = -1 if pkt.src_ip is None else addresses.setdefault(pkt.src_ip, len(addresses))
+        dst = -1 if pkt.dst_ip is None else addresses.setdefault(pkt.dst_ip, len(addresses))
+        values = (
+            float("nan") if pkt.timestamp is None else pkt.timestamp,
+            -1 if pkt.length is None else pkt.length,
+            src,
+            dst,
+            pkt.ip_version or 0,
+            -1 if pkt.ttl is None else pkt.ttl,
+            transport_codes.get(pkt.transport, 0),
+            -1 if pkt.src_port is None else pkt.src_port,
+            -1 if pkt.dst_port is None else pkt.dst_port,
+            -1 if pkt.tcp_window_size is None else pkt.tcp_window_size,
+            -1 if pkt.tcp_flags is None else pkt.tcp_flags,
+            protocol_codes.get(pkt.protocol, 0),
+        )
+        for append, value in zip(appenders, values):
+            append(value)
+    return columns, list(addresses)
+
+
+def build_index(pcap_file, backend="auto"):
+    """Dissect a capture once and write its index; returns the index folder."""
+    backend = resolve_backend(pcap_file, backend)
+    cache_dir, name, index_dir = _index_dir(pcap_file, backend)
+    columns, addresses = _encode(read_packets(pcap_file, backend))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = index_dir + ".tmp%d" % os.getpid()
+    os.makedirs(tmp_dir)
+    try:
+        for column_name, column in columns.items():
+            np.save(os.path.join(tmp_dir, column_name + ".npy"), column.to_numpy())
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"version": INDEX_VERSION, "capture": name, "backend": backend,
+                       "packets": len(columns["timestamp"]), "addresses": addresses}, f)
+
+        # Drop the indexes of older versions of this capture
+        for old_dir in glob.glob(os.path.join(cache_dir, glob.escape(name) + "-*.index")):
+            shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(tmp_dir, index_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return index_dir
+
+
+def load_index(pcap_file, backend="auto", rebuild=False):
+    """Return the PacketIndex of a capture, building it first if it is missing or stale."""
+    backend = resolve_backend(pcap_file, backend)
+    index_dir = _index_dir(pcap_file, backend)[2]
+    if rebuild or not os.path.exists(os.path.join(index_dir, "meta.json")):
+        index_dir = build_index(pcap_file, backend)
+    with open(os.path.join(index_dir, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {
+        name: np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r")
+        for name in INDEX_COLUMNS
+    }
+    return PacketIndex(columns, meta["addresses"])
@@ -0,0 +1,83 @@
+from array import array
+
+import numpy as np
+
+# Columnar storage for per-packet values.
+# Values are appended to a small typed array.array buffer; full buffers are
+# frozen into NumPy chunks, so memory is one machine value per packet instead
+# of one boxed Python object, and reductions run vectorized over the chunks.
+
+CHUNK_SIZE = 1 << 16
+
+
+class Column:
+    """A typed, append-only column of numbers backed by NumPy chunks.
+
+    typecode is an array.array type code, e.g. 'd' (float64), 'I' (uint32),
+    'H' (uint16) or 'B' (uint8).
+    """
+
+    def __init__(self, typecode, chunk_size=CHUNK_SIZE):
+        self.typecode = typecode
+        self.dtype = np.dtype(typecode)
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._buffer = array(typecode)
+
+    def append(self, value):
+        self._buffer.append(value)
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def extend(self, values):
+        """Append a whole array of values at once."""
+        self._flush()
+        values = np.asarray(values, dtype=self.dtype)
+        if len(values):
+            self._chunks.append(values.copy())
+
+    def _flush(self):
+        if self._buffer:
+            self._chunks.append(np.frombuffer(self._buffer, dtype=self.dtype).copy())
+            self._buffer = array(self.typecode)
+
+    def __len__(self):
+        return sum(len(c) for c in self._chunks) + len(self._buffer)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def to_numpy(self):
+        """Return all values as one contiguous NumPy array."""
+        self._flush()
+        if not self._chunks:
+            return np.empty(0, dtype=self.dtype)
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    def sum(self):
+        values = self.to_numpy()
+        if values.dtype.kind == "f":
+            return float(values.sum())
+        return int(values.sum(dtype=np.int64))
+
+    def mean(self):
+        """Mean of the column, 0 when it is empty."""
+        values = self.to_numpy()
+        return float(values.mean(dtype=np.float64)) if len(values) else 0
+
+    def merge(self, other):
+        """Append all values of another column of the same type."""
+        self._flush()
+        other._flush()
+        self._chunks.extend(other._chunks)
+
+
+def inter_arrival_stats(timestamps):
+    """Return (mean inter-arrival time, capture duration) for an array of timestamps."""
+    if len(timestamps) < 2:
+        return 0, 0
+    times = np.sort(timestamps)
+    diffs = np.diff(times)
+    return float(diffs.mean()), float(times[-1] - times[0])
@@ -0,0 +1,727 @@
+import mmap
+import socket
+import struct
+import time
+from collections import namedtuple
+
+import instrumentation
+
+# Native reader for .pcap / .pcapng files.
+# The file is memory-mapped and the Ethernet/IP/TCP/UDP headers are decoded
+# straight from the bytes, so no tshark subprocess is involved.
+
+PacketRecord = namedtuple("PacketRecord", [
+    "timestamp",        # seconds since the epoch (float), None if the block has none
+    "length",           # original frame length on the wire
+    "src_ip",           # source address as a string, None if not IP
+    "dst_ip",           # destination address as a string, None if not IP
+    "ip_version",       # 4, 6 or None
+    "ttl",              # IPv4 TTL / IPv6 hop limit, None if not IP
+    "transport",        # "TCP", "UDP" or None
+    "src_port",
+    "dst_port",
+    "tcp_window_size",  # window size, scaled when the handshake was seen
+    "tcp_flags",        # TCP flags as an int (e.g. 0x18 for ACK-PUSH), None if not TCP
+    "protocol",         # "QUIC", "TLS", "TCP", "UDP" or "OTHER"
+])
+
+
+# A byte range of a capture that starts on a record/block boundary.
+# 'section' carries the pcapng byte order and interfaces in effect at 'start'
+# (None for classic pcap), so the range can be decoded on its own.
+CaptureRange = namedtuple("CaptureRange", ["start", "end", "section"])
+
+
+class CaptureFormatError(ValueError):
+    """Raised when a file is not a pcap/pcapng capture the native reader understands."""
+
+
+# pcap / pcapng magic numbers
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# pcapng block types
+BLOCK_IDB = 0x00000001
+BLOCK_PB = 0x00000002
+BLOCK_SPB = 0x00000003
+BLOCK_EPB = 0x00000006
+
+# Link-layer types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+RAW_IP_LINKTYPES = (LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+# IPv6 extension headers that are skipped to reach the transport header
+IPV6_EXT_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT = 44
+IPV6_AH = 51
+
+TLS_CONTENT_TYPES = (20, 21, 22, 23)
+QUIC_PORTS = (443, 80)
+
+# Connections whose window scale factors are remembered at most (oldest dropped first)
+MAX_WINDOW_SCALES = 100_000
+
+_U16_BE = struct.Struct("!H")
+_U32_BE = struct.Struct("!I")
+_IPV4_HEADER = struct.Struct("!BxHxxHBB")        # ver/ihl, total length, frag, ttl, proto
+_TCP_HEADER = struct.Struct("!HHxxxxxxxxBBH")    # sport, dport, data offset, flags, window
+_UDP_PORTS = struct.Struct("!HH")
+
+
+def _header_structs(endian):
+    """Pre-compiled structs for one byte order ('<' or '>')."""
+    return {
+        "u16": struct.Struct(endian + "H"),
+        "u32": struct.Struct(endian + "I"),
+        "block": struct.Struct(endian + "II"),
+        "pcap_record": struct.Struct(endian + "IIII"),
+        "epb": struct.Struct(endian + "IIIII"),
+        "pb": struct.Struct(endian + "HHIIII"),
+    }
+
+
+def _pcapng_tsresol(buf, opt_start, opt_end, s):
+    """Return (units per second, offset in seconds) from the options of an IDB."""
+    units = 1000000
+    offset = 0
+    pos = opt_start
+    while pos + 4 <= opt_end:
+        code = s["u16"].unpack_from(buf, pos)[0]
+        length = s["u16"].unpack_from(buf, pos + 2)[0]
+        if code == 0:
+            break
+        value_pos = pos + 4
+        if code == 9 and length >= 1:
+            resol = buf[value_pos]
+            if resol & 0x80:
+                units = 2 ** (resol & 0x7F)
+            else:
+                units = 10 ** resol
+        elif code == 14 and length >= 8:
+            offset = struct.unpack_from(s["u16"].format[0] + "q", buf, value_pos)[0]
+        pos = value_pos + ((length + 3) & ~3)
+    return units, offset
+
+
+def _iter_pcap_frames(buf, start, end):
+    """Yield (linktype, timestamp, frame offset, captured length, original length) for classic pcap."""
+    magic_le = struct.unpack_from("<I", buf, 0)[0]
+    if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        s = _header_structs("<")
+        magic = magic_le
+    else:
+        s = _header_structs(">")
+        magic = struct.unpack_from(">I", buf, 0)[0]
+    frac = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    linktype = s["u32"].unpack_from(buf, 20)[0] & 0x0FFFFFFF
+
+    record = s["pcap_record"]
+    pos = max(start, 24)
+    size = len(buf) if end is None else min(end, len(buf))
+    while pos + 16 <= size:
+        ts_sec, ts_frac, caplen, origlen = record.unpack_from(buf, pos)
+        data = pos + 16
+        if data + caplen > len(buf):
+            break
+        yield linktype, ts_sec + ts_frac * frac, data, caplen, origlen
+        pos = data + caplen
+
+
+def _iter_pcapng_frames(buf, start, end, section=None):
+    """Yield (linktype, timestamp, frame offset, captured length, original length) for pcapng."""
+    size = len(buf) if end is None else min(end, len(buf))
+    pos = start
+    s = None
+    interfaces = []
+    if section is not None:
+        s = _header_structs(section[0])
+        interfaces = list(section[1])
+    while pos + 12 <= size:
+        block_type_le = struct.unpack_from("<I", buf, pos)[0]
+        if block_type_le == PCAPNG_SHB:
+            # A new section: byte order and interfaces are reset
+            bom = struct.unpack_from("<I", buf, pos + 8)[0]
+            s = _header_structs("<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">")
+            interfaces = []
+        elif s is None:
+            raise CaptureFormatError("pcapng data does not start with a section header block")
+
+        block_type, block_len = s["block"].unpack_from(buf, pos)
+        if block_len < 12 or pos + block_len > len(buf):
+            break
+        body = pos + 8
+
+        if block_type == BLOCK_IDB:
+            linktype = s["u16"].unpack_from(buf, body)[0]
+            snaplen = s["u32"].unpack_from(buf, body + 4)[0]
+            units, offset = _pcapng_tsresol(buf, body + 8, pos + block_len - 4, s)
+            interfaces.append((linktype, snaplen, units, offset))
+        elif block_type == BLOCK_EPB:
+            iface, ts_high, ts_low, caplen, origlen = s["epb"].unpack_from(buf, body)
+            if iface < len(interfaces):
+                linktype, _, units, offset = interfaces[iface]
+                ts = ((ts_high << 32) | ts_low) / units + offset
+                yield linktype, ts, body + 20, caplen, origlen
+        elif block_type == BLOCK_SPB:
+            if interfaces:
+                linktype, snaplen, _, _ = interfaces[0]
+                origlen = s["u32"].unpack_from(buf, body)[0]
+                caplen = min(origlen, snaplen) if snaplen else origlen
+                caplen = min(caplen, block_len - 16)
+                yield linktype, None, body + 4, caplen, origlen
+        elif block_type == BLOCK_PB:
+            iface, _, ts_high, ts_low, caplen, origlen = s["pb"].unpack_from(buf, body)
+            if iface < len(interfaces):
+                linktype, _, units, offset = interfaces[iface]
+                ts = ((ts_high << 32) | ts_low) / units + offset
+                yield linktype, ts, body + 20, caplen, origlen
+
+        pos += block_len
+
+
+def capture_format(buf):
+    """Return 'pcap' or 'pcapng' for a capture buffer, raise CaptureFormatError otherwise."""
+    if len(buf) < 24:
+        raise CaptureFormatError("file is too short to be a capture")
+    magic = struct.unpack_from("<I", buf, 0)[0]
+    if magic == PCAPNG_SHB:
+        return "pcapng"
+    if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or \
+            struct.unpack_from(">I", buf, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        return "pcap"
+    raise CaptureFormatError("unknown capture magic 0x%08x" % magic)
+
+
+def iter_frames(buf, start=0, end=None, section=None):
+    """Yield raw frames (linktype, timestamp, offset, caplen, origlen) from a capture buffer."""
+    if capture_format(buf) == "pcapng":
+        return _iter_pcapng_frames(buf, start, end, section)
+    return _iter_pcap_frames(buf, start, end)
+
+
+def _split_buffer(buf, parts):
+    """Walk the record/block headers of a capture buffer and cut it into 'parts' ranges."""
+    size = len(buf)
+    target = size / parts
+    ranges = []
+    range_start = 0
+    range_section = None
+
+    if capture_format(buf) == "pcap":
+        endian = "<" if struct.unpack_from("<I", buf, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+        caplen_struct = struct.Struct(endian + "I")
+        pos = 24
+        while pos + 16 <= size:
+            if pos - range_start >= target and len(ranges) < parts - 1:
+                ranges.append(CaptureRange(range_start, pos, None))
+                range_start = pos
+            pos += 16 + caplen_struct.unpack_from(buf, pos + 8)[0]
+        ranges.append(CaptureRange(range_start, size, None))
+        return ranges
+
+    endian = "<"
+    s = _header_structs(endian)
+    interfaces = []
+    pos = 0
+    while pos + 12 <= size:
+        block_type_le = struct.unpack_from("<I", buf, pos)[0]
+        if block_type_le == PCAPNG_SHB:
+            bom = struct.unpack_from("<I", buf, pos + 8)[0]
+            endian = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            s = _header_structs(endian)
+            interfaces = []
+        block_type, block_len = s["block"].unpack_from(buf, pos)
+        if block_len < 12:
+            break
+        if block_type in (BLOCK_EPB, BLOCK_SPB, BLOCK_PB) and pos - range_start >= target \
+                and len(ranges) < parts - 1:
+            ranges.append(CaptureRange(range_start, pos, range_section))
+            range_start = pos
+            range_section = (endian, tuple(interfaces))
+        if block_type == BLOCK_IDB:
+            body = pos + 8
+            linktype = s["u16"].unpack_from(buf, body)[0]
+            snaplen = s["u32"].unpack_from(buf, body + 4)[0]
+            units, offset = _pcapng_tsresol(buf, body + 8, pos + block_len - 4, s)
+            interfaces.append((linktype, snaplen, units, offset))
+        pos += block_len
+    ranges.append(CaptureRange(range_start, size, range_section))
+    return ranges
+
+
+def split_capture(pcap_file, parts):
+    """Split a capture into at most 'parts' CaptureRange pieces that can be read independently."""
+    with open(pcap_file, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise CaptureFormatError("%s is empty" % pcap_file)
+    try:
+        if parts <= 1:
+            capture_format(buf)
+            return [CaptureRange(0, len(buf), None)]
+        return _split_buffer(buf, parts)
+    finally:
+        buf.close()
+
+
+def _network_offset(linktype, buf, off, caplen):
+    """Return (ethertype, offset of the network header) for a frame, or (None, None)."""
+    end = off + caplen
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return None, None
+        ethertype = _U16_BE.unpack_from(buf, off + 12)[0]
+        pos = off + 14
+        while ethertype in VLAN_ETHERTYPES and pos + 4 <= end:
+            ethertype = _U16_BE.unpack_from(buf, pos + 2)[0]
+            pos += 4
+        return ethertype, pos
+    if linktype in RAW_IP_LINKTYPES:
+        if caplen < 1:
+            return None, None
+        version = buf[off] >> 4
+        if version == 4:
+            return ETHERTYPE_IPV4, off
+        if version == 6:
+            return ETHERTYPE_IPV6, off
+        return None, None
+    if linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return None, None
+        return _U16_BE.unpack_from(buf, off + 14)[0], off + 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if caplen < 20:
+            return None, None
+        return _U16_BE.unpack_from(buf, off)[0], off + 20
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if caplen < 4:
+            return None, None
+        # The family is in host byte order for NULL, so check both orders
+        family = struct.unpack_from("<I", buf, off)[0]
+        if family > 0xFFFF:
+            family = struct.unpack_from(">I", buf, off)[0]
+        if family == 2:
+            return ETHERTYPE_IPV4, off + 4
+        if family in (10, 24, 28, 30):
+            return ETHERTYPE_IPV6, off + 4
+        return None, None
+    return None, None
+
+
+def _tcp_window_scale(buf, opt_start, opt_end):
+    """Return the window scale shift from TCP options, or None if the option is absent."""
+    pos = opt_start
+    while pos < opt_end:
+        kind = buf[pos]
+        if kind == 0:
+            break
+        if kind == 1:
+            pos += 1
+            continue
+        if pos + 1 >= opt_end:
+            break
+        length = buf[pos + 1]
+        if length < 2:
+            break
+        if kind == 3 and length == 3 and pos + 2 < opt_end:
+            return min(buf[pos + 2], 14)
+        pos += length
+    return None
+
+
+def classify_payload(transport, src_port, dst_port, buf, payload_start, payload_end):
+    """Return the protocol class ('QUIC', 'TLS', 'TCP', 'UDP') of a transport payload.
+
+    TLS is recognised by a record header at the start of the segment and QUIC by a
+    UDP datagram on port 443/80 with the QUIC fixed bit set. Unlike tshark there is
+    no TCP reassembly, so TLS records continued in later segments count as TCP.
+    """
+    if transport == "TCP":
+        if payload_end - payload_start >= 5 and buf[payload_start] in TLS_CONTENT_TYPES \
+                and buf[payload_start + 1] == 3 and buf[payload_start + 2] <= 4:
+            return "TLS"
+        return "TCP"
+    if transport == "UDP":
+        if payload_end > payload_start and (src_port in QUIC_PORTS or dst_port in QUIC_PORTS) \
+                and buf[payload_start] & 0x40:
+            return "QUIC"
+        return "UDP"
+    return "OTHER"
+
+
+class FrameDecoder:
+    """Decodes link-layer frames into PacketRecord tuples.
+
+    Keeps the TCP window scale factors announced in SYN packets so the reported
+    window size matches tshark's calculated 'tcp.window_size'; they are dropped
+    on RST, once both sides sent a FIN, or when too many connections are open.
+    'handshakes' (a handshake.HandshakeParser) is given the payloads of TLS
+    records and QUIC long-header packets, and the segments continuing a
+    partial TLS hello.
+    """
+
+    def __init__(self, handshakes=None):
+        self.window_scales = {}
+        self.fins = set()
+        self.handshakes = handshakes
+
+    def decode(self, linktype, buf, off, caplen, ts, origlen):
+        end = off + caplen
+        ethertype, pos = _network_offset(linktype, buf, off, caplen)
+        if ethertype == ETHERTYPE_IPV4 and pos + 20 <= end:
+            ver_ihl, total_len, frag, ttl, proto = _IPV4_HEADER.unpack_from(buf, pos)
+            ihl = (ver_ihl & 0x0F) * 4
+            src_ip = socket.inet_ntoa(buf[pos + 12:pos + 16])
+            dst_ip = socket.inet_ntoa(buf[pos + 16:pos + 20])
+            ip_version = 4
+            if total_len >= ihl:
+                end = min(end, pos + total_len)
+            transport_pos = pos + ihl
+            if frag & 0x1FFF:
+                # Non-first fragment: there is no transport header
+                proto = None
+        elif ethertype == ETHERTYPE_IPV6 and pos + 40 <= end:
+            payload_len = _U16_BE.unpack_from(buf, pos + 4)[0]
+            proto = buf[pos + 6]
+            ttl = buf[pos + 7]
+            src_ip = socket.inet_ntop(socket.AF_INET6, buf[pos + 8:pos + 24])
+            dst_ip = socket.inet_ntop(socket.AF_INET6, buf[pos + 24:pos + 40])
+            ip_version = 6
+            if payload_len:
+                end = min(end, pos + 40 + payload_len)
+            transport_pos = pos + 40
+            while proto is not None and transport_pos + 8 <= end:
+                if proto in IPV6_EXT_HEADERS:
+                    proto, ext_len = buf[transport_pos], buf[transport_pos + 1]
+                    transport_pos += (ext_len + 1) * 8
+                elif proto == IPV6_AH:
+                    proto, ext_len = buf[transport_pos], buf[transport_pos + 1]
+                    transport_pos += (ext_len + 2) * 4
+                elif proto == IPV6_FRAGMENT:
+                    frag = _U16_BE.unpack_from(buf, transport_pos + 2)[0]
+                    proto = buf[transport_pos] if not (frag & 0xFFF8) else None
+                    transport_pos += 8
+                else:
+                    break
+        else:
+            return PacketRecord(ts, origlen, None, None, None, None, None,
+                                None, None, None, None, "OTHER")
+
+        if proto == IPPROTO_TCP and transport_pos + 20 <= end:
+            sport, dport, data_off, flags_lo, window = _TCP_HEADER.unpack_from(buf, transport_pos)
+            flags = ((data_off & 0x01) << 8) | flags_lo
+            header_len = (data_off >> 4) * 4
+            key = (src_ip, sport, dst_ip, dport)
+            window_scales = self.window_scales
+            if flags & 0x02:
+                # A SYN starts a new connection on this 4-tuple: earlier FINs no longer apply
+                if self.fins:
+                    self.fins.discard(key)
+                    self.fins.discard((dst_ip, dport, src_ip, sport))
+                shift = _tcp_window_scale(buf, transport_pos + 20,
+                                          min(transport_pos + header_len, end))
+                if shift is not None:
+                    window_scales[key] = shift
+                    if len(window_scales) > MAX_WINDOW_SCALES:
+                        oldest = next(iter(window_scales))
+                        del window_scales[oldest]
+                        self.fins.discard(oldest)
+                        self.fins.discard(oldest[2:] + oldest[:2])
+                else:
+                    window_scales.pop(key, None)
+            elif window_scales:
+                # Scaling only applies once both sides announced it
+                reverse = (dst_ip, dport, src_ip, sport)
+                shift = window_scales.get(key)
+                if shift is not None and reverse in window_scales:
+                    window <<= shift
+                if flags & 0x05 and (key in window_scales or reverse in window_scales):
+                    if flags & 0x04 or reverse in self.fins:
+                        # RST, or FIN from both sides: the connection is over
+                        window_scales.pop(key, None)
+                        window_scales.pop(reverse, None)
+                        self.fins.discard(key)
+                        self.fins.discard(reverse)
+                    else:
+                        self.fins.add(key)
+            payload_start = transport_pos + header_len
+            protocol = classify_payload("TCP", sport, dport, buf, payload_start, end)
+            handshakes = self.handshakes
+            if handshakes is not None and (protocol == "TLS" or key in handshakes.pending):
+                handshakes.feed_tcp(ts, src_ip, sport, dst_ip, dport, buf, payload_start, end)
+            return PacketRecord(ts, origlen, src_ip, dst_ip, ip_version, ttl, "TCP",
+                                sport, dport, window, flags, protocol)
+
+        if proto == IPPROTO_UDP and transport_pos + 8 <= end:
+            sport, dport = _UDP_PORTS.unpack_from(buf, transport_pos)
+            protocol = classify_payload("UDP", sport, dport, buf, transport_pos + 8, end)
+            if protocol == "QUIC" and self.handshakes is not None and buf[transport_pos + 8] & 0x80:
+                self.handshakes.feed_quic(ts, src_ip, sport, dst_ip, dport, buf, transport_pos + 8, end)
+            return PacketRecord(ts, origlen, src_ip, dst_ip, ip_version, ttl, "UDP",
+                                sport, dport, None, None, protocol)
+
+        return PacketRecord(ts, origlen, src_ip, dst_ip, ip_version, ttl, None,
+                            None, None, None, None, "OTHER")
+
+
+def iter_packets(pcap_file, byte_range=None, handshakes=None):
+    """Yield a PacketRecord for every packet of a .pcap/.pcapng file.
+
+    The file is memory-mapped; 'byte_range' (a CaptureRange from split_capture)
+    restricts reading to one piece of the file. TCP window scaling announced in
+    an earlier piece is not known to later ones. 'handshakes' is passed to the
+    FrameDecoder (see handshake.py).
+    """
+    start, end, section = byte_range if byte_range is not None else (0, None, None)
+    with open(pcap_file, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise CaptureFormatError("%s is empty" % pcap_file)
+    try:
+        decoder = FrameDecoder(handshakes)
+        if instrumentation.active():
+            yield from _iter_timed(decoder, iter_frames(buf, start, end, section), buf)
+            return
+        for linktype, ts, off, caplen, origlen in iter_frames(buf, start, end, section):
+            yield decoder.decode(linktype, buf, off, caplen, ts, origlen)
+    finally:
+        buf.close()
+
+
+def _iter_timed(decoder, frames, buf):
+    """iter_packets loop that reports the time spent reading frames and decoding them.
+
+    Timing every packet slows the loop down, so it only runs while a report is active.
+    """
+    perf_counter = time.perf_counter
+    read = decode = 0.0
+    packets = 0
+    try:
+        t0 = perf_counter()
+        for linktype, ts, off, caplen, origlen in frames:
+            t1 = perf_counter()
+            pkt = decoder.decode(linktype, buf, off, caplen, ts, origlen)
+            t2 = perf_counter()
+            read += t1 - t0
+            decode += t2 - t1
+            packets += 1
+            yield pkt
+            t0 = perf_counter()
+        read += perf_counter() - t0
+    finally:
+        instrumentation.add_time("read", read)
+        instrumentation.add_time("decode", decode)
+        instrumentation.count("packets_read", packets)
+
+
+def _read_exact(stream, size):
+    """Read exactly 'size' bytes from a stream, None at end of stream."""
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def iter_stream_packets(stream):
+    """Yield PacketRecord tuples from a pcap/pcapng byte stream (a pipe, stdin, a socket file).
+
+    Unlike iter_packets the input is read sequentially, so it works on data
+    that is still being written, e.g. 'tcpdump -w - | ...' or a FIFO.
+    """
+    decoder = FrameDecoder()
+    head = _read_exact(stream, 4)
+    if head is None:
+        return
+    magic_le = struct.unpack("<I", head)[0]
+
+    if magic_le != PCAPNG_SHB:
+        rest = _read_exact(stream, 20)
+        if rest is None:
+            raise CaptureFormatError("stream ended inside the pcap header")
+        header = head + rest
+        capture_format(header)
+        endian = "<" if magic_le in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else ">"
+        s = _header_structs(endian)
+        frac = 1e-9 if s["u32"].unpack_from(header, 0)[0] == PCAP_MAGIC_NS else 1e-6
+        linktype = s["u32"].unpack_from(header, 20)[0] & 0x0FFFFFFF
+        while True:
+            record = _read_exact(stream, 16)
+            if record is None:
+                return
+            ts_sec, ts_frac, caplen, origlen = s["pcap_record"].unpack(record)
+            frame = _read_exact(stream, caplen)
+            if frame is None:
+                return
+            yield decoder.decode(linktype, frame, 0, caplen, ts_sec + ts_frac * frac, origlen)
+
+    s = None
+    interfaces = []
+    while True:
+        if head is None:
+            head = _read_exact(stream, 4)
+            if head is None:
+                return
+        rest = _read_exact(stream, 8)
+        if rest is None:
+            return
+        if struct.unpack("<I", head)[0] == PCAPNG_SHB:
+            bom = struct.unpack_from("<I", rest, 4)[0]
+            s = _header_structs("<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">")
+            interfaces = []
+        elif s is None:
+            raise CaptureFormatError("pcapng stream does not start with a section header block")
+        block = head + rest
+        block_type, block_len = s["block"].unpack_from(block, 0)
+        if block_len < 12:
+            raise CaptureFormatError("invalid pcapng block length %d" % block_len)
+        tail = _read_exact(stream, block_len - 12)
+        if tail is None:
+            return
+        block += tail
+        head = None
+
+        if block_type == BLOCK_IDB:
+            linktype = s["u16"].unpack_from(block, 8)[0]
+            snaplen = s["u32"].unpack_from(block, 12)[0]
+            units, offset = _pcapng_tsresol(block, 16, block_len - 4, s)
+            interfaces.append((linktype, snaplen, units, offset))
+        elif block_type in (BLOCK_EPB, BLOCK_PB):
+            if block_type == BLOCK_EPB:
+                iface, ts_high, ts_low, caplen, origlen = s["epb"].unpack_from(block, 8)
+            else:
+                iface, _, ts_high, ts_low, caplen, origlen = s["pb"].unpack_from(block, 8)
+            if iface < len(interfaces):
+                linktype, _, units, offset = interfaces[iface]
+                ts = ((ts_high << 32) | ts_low) / units + offset
+                yield decoder.decode(linktype, block, 28, caplen, ts, origlen)
+        elif block_type == BLOCK_SPB and interfaces:
+            linktype, snaplen, _, _ = interfaces[0]
+            origlen = s["u32"].unpack_from(block, 8)[0]
+            caplen = min(origlen, snaplen) if snaplen else origlen
+            caplen = min(caplen, block_len - 16)
+            yield decoder.decode(linktype, block, 12, caplen, None, origlen)
+
+
+def parse_tcp_flags_hex(hex_str):
+    """Convert a tshark flags string such as '0x0018' to an int, None if it is invalid."""
+    try:
+        return int(hex_str, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_pyshark_packets(pcap_file):
+    """Fallback reader: yield PacketRecord tuples built from pyshark/tshark dissection."""
+    import pyshark
+
+    cap = pyshark.FileCapture(pcap_file, keep_packets=False)
+    try:
+        for pkt in cap:
+            try:
+                size = int(pkt.length)
+            except (AttributeError, ValueError):
+                size = None
+            try:
+                ts = float(pkt.sniff_timestamp)
+            except (AttributeError, ValueError):
+                ts = None
+
+            src_ip = dst_ip = ttl = ip_version = None
+            if 'IP' in pkt:
+                ip_version = 4
+                src_ip = pkt.ip.src
+                dst_ip = pkt.ip.dst
+                try:
+                    ttl = int(pkt.ip.ttl)
+                except (AttributeError, ValueError):
+                    pass
+            elif 'IPV6' in pkt:
+                ip_version = 6
+                src_ip = pkt.ipv6.src
+                dst_ip = pkt.ipv6.dst
+                try:
+                    ttl = int(pkt.ipv6.hlim)
+                except (AttributeError, ValueError):
+                    pass
+
+            transport = src_port = dst_port = window = flags = None
+            if 'TCP' in pkt:
+                transport = "TCP"
+                try:
+                    src_port, dst_port = int(pkt.tcp.srcport), int(pkt.tcp.dstport)
+                except (AttributeError, ValueError):
+                    pass
+                try:
+                    window = int(pkt.tcp.window_size)
+                except (AttributeError, ValueError):
+                    pass
+                flags = parse_tcp_flags_hex(getattr(pkt.tcp, "flags", None))
+            elif 'UDP' in pkt:
+                transport = "UDP"
+                try:
+                    src_port, dst_port = int(pkt.udp.srcport), int(pkt.udp.dstport)
+                except (AttributeError, ValueError):
+                    pass
+
+            if 'QUIC' in pkt:
+                protocol = "QUIC"
+            elif 'TLS' in pkt or 'SSL' in pkt:
+                protocol = "TLS"
+            elif transport is not None:
+                protocol = transport
+            else:
+                protocol = "OTHER"
+
+            yield PacketRecord(ts, size, src_ip, dst_ip, ip_version, ttl, transport,
+                               src_port, dst_port, window, flags, protocol)
+    finally:
+        cap.close()
+
+
+def resolve_backend(pcap_file, backend="auto"):
+    """Return the backend ("native" or "pyshark") that will be used to read a capture."""
+    if backend in ("native", "pyshark"):
+        return backend
+    if backend != "auto":
+        raise ValueError("unknown capture backend: %r" % backend)
+    with open(pcap_file, "rb") as f:
+        head = f.read(24)
+    try:
+        capture_format(head)
+    except CaptureFormatError:
+        return "pyshark"
+    return "native"
+
+
+def read_packets(pcap_file, backend="auto", byte_range=None):
+    """Yield PacketRecord tuples from a capture using the chosen backend.
+
+    backend: "native" (built-in reader), "pyshark" (tshark dissection) or
+    "auto" (native, falling back to pyshark for files it cannot read).
+    Only the native reader supports 'byte_range'.
+    """
+    if resolve_backend(pcap_file, backend) == "pyshark":
+        if byte_range is not None:
+            raise ValueError("the pyshark backend cannot read a byte range")
+        return iter_pyshark_packets(pcap_file)
+    return iter_packets(pcap_file, byte_range)
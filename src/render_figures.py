@@ -0,0 +1,344 @@
+import matplotlib
+matplotlib.use('Agg')  # Non-interactive backend: works on headless machines and in worker processes
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+import instrumentation
+from metrics_io import read_metrics
+
+# Rendering stage of the analysis scripts.
+# analyze_traffic_1.py and analyze_traffic_2.py only compute metrics (plain
+# dictionaries, see app_metrics / csv_metrics); the functions here turn those
+# metrics into the figures in 'res'. Every figure is independent, so they are
+# rendered concurrently, one figure per worker process.
+
+out_dir = "../res"
+
+
+def save_fig(filename, out_dir=out_dir, plain_y=False):
+    """Save the current matplotlib figure to 'out_dir' and close it."""
+    if plain_y:
+        plt.ticklabel_format(style='plain', axis='y', useOffset=False)
+    plt.savefig(os.path.join(out_dir, filename), dpi=300)
+    plt.close()
+
+
+# ---- Figures of analyze_traffic_1.py (metrics: app -> app_metrics entry) ----
+
+def _bar_per_app(metrics, key, color, ylabel, title, filename, out_dir):
+    apps_list = list(metrics)
+    plt.figure()
+    plt.bar(apps_list, [metrics[a][key] for a in apps_list], color=color)
+    plt.xlabel("Application")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    save_fig(filename, out_dir, plain_y=True)
+
+
+def plot_tcp_window_size(metrics, out_dir=out_dir):
+    # (1) Average TCP Window Size
+    _bar_per_app(metrics, "avg_tcp_window_size", 'pink', "Average TCP Window Size (bytes)",
+                 "Average TCP Window Size by Application", "Average_TCP_Window_Size.png", out_dir)
+
+
+def plot_ttl(metrics, out_dir=out_dir):
+    # (2) Average TTL
+    _bar_per_app(metrics, "avg_ttl", 'purple', "Average TTL",
+                 "Average TTL by Application", "Average_TTL.png", out_dir)
+
+
+def plot_protocol_distribution(metrics, out_dir=out_dir):
+    # (3) Protocol Distribution (stacked)
+    apps_list = list(metrics)
+    x = np.arange(len(apps_list))
+    protocols = ["TCP", "UDP", "TLS", "QUIC"]
+
+    plt.figure()
+    bottom = np.zeros(len(apps_list))
+    bar_width = 0.5
+    for p in protocols:
+        prot_dist = [metrics[app]["protocol_percent"][p] for app in apps_list]
+        plt.bar(x, prot_dist, bar_width, bottom=bottom, label=p)
+        bottom += prot_dist
+    plt.xticks(x, apps_list)
+    plt.xlabel("Application")
+    plt.ylabel("Percentage of Packets (%)")
+    plt.title("Protocol Distribution by Application")
+    plt.legend()
+    save_fig("Protocol_Distribution.png", out_dir, plain_y=True)
+
+
+def plot_tls_usage(metrics, out_dir=out_dir):
+    # (4) TLS Usage
+    _bar_per_app(metrics, "tls_percent", 'green', "TLS Packets (%)",
+                 "TLS Usage by Application", "TLS_Usage_Percentage.png", out_dir)
+
+
+def plot_flow_volume(metrics, out_dir=out_dir):
+    # (5) Flow Volume (Total Bytes)
+    _bar_per_app(metrics, "flow_volume", 'magenta', "Total Bytes (Flow Volume)",
+                 "Flow Volume by Application", "Flow_Volume_Total_Bytes_Transmitted.png", out_dir)
+
+
+def plot_flow_size(metrics, out_dir=out_dir):
+    # (6) Flow Size (Total Packets)
+    _bar_per_app(metrics, "flow_size", 'orange', "Number of Packets (Flow Size)",
+                 "Flow Size (Total Packets) by Application", "Flow_Size_Total_Packets_Transmitted.png", out_dir)
+
+
+def plot_inter_arrival(metrics, out_dir=out_dir):
+    # (7) Average Inter-Arrival Time
+    _bar_per_app(metrics, "avg_inter_arrival", 'blue', "Avg Inter-Arrival Time (seconds)",
+                 "Average Inter-Arrival Time by Application", "Average_Inter_Time_Between_Packets.png", out_dir)
+
+
+def plot_traffic_direction(metrics, out_dir=out_dir):
+    # (8) Traffic Direction (Incoming vs Outgoing)
+    apps_list = list(metrics)
+    x = np.arange(len(apps_list))
+    incoming_ratio = [metrics[app]["incoming_percent"] for app in apps_list]
+    outgoing_ratio = [metrics[app]["outgoing_percent"] for app in apps_list]
+
+    plt.figure()
+    plt.bar(x, incoming_ratio, label='Incoming', color='orange')
+    plt.bar(x, outgoing_ratio, bottom=incoming_ratio, label='Outgoing', color='blue')
+    plt.xticks(x, apps_list)
+    plt.xlabel("Application")
+    plt.ylabel("Traffic Direction (%)")
+    plt.title("Traffic Direction (Incoming vs Outgoing) by Application")
+    plt.legend()
+    save_fig("Traffic_Direction.png", out_dir, plain_y=True)
+
+
+def plot_packet_size(metrics, out_dir=out_dir):
+    # (9) Average Packet Size
+    _bar_per_app(metrics, "avg_packet_size", 'cyan', "Average Packet Size (bytes)",
+                 "Average Packet Size by Application", "Average_Packet_Size.png", out_dir)
+
+
+def plot_bit_rate(metrics, out_dir=out_dir):
+    # (10) Bits per Second (Throughput)
+    _bar_per_app(metrics, "bits_per_second", 'red', "Bits per Second",
+                 "Network Throughput (Bits per Second) by Application", "Bit_Rate_Per_Sec.png", out_dir)
+
+
+def plot_tcp_flags(metrics, out_dir=out_dir):
+    # (11) TCP Flags Distribution (stacked)
+    apps_list = list(metrics)
+    flag_categories = ["SYN", "SYN-ACK", "ACK", "ACK-PUSH", "ACK-FIN"]
+    x_idx = np.arange(len(apps_list))
+    bar_width = 0.5
+
+    plt.figure(figsize=(10, 6))
+    bottom = np.zeros(len(apps_list))
+    for flag in flag_categories:
+        flag_percents = [metrics[app]["tcp_flags_percent"].get(flag, 0) for app in apps_list]
+        plt.bar(x_idx, flag_percents, bar_width, bottom=bottom, label=flag)
+        bottom += np.array(flag_percents)
+
+    plt.xticks(x_idx, apps_list, rotation=30, ha="right")
+    plt.xlabel("Application")
+    plt.ylabel("Percentage of TCP Flags (%)")
+    plt.title("TCP Flags Distribution by Application (Stacked)")
+    plt.legend(loc='upper left', bbox_to_anchor=(1, 1), title="TCP Flags", fontsize=8)
+    plt.tight_layout(rect=[0, 0, 0.8, 1])
+    save_fig("TCP_Flags_Distribution_Stacked.png", out_dir, plain_y=True)
+
+
+PCAP_FIGURES = [
+    plot_tcp_window_size, plot_ttl, plot_protocol_distribution, plot_tls_usage,
+    plot_flow_volume, plot_flow_size, plot_inter_arrival, plot_traffic_direction,
+    plot_packet_size, plot_bit_rate, plot_tcp_flags,
+]
+
+
+# ---- Figures of analyze_traffic_2.py (metrics: service -> csv_metrics entry) ----
+
+def plot_tls_handshake(metrics, out_dir=out_dir):
+    # Dictionary to store percentage of TLS handshake features by service
+    tls_handshake_counts = {}
+    for name, result in metrics.items():
+        counts = result.get("tls_handshake_counts")
+        if counts is None:
+            continue
+        total = sum(counts.values())
+        if total > 0:
+            tls_handshake_counts[name] = {k: (v / total) * 100 for k, v in counts.items()}
+        else:
+            tls_handshake_counts[name] = {k: 0 for k in counts}
+
+    # Convert TLS handshake data into a DataFrame
+    tls_handshake_percent_df = pd.DataFrame(tls_handshake_counts).T
+
+    # TLS Handshake Features per Service (Percentage)
+    plt.figure(figsize=(10, 5))
+    tls_handshake_percent_df.plot(kind="bar", stacked=True, figsize=(10, 5))
+    plt.title("TLS Handshake Features per Service (Percentage)")
+    plt.xlabel("Service")
+    plt.ylabel("Percentage of TLS Handshake Packets (%)")
+    plt.legend(title="TLS Feature")
+    plt.grid(axis='y')
+    plt.tight_layout()
+    save_fig("TLS_Handshake_Features_per_Service.png", out_dir)
+
+
+def plot_psh_vs_syn_ack(metrics, out_dir=out_dir):
+    # Compare PSH vs SYN,ACK in TCP packets (percentage per service)
+    push_counts = {}
+    syn_ack_counts = {}
+    for name, result in metrics.items():
+        if result.get("push_count") is not None:
+            push_counts[name] = result["push_count"]
+            syn_ack_counts[name] = result["syn_ack_count"]
+
+    comparison_df_abs = pd.DataFrame({
+        "PSH": push_counts,
+        "SYN, ACK": syn_ack_counts
+    })
+
+    # Convert to percentage counts
+    comparison_percent_df = comparison_df_abs.astype("float64")
+    for service in comparison_percent_df.index:
+        total = comparison_percent_df.loc[service].sum()
+        if total > 0:
+            comparison_percent_df.loc[service] = (comparison_percent_df.loc[service] / total) * 100
+        else:
+            comparison_percent_df.loc[service] = 0
+
+    # Comparison of PSH vs. SYN, ACK Packets per Service (Percentage)
+    plt.figure(figsize=(10, 5))
+    comparison_percent_df.plot(kind="bar", figsize=(10, 5))
+    plt.title("Comparison of PSH vs. SYN, ACK Packets per Service (Percentage)")
+    plt.xlabel("Service")
+    plt.ylabel("Percentage of Packets (%)")
+    plt.legend(title="TCP Feature")
+    plt.grid(axis='y')
+    plt.tight_layout()
+    save_fig("Comparison_of_PSH_vs_SYN_ACK.png", out_dir)
+
+
+def plot_tls_versions(metrics, out_dir=out_dir):
+    # Analyze TLS versions per service (normalized percentages)
+    tls_versions_counts = {
+        name: result["tls_version_counts"]
+        for name, result in metrics.items()
+        if result.get("tls_version_counts") is not None
+    }
+
+    tls_versions_df = pd.DataFrame(tls_versions_counts).fillna(0).T
+    tls_versions_df = tls_versions_df.div(tls_versions_df.sum(axis=1), axis=0) * 100
+
+    # TLS Version Distribution per Service (Percentage)
+    plt.figure(figsize=(12, 6))
+    tls_versions_df.plot(kind="bar", stacked=True, figsize=(12, 6))
+    plt.title("TLS Version Distribution per Service (Percentage)")
+    plt.xlabel("Service")
+    plt.ylabel("Percentage of TLS Packets (%)")
+    plt.legend(title="TLS Version")
+    plt.grid(axis='y')
+    plt.tight_layout()
+    save_fig("TLS_Version_Distribution_per_Service.png", out_dir)
+
+
+def _port_series(counts):
+    """Port -> count dict (keys are strings when read back from JSON/Parquet) as an int Series."""
+    return pd.Series({int(port): int(count) for port, count in (counts or {}).items()}, dtype="int64")
+
+
+def plot_top_10_ports_overall(port_counts, port_col, title, filename, out_dir=out_dir):
+    """Plot the 10 most frequent ports overall, split per service.
+
+    port_counts maps each service to a dict of packet counts by port.
+    """
+    counts_df = pd.DataFrame({name: _port_series(c) for name, c in port_counts.items()}).fillna(0).T.sort_index()
+    counts_df.index.name = "Service"
+    counts_df.columns.name = port_col
+    top_10_ports = counts_df.sum(axis=0).nlargest(10).index
+    pivot_df = counts_df[sorted(top_10_ports)]
+    pivot_df = pivot_df[pivot_df.sum(axis=1) > 0].astype("int64")
+    pivot_percent = pivot_df.div(pivot_df.sum(axis=1), axis=0) * 100
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    colors = sns.color_palette("tab10", n_colors=len(pivot_percent.columns))
+    pivot_percent.plot(kind="barh", stacked=True, ax=ax, color=colors)
+    ax.set_title(title, pad=15)
+    ax.set_xlabel("Percentage of Packets (%)")
+    ax.set_ylabel("Service")
+    ax.legend(title=port_col, bbox_to_anchor=(1.02, 1), loc="upper left", borderaxespad=0)
+    ax.grid(axis="x")
+    plt.tight_layout(rect=[0, 0, 0.8, 1])
+    save_fig(filename, out_dir)
+
+
+def plot_top_source_ports(metrics, out_dir=out_dir):
+    # Top 10 Source Ports (Overall)
+    plot_top_10_ports_overall(
+        {name: result.get("source_port_counts") for name, result in metrics.items()},
+        "Source Port",
+        "Top 10 Source Ports (Overall) Distribution per Service (Percentage)",
+        "Top_10_Source_Ports_Overall.png",
+        out_dir,
+    )
+
+
+def plot_top_destination_ports(metrics, out_dir=out_dir):
+    # Top 10 Destination Ports (Overall)
+    plot_top_10_ports_overall(
+        {name: result.get("destination_port_counts") for name, result in metrics.items()},
+        "Destination Port",
+        "Top 10 Destination Ports (Overall) Distribution per Service (Percentage)",
+        "Top_10_Destination_Ports_Overall.png",
+        out_dir,
+    )
+
+
+CSV_FIGURES = [
+    plot_tls_handshake, plot_psh_vs_syn_ack, plot_tls_versions,
+    plot_top_source_ports, plot_top_destination_ports,
+]
+
+
+@instrumentation.timed("render")
+def render(figures, metrics, out_dir=out_dir, workers=None):
+    """Render every figure function of 'figures' from 'metrics' into 'out_dir'.
+
+    workers: number of processes (default: one per CPU); 1 renders in this process.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    instrumentation.count("figures", len(figures))
+    workers = min(workers or os.cpu_count() or 1, len(figures))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(figure, metrics, out_dir) for figure in figures]
+            for future in futures:
+                future.result()
+    else:
+        for figure in figures:
+            figure(metrics, out_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the figures from saved metrics (JSON or Parquet).")
+    parser.add_argument("--pcap-metrics", help="metrics written by 'analyze_traffic_1.py --metrics'")
+    parser.add_argument("--csv-metrics", help="metrics written by 'analyze_traffic_2.py --metrics'")
+    parser.add_argument("--out-dir", default=out_dir, help="folder for the figures (default: %(default)s)")
+    parser.add_argument("--workers", type=int, help="number of rendering processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    if args.pcap_metrics:
+        render(PCAP_FIGURES, read_metrics(args.pcap_metrics), args.out_dir, args.workers)
+    if args.csv_metrics:
+        render(CSV_FIGURES, read_metrics(args.csv_metrics), args.out_dir, args.workers)
+    if not (args.pcap_metrics or args.csv_metrics):
+        parser.error("give --pcap-metrics and/or --csv-metrics")
+
+
+if __name__ == "__main__":
+    main()
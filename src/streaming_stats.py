@@ -0,0 +1,465 @@
+import heapq
+import math
+
+import numpy as np
+
+# One-pass accumulators with bounded memory.
+# They are fed one value at a time (or a NumPy batch) and can be merged, so a
+# capture of any length is summarized without keeping its packets around.
+
+
+class RunningStats:
+    """Count, mean, variance (Welford), sum, min and max of a stream of numbers."""
+
+    def __init__(self):
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def append(self, value):
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        """Add a batch of values (vectorized, then merged with Chan's formula)."""
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        batch = RunningStats()
+        batch.count = len(values)
+        batch._mean = float(values.mean())
+        batch._m2 = float(((values - batch._mean) ** 2).sum())
+        batch.total = float(values.sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        self.merge(batch)
+
+    def merge(self, other):
+        """Combine with the statistics of another stream."""
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self._mean, self._m2 = other.count, other._mean, other._m2
+            self.total, self.min, self.max = other.total, other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._mean += delta * other.count / count
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def sum(self):
+        return self.total
+
+    def mean(self):
+        """Mean of the stream, 0 when it is empty."""
+        return self._mean if self.count else 0
+
+    def variance(self):
+        """Population variance, 0 for fewer than two values."""
+        return self._m2 / self.count if self.count > 1 else 0
+
+    def std(self):
+        return math.sqrt(self.variance())
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile with the P-square algorithm (Jain & Chlamtac).
+
+    The first 'exact_limit' values are kept and the quantile is exact for them;
+    after that five markers initialised from those values are updated, so
+    memory is constant regardless of the stream length.
+    """
+
+    def __init__(self, p, exact_limit=32):
+        self.p = p
+        self.exact_limit = max(exact_limit, 5)
+        self.count = 0
+        self._values = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _init_markers(self):
+        values = sorted(self._values)
+        n = len(values)
+        fractions = self._increments
+        self._desired = [1 + (n - 1) * f for f in fractions]
+        self._positions = [1] + [min(max(round(d), i + 1), n - 3 + i)
+                                 for i, d in enumerate(self._desired[1:4], start=1)] + [n]
+        self._heights = [values[pos - 1] for pos in self._positions]
+        self._values = []
+
+    def append(self, value):
+        self.count += 1
+        if self._heights is None:
+            self._values.append(value)
+            if self.count > self.exact_limit:
+                self._init_markers()
+            return
+
+        heights = self._heights
+        # Find the cell of the new value and update the extreme markers
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Adjust the three middle markers
+        for i in range(1, 4):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / \
+                        (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Current estimate of the quantile, 0 when nothing has been seen."""
+        if not self.count:
+            return 0
+        if self._heights is None:
+            # Exact, using linear interpolation like numpy.percentile
+            return float(np.percentile(self._values, self.p * 100))
+        return self._heights[2]
+
+    def merge(self, other):
+        """Combine with another estimator of the same quantile.
+
+        Values still held exactly by either side are replayed; two sets of
+        P-square markers cannot be merged exactly, so the markers of the larger
+        stream are kept and its middle marker is moved to the count-weighted
+        mean of both estimates.
+        """
+        if other._heights is None:
+            for value in other._values:
+                self.append(value)
+            return self
+        if self._heights is None:
+            values = self._values
+            self.count = other.count
+            self._values = []
+            self._heights = list(other._heights)
+            self._positions = list(other._positions)
+            self._desired = list(other._desired)
+            for value in values:
+                self.append(value)
+            return self
+
+        combined = (self.value() * self.count + other.value() * other.count) / (self.count + other.count)
+        if other.count > self.count:
+            self._heights = list(other._heights)
+            self._positions = list(other._positions)
+            self._desired = list(other._desired)
+        self._heights[2] = min(max(combined, self._heights[1]), self._heights[3])
+        self.count += other.count
+        return self
+
+
+class IntervalStats:
+    """Running statistics plus 25/50/75 percentile estimates of a stream of intervals."""
+
+    QUANTILES = (0.25, 0.5, 0.75)
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.quantiles = [P2Quantile(q) for q in self.QUANTILES]
+
+    def append(self, value):
+        self.stats.append(value)
+        for quantile in self.quantiles:
+            quantile.append(value)
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        for quantile, other_quantile in zip(self.quantiles, other.quantiles):
+            quantile.merge(other_quantile)
+        return self
+
+    def features(self, scale=1.0):
+        """Return the INTERVALS_* feature columns used by traffic_classifier.
+
+        scale converts from seconds to the unit of the dataset (e.g. 1000 for ms).
+        """
+        return {
+            "INTERVALS_MEAN": self.stats.mean() * scale,
+            "INTERVALS_MAX": (self.stats.max if self.stats.count else 0) * scale,
+            "INTERVALS_STD": self.stats.std() * scale,
+            "INTERVALS_25": self.quantiles[0].value() * scale,
+            "INTERVALS_50": self.quantiles[1].value() * scale,
+            "INTERVALS_75": self.quantiles[2].value() * scale,
+        }
+
+
+class InterArrivalTracker:
+    """Online inter-arrival times from a stream of packet timestamps.
+
+    Timestamps pass through a small min-heap of 'reorder_window' entries, so
+    packets that are slightly out of order are put back in order before the
+    interval to the previous packet is taken. A packet later than the whole
+    window counts as an interval of 0 and is recorded in 'late_packets'.
+    """
+
+    def __init__(self, reorder_window=64):
+        self.reorder_window = reorder_window
+        self.intervals = IntervalStats()
+        self.first = None
+        self.last = None
+        self.late_packets = 0
+        self._pending = []
+
+    def append(self, timestamp):
+        heapq.heappush(self._pending, timestamp)
+        if len(self._pending) > self.reorder_window:
+            self._emit(heapq.heappop(self._pending))
+
+    def _emit(self, timestamp):
+        if self.last is None:
+            self.first = self.last = timestamp
+            return
+        if timestamp < self.last:
+            self.late_packets += 1
+            self.intervals.append(0.0)
+            return
+        self.intervals.append(timestamp - self.last)
+        self.last = timestamp
+
+    def flush(self):
+        """Emit the timestamps still held in the reorder buffer."""
+        while self._pending:
+            self._emit(heapq.heappop(self._pending))
+        return self
+
+    def merge(self, other):
+        """Append the packets of a tracker that covers a later part of the stream."""
+        self.flush()
+        other.flush()
+        if other.last is None:
+            return self
+        if self.last is None:
+            self.first, self.last = other.first, other.last
+        else:
+            # The gap between the two parts is one more interval
+            self.intervals.append(max(other.first - self.last, 0.0))
+            self.last = max(self.last, other.last)
+        self.intervals.merge(other.intervals)
+        self.late_packets += other.late_packets
+        return self
+
+    def __len__(self):
+        return (self.intervals.stats.count + 1 if self.last is not None else 0) + len(self._pending)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def mean(self):
+        """Mean inter-arrival time."""
+        self.flush()
+        return self.intervals.stats.mean()
+
+    def duration(self):
+        """Time between the first and the last packet."""
+        self.flush()
+        if self.last is None:
+            return 0
+        return self.last - self.first
+
+    def features(self, scale=1.0):
+        self.flush()
+        return self.intervals.features(scale)
+
+
+def _hash64(items):
+    """64-bit hashes of a sequence of items (integers are mixed with splitmix64, others hashed by pandas)."""
+    items = np.asarray(items)
+    if items.dtype.kind in "iub":
+        with np.errstate(over="ignore"):
+            z = items.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            return z ^ (z >> np.uint64(31))
+    from pandas.util import hash_array
+    return hash_array(items.astype(object))
+
+
+class CountMinSketch:
+    """Count-Min sketch: 'depth' rows of 'width' counters, each item counted once per row.
+
+    estimate() never under-counts; with width w it over-counts by at most
+    about e/w of the total with probability 1 - exp(-depth). Sketches with
+    the same width, depth and seed are merged by adding their tables.
+    """
+
+    def __init__(self, width=2048, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        rng = np.random.default_rng(seed)
+        # One odd multiplier per row (multiply-shift hashing of the 64-bit item hash)
+        self._multipliers = rng.integers(1, 2**63, size=depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.total = 0
+
+    def _columns(self, hashes):
+        with np.errstate(over="ignore"):
+            return [((hashes * m) >> np.uint64(32)) % np.uint64(self.width) for m in self._multipliers]
+
+    def add(self, items, counts):
+        """Add 'counts' (an array) for 'items' (same length)."""
+        counts = np.asarray(counts, dtype=np.float64)
+        if not len(counts):
+            return self
+        for row, columns in zip(self.table, self._columns(_hash64(items))):
+            row += np.bincount(columns.astype(np.int64), weights=counts, minlength=self.width).astype(np.int64)
+        self.total += int(counts.sum())
+        return self
+
+    def estimate(self, items):
+        """Upper-bound counts of 'items' as an int64 array."""
+        columns = self._columns(_hash64(items))
+        return np.min([row[c.astype(np.int64)] for row, c in zip(self.table, columns)], axis=0)
+
+    def merge(self, other):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("cannot merge Count-Min sketches of different shapes or seeds")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+
+class SpaceSaving:
+    """Space-Saving summary of the 'k' most frequent items.
+
+    'counts' holds an upper bound of each tracked item's count and 'errors'
+    how much of it may be over-counted; 'dropped' bounds the count of any
+    item that is not tracked. Batches of exact counts and other summaries
+    are merged the same way (Cafaro et al.), so partial results from chunks
+    or processes combine with the usual Space-Saving guarantees.
+    """
+
+    def __init__(self, k=64):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+        self.dropped = 0
+
+    def add(self, items, counts):
+        """Add exact counts of a batch (e.g. the value_counts of one chunk)."""
+        batch = SpaceSaving(len(items))
+        batch.counts = dict(zip(items, (int(c) for c in counts)))
+        batch.errors = dict.fromkeys(batch.counts, 0)
+        return self.merge(batch)
+
+    def merge(self, other):
+        own_floor, other_floor = self.dropped, other.dropped
+        counts, errors = {}, {}
+        for item in self.counts.keys() | other.counts.keys():
+            counts[item] = self.counts.get(item, own_floor) + other.counts.get(item, other_floor)
+            errors[item] = self.errors.get(item, own_floor) + other.errors.get(item, other_floor)
+        dropped = own_floor + other_floor
+        if len(counts) > self.k:
+            kept = heapq.nlargest(self.k, counts, key=counts.get)
+            dropped = max(dropped, max(counts[item] for item in counts.keys() - set(kept)))
+            counts = {item: counts[item] for item in kept}
+            errors = {item: errors[item] for item in kept}
+        self.counts, self.errors, self.dropped = counts, errors, dropped
+        return self
+
+    def top(self, n=None):
+        """(item, upper bound, lower bound) of the tracked items, most frequent first."""
+        items = sorted(self.counts, key=self.counts.get, reverse=True)[:n]
+        return [(item, self.counts[item], self.counts[item] - self.errors[item]) for item in items]
+
+
+class HeavyHitters:
+    """Top-N items of a stream in fixed memory: Space-Saving finds the candidates and
+    a Count-Min sketch tightens their counts and answers queries for any item.
+
+    Fed with per-chunk counts (add) and combined with merge(), so a top-N over
+    any number of packets is computed in one pass and partial results from
+    several workers or services can be added together.
+    """
+
+    def __init__(self, k=64, width=2048, depth=4, seed=0):
+        self.summary = SpaceSaving(k)
+        self.sketch = CountMinSketch(width, depth, seed)
+
+    def add(self, items, counts):
+        items = list(items)
+        self.summary.add(items, counts)
+        self.sketch.add(items, counts)
+        return self
+
+    def add_values(self, values):
+        """Count a batch of values (array-like; missing values are skipped)."""
+        import pandas as pd
+        counts = pd.Series(values).value_counts()
+        counts = counts[counts > 0]         # unused categories of a categorical column
+        return self.add(counts.index.tolist(), counts.to_numpy())
+
+    def merge(self, other):
+        self.summary.merge(other.summary)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def total(self):
+        return self.sketch.total
+
+    def estimate(self, item):
+        """Upper bound of the count of any item (0 for untracked items while nothing was evicted)."""
+        bound = self.summary.counts.get(item, self.summary.dropped)
+        return min(int(self.sketch.estimate([item])[0]), bound)
+
+    def top(self, n=None):
+        """{item: estimated count} of the n most frequent items (all tracked items by default)."""
+        candidates = list(self.summary.counts)
+        if not candidates:
+            return {}
+        estimates = self.sketch.estimate(candidates)
+        counts = {item: min(int(e), self.summary.counts[item]) for item, e in zip(candidates, estimates)}
+        items = sorted(counts, key=counts.get, reverse=True)[:n]
+        return {item: counts[item] for item in items}
@@ -0,0 +1,85 @@
+import argparse
+import time
+
+import numpy as np
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score
+
+from data_paths import DATASET
+from traffic_classifier import build_classifiers, feature_matrix, load_dataset, prepare_data_for_classification
+
+# Compares the kernel SVC of traffic_classifier.py with the approximate SVMs
+# (Nystroem features + SGD hinge loss, SGD hinge loss on the raw features)
+# at increasing training set sizes.
+# The flows are split into training and test flows first; only the training
+# flows are scaled and oversampled (SMOTE) and drawn at each size, so every
+# size is scored on the same held-out flows. Sizes larger than the training
+# set are drawn with replacement, and are marked as such in the output.
+
+SVM_MODELS = ["Support Vector Machine", "Nystroem Linear SVM", "SGD Linear SVM"]
+DEFAULT_SIZES = [1_000, 5_000, 20_000, 100_000]
+
+
+def split_dataset(df, test_size=0.2):
+    """Split the flows into a prepared (scaled, SMOTE-oversampled) training set and a scaled test set."""
+    train_df, test_df = train_test_split(df, test_size=test_size, random_state=42, stratify=df['TYPE'])
+    X_train, y_train, label_mapping_inv, scaler = prepare_data_for_classification(train_df, return_scaler=True)
+    label_mapping = {label: code for code, label in label_mapping_inv.items()}
+    X_test = scaler.transform(feature_matrix(test_df))
+    y_test = test_df['TYPE'].map(label_mapping).to_numpy()
+    return X_train, y_train, X_test, y_test
+
+
+def benchmark(X_train, y_train, X_test, y_test, sizes, svc_max_rows=20_000, svc_probability=False):
+    """Return one result dict per (size, model) with training time and test accuracy.
+
+    'repeated' is True when the size exceeds the training set, whose rows
+    were then drawn with replacement.
+    """
+    rng = np.random.default_rng(42)
+    results = []
+    for size in sizes:
+        repeated = size > len(X_train)
+        rows = rng.choice(len(X_train), size=size, replace=repeated)
+        for name in SVM_MODELS:
+            result = {"rows": size, "repeated": repeated, "model": name, "fit_time_s": None, "accuracy": None}
+            results.append(result)
+            if name == "Support Vector Machine" and size > svc_max_rows:
+                continue
+            clf = build_classifiers(svc_probability)[name]
+            start = time.perf_counter()
+            clf.fit(X_train[rows], y_train[rows])
+            result["fit_time_s"] = time.perf_counter() - start
+            result["accuracy"] = accuracy_score(y_test, clf.predict(X_test))
+            print(f"{size:>10,}{'*' if repeated else ' '} {name:<25} fit {result['fit_time_s']:8.2f}s  "
+                  f"accuracy {result['accuracy']:.4f}", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kernel SVC against the approximate SVMs.")
+    parser.add_argument("--data", default=DATASET)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="training set sizes (rows)")
+    parser.add_argument("--svc-max-rows", type=int, default=20_000,
+                        help="skip the kernel SVC above this many rows (default: 20000)")
+    parser.add_argument("--svc-probability", action="store_true", help="time SVC(probability=True) as in the report")
+    args = parser.parse_args()
+
+    X_train, y_train, X_test, y_test = split_dataset(load_dataset(args.data))
+    print(f"{len(X_train):,} training rows (after oversampling), {len(X_test):,} test rows")
+    results = benchmark(X_train, y_train, X_test, y_test, args.sizes, args.svc_max_rows, args.svc_probability)
+
+    print(f"\n{'rows':>10}  " + "".join(f"{name:>26}" for name in SVM_MODELS))
+    for size in args.sizes:
+        cells = []
+        for name in SVM_MODELS:
+            r = next(r for r in results if r["rows"] == size and r["model"] == name)
+            cells.append(f"{'skipped':>26}" if r["fit_time_s"] is None
+                         else f"{r['fit_time_s']:>12.2f}s / {r['accuracy']:.4f}")
+        print(f"{size:>10,}{'*' if size > len(X_train) else ' '} " + "".join(cells))
+    if any(r["repeated"] for r in results):
+        print(f"* larger than the {len(X_train):,} training rows: rows were drawn with replacement (repeated)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import socket
+import struct
+
+import numpy as np
+import pandas as pd
+
+from flow_table import FEATURE_COLUMNS
+from local_network import my_local_ip
+from tcp_flags import FLAG_VALUES
+
+# Generators of synthetic test data for the benchmarks:
+#   - .pcapng captures with a configurable TCP/UDP/TLS/QUIC mix and TCP flag mix,
+#   - Wireshark-style CSV exports (No., Time, Source, Destination, Protocol, Length, Info),
+#   - flow datasets with the columns of traffic_classifier.py.
+# Packets/rows are drawn from a small set of prebuilt templates, so generating
+# 10^8 packets costs little more than writing the bytes.
+
+PROTOCOL_MIX = {"TCP": 0.30, "TLS": 0.35, "UDP": 0.10, "QUIC": 0.25}
+
+# Share of each TCP flag combination among plain TCP packets; 0x04 (RST) is "OTHER" in the figures
+FLAG_MIX = {0x02: 0.05, 0x12: 0.05, 0x10: 0.60, 0x18: 0.20, 0x11: 0.05, 0x04: 0.05}
+
+# Wireshark's spelling of the flags in the Info column
+WIRESHARK_FLAGS = {0x02: "SYN", 0x12: "SYN, ACK", 0x10: "ACK", 0x18: "PSH, ACK", 0x11: "FIN, ACK", 0x04: "RST"}
+
+SERVICES = ["zoom", "youtube", "spotify", "chrome", "firefox"]
+
+REMOTE_IPS = ["142.250.75.14", "157.240.1.35", "151.101.1.140", "13.107.42.14"]
+FLOWS_PER_CLASS = 8
+PAYLOAD_SIZES = [0, 120, 600, 1200]
+BATCH = 100_000
+
+
+def _ipv4(src, dst, proto, payload, ttl=64):
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 0, 0, ttl, proto, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst))
+    return header + payload
+
+
+def _tcp(sport, dport, flags, payload, window=501):
+    # The NS flag (0x100) is the low bit of the data offset byte
+    return struct.pack("!HHIIBBHHH", sport, dport, 1, 1, (5 << 4) | (flags >> 8), flags & 0xFF, window, 0, 0) + payload
+
+
+def _udp(sport, dport, payload):
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+def _ethernet(packet):
+    return b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00" + packet
+
+
+def _frame_templates(rng, protocol_mix, flag_mix, local_ip):
+    """Return (frames, probabilities) of the packet templates."""
+    frames, weights = [], []
+    for protocol, share in protocol_mix.items():
+        for flow in range(FLOWS_PER_CLASS):
+            remote = REMOTE_IPS[flow % len(REMOTE_IPS)]
+            local_port = 50000 + int(rng.integers(0, 10000))
+            for outgoing in (True, False):
+                src, dst = (local_ip, remote) if outgoing else (remote, local_ip)
+                ttl = 64 if outgoing else int(rng.integers(50, 120))
+                for size in PAYLOAD_SIZES:
+                    if protocol == "TCP":
+                        sport, dport = (local_port, 8080) if outgoing else (8080, local_port)
+                        for flags, flag_share in flag_mix.items():
+                            frames.append(_ethernet(_ipv4(src, dst, 6, _tcp(sport, dport, flags, b"d" * size), ttl)))
+                            weights.append(share * flag_share)
+                        continue
+                    if protocol == "TLS":
+                        sport, dport = (local_port, 443) if outgoing else (443, local_port)
+                        record = b"\x17\x03\x03" + struct.pack("!H", size + 16) + b"t" * (size + 16)
+                        frame = _ipv4(src, dst, 6, _tcp(sport, dport, 0x18, record), ttl)
+                    elif protocol == "QUIC":
+                        sport, dport = (local_port, 443) if outgoing else (443, local_port)
+                        frame = _ipv4(src, dst, 17, _udp(sport, dport, b"\x43" + b"q" * (size + 20)), ttl)
+                    else:
+                        sport, dport = (local_port, 53) if outgoing else (53, local_port)
+                        frame = _ipv4(src, dst, 17, _udp(sport, dport, b"u" * (size + 12)), ttl)
+                    frames.append(_ethernet(frame))
+                    weights.append(share)
+    weights = np.array(weights, dtype=np.float64)
+    return frames, weights / weights.sum()
+
+
+def write_pcapng(path, packets, seed=0, protocol_mix=PROTOCOL_MIX, flag_mix=FLAG_MIX, local_ip=my_local_ip):
+    """Write a synthetic Ethernet .pcapng capture with 'packets' packets."""
+    unknown = [flags for flags in flag_mix if not 0 < flags < FLAG_VALUES]
+    if unknown:
+        raise ValueError("TCP flags must be 9-bit values: %s" % sorted(unknown))
+    rng = np.random.default_rng(seed)
+    frames, probabilities = _frame_templates(rng, protocol_mix, flag_mix, local_ip)
+
+    # Each packet is one Enhanced Packet Block around a prebuilt frame
+    blocks = []
+    for frame in frames:
+        pad = b"\x00" * (-len(frame) % 4)
+        total = 32 + len(frame) + len(pad)
+        blocks.append((struct.pack("<II", 6, total), len(frame), frame + pad, total))
+
+    ts_us = 1_700_000_000 * 1_000_000
+    with open(path, "wb") as f:
+        # Section Header Block and one Ethernet interface (microsecond timestamps)
+        f.write(struct.pack("<IIIHHqI", 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+        f.write(struct.pack("<IIHHII", 1, 20, 1, 0, 65535, 20))
+        for start in range(0, packets, BATCH):
+            count = min(BATCH, packets - start)
+            choices = rng.choice(len(frames), size=count, p=probabilities)
+            gaps = rng.exponential(2000, size=count).astype(np.int64) + 1
+            stamps = ts_us + np.cumsum(gaps)
+            ts_us = int(stamps[-1])
+            out = []
+            for choice, stamp in zip(choices.tolist(), stamps.tolist()):
+                head, length, body, total = blocks[choice]
+                out.append(head)
+                out.append(struct.pack("<IIIII", 0, stamp >> 32, stamp & 0xFFFFFFFF, length, length))
+                out.append(body)
+                out.append(struct.pack("<I", total))
+            f.write(b"".join(out))
+
+
+def _csv_templates(rng, protocol_mix, flag_mix, local_ip):
+    """Return a DataFrame of (Source, Destination, Protocol, Length, Info) row templates and their probabilities."""
+    rows, weights = [], []
+    for protocol, share in protocol_mix.items():
+        for flow in range(FLOWS_PER_CLASS):
+            remote = REMOTE_IPS[flow % len(REMOTE_IPS)]
+            local_port = 50000 + int(rng.integers(0, 10000))
+            for outgoing in (True, False):
+                src, dst = (local_ip, remote) if outgoing else (remote, local_ip)
+                for size in PAYLOAD_SIZES:
+                    if protocol == "TCP":
+                        sport, dport = (local_port, 8080) if outgoing else (8080, local_port)
+                        for flags, flag_share in flag_mix.items():
+                            info = "%d > %d [%s] Seq=1 Ack=1 Win=501 Len=%d" % (
+                                sport, dport, WIRESHARK_FLAGS.get(flags, "ACK"), size)
+                            rows.append((src, dst, "TCP", size + 54, info))
+                            weights.append(share * flag_share)
+                        continue
+                    if protocol == "TLS":
+                        version = "TLSv1.3" if flow % 4 else "TLSv1.2"
+                        if size == 0:
+                            info = "Client Hello (SNI=example.com)" if outgoing else \
+                                "Server Hello, Change Cipher Spec, Application Data"
+                        else:
+                            info = "Application Data"
+                        rows.append((src, dst, version, size + 75, info))
+                    elif protocol == "QUIC":
+                        rows.append((src, dst, "QUIC", size + 63, "Protected Payload (KP0), DCID=%08x" % flow))
+                    else:
+                        sport, dport = (local_port, 53) if outgoing else (53, local_port)
+                        rows.append((src, dst, "UDP", size + 54, "%d > %d Len=%d" % (sport, dport, size)))
+                    weights.append(share)
+    weights = np.array(weights, dtype=np.float64)
+    templates = pd.DataFrame(rows, columns=["Source", "Destination", "Protocol", "Length", "Info"])
+    return templates, weights / weights.sum()
+
+
+def write_capture_csv(path, rows, seed=0, protocol_mix=PROTOCOL_MIX, flag_mix=FLAG_MIX, local_ip=my_local_ip):
+    """Write a synthetic Wireshark 'Export Packet Dissections > As CSV' file with 'rows' packets."""
+    rng = np.random.default_rng(seed)
+    templates, probabilities = _csv_templates(rng, protocol_mix, flag_mix, local_ip)
+    time = 0.0
+    for start in range(0, rows, BATCH * 10):
+        count = min(BATCH * 10, rows - start)
+        chunk = templates.iloc[rng.choice(len(templates), size=count, p=probabilities)].reset_index(drop=True)
+        times = time + np.cumsum(rng.exponential(0.002, size=count))
+        time = float(times[-1])
+        chunk.insert(0, "Time", np.round(times, 6))
+        chunk.insert(0, "No.", np.arange(start + 1, start + count + 1))
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    if rows == 0:
+        pd.DataFrame(columns=["No.", "Time"] + list(templates.columns)).to_csv(path, index=False)
+
+
+def write_flow_dataset(path, rows, seed=0, services=SERVICES):
+    """Write a synthetic flow dataset with TYPE and the FEATURE_COLUMNS of traffic_classifier.py.
+
+    Each service has its own scale for the byte counts and intervals, so the
+    classes are learnable but overlap.
+    """
+    rng = np.random.default_rng(seed)
+    scales = {service: 0.5 + i for i, service in enumerate(services)}
+    for start in range(0, max(rows, 1), BATCH * 10):
+        count = min(BATCH * 10, rows - start)
+        types = rng.choice(services, size=count)
+        m = np.array([scales[t] for t in types])
+        chunk = pd.DataFrame({"TYPE": types})
+        for column in FEATURE_COLUMNS:
+            base = 1e4 if column.startswith("BYTES") else 1.0
+            chunk[column] = rng.exponential(base * m)
+        chunk.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic captures, CSV exports and flow datasets.")
+    parser.add_argument("kind", choices=["pcapng", "csv", "flows"])
+    parser.add_argument("output")
+    parser.add_argument("-n", "--count", type=float, default=1e5, help="packets or rows (default: 1e5)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    count = int(args.count)
+    if args.kind == "pcapng":
+        write_pcapng(args.output, count, args.seed)
+    elif args.kind == "csv":
+        write_capture_csv(args.output, count, args.seed)
+    else:
+        write_flow_dataset(args.output, count, args.seed)
+
+
+if __name__ == "__main__":
+    main()
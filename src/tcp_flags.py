@@ -0,0 +1,77 @@
+import numpy as np
+
+# TCP flag statistics.
+# The flags are the 9 low bits of TCP header bytes 12-13 (NS, CWR, ECE, URG,
+# ACK, PSH, RST, SYN, FIN), kept as integers. A capture's flags are reduced to
+# a 512-bin histogram (one bin per combination); per-bit counts and named
+# combinations are computed from that histogram with NumPy, not per packet.
+
+TCP_FLAG_BITS = {
+    "FIN": 0x001,
+    "SYN": 0x002,
+    "RST": 0x004,
+    "PSH": 0x008,
+    "ACK": 0x010,
+    "URG": 0x020,
+    "ECE": 0x040,
+    "CWR": 0x080,
+    "NS": 0x100,
+}
+FLAG_VALUES = 512
+
+# Names of the combinations shown in the report figures; the rest are "OTHER"
+TCP_FLAGS_MAPPING = {
+    0x02: "SYN",
+    0x12: "SYN-ACK",
+    0x10: "ACK",
+    0x18: "ACK-PUSH",
+    0x11: "ACK-FIN",
+}
+
+# BIT_MATRIX[v, i] is 1 when bit i of the value v is set
+BIT_MATRIX = ((np.arange(FLAG_VALUES)[:, None] & np.array(list(TCP_FLAG_BITS.values()))[None, :]) != 0).astype(np.int64)
+
+
+def flag_histogram(flags):
+    """512-bin histogram of an integer array of flags (negative values = missing are skipped).
+
+    Bits above NS (reserved, reported by tshark in 12-bit flags) are ignored.
+    """
+    flags = np.asarray(flags, dtype=np.int64)
+    return np.bincount(flags[flags >= 0] & (FLAG_VALUES - 1), minlength=FLAG_VALUES)
+
+
+def histogram_from_counts(counts):
+    """512-bin histogram of a {flags value: packets} dictionary."""
+    histogram = np.zeros(FLAG_VALUES, dtype=np.int64)
+    for value, count in counts.items():
+        histogram[value & (FLAG_VALUES - 1)] += count
+    return histogram
+
+
+def flag_label(value):
+    """Name of a flag combination: the report name if it has one, else the set bits, e.g. 'RST-ACK'."""
+    if value in TCP_FLAGS_MAPPING:
+        return TCP_FLAGS_MAPPING[value]
+    names = [name for name, bit in TCP_FLAG_BITS.items() if value & bit]
+    return "-".join(names) if names else "NONE"
+
+
+def bit_counts(histogram):
+    """Packets with each flag bit set, e.g. {'SYN': 10, 'ACK': 950, ...}."""
+    counts = histogram @ BIT_MATRIX
+    return {name: int(count) for name, count in zip(TCP_FLAG_BITS, counts)}
+
+
+def combination_counts(histogram):
+    """Packets per flag combination that occurs, keyed by flag_label."""
+    return {flag_label(int(value)): int(histogram[value]) for value in np.flatnonzero(histogram)}
+
+
+def report_counts(histogram):
+    """Packets per TCP_FLAGS_MAPPING name, all other combinations counted as 'OTHER'."""
+    counts = {}
+    for value in np.flatnonzero(histogram):
+        name = TCP_FLAGS_MAPPING.get(int(value), "OTHER")
+        counts[name] = counts.get(name, 0) + int(histogram[value])
+    return counts
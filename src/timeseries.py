@@ -0,0 +1,403 @@
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from local_network import LOCAL_PREFIXES, local_network
+
+# Per-interval timelines of a capture.
+# Packets are counted per time bin of the finest resolution (10 ms by
+# default): packets and bytes, in total and per direction, with one
+# np.bincount per chunk of timestamps. Inter-arrival times are counted in a
+# log-spaced histogram per bin of HISTOGRAM_RESOLUTION (1 s). Coarser
+# resolutions (0.1 s, 1 s, 10 s, 60 s) are sums of consecutive finer bins;
+# they are rolled up once and saved next to each other in a compressed .npz
+# file, so a timeline at any resolution, or over any time range, is a slice
+# of a stored array.
+# Bins are numbered from the epoch (bin = floor(timestamp / resolution)) and
+# the stored range starts and ends on a whole coarsest bin, so the bins of
+# every resolution line up. A timeline covers at most MAX_BINS finest bins
+# around its first packets; packets outside that window (e.g. a bad clock or
+# a zero timestamp) are skipped and counted in 'outliers'.
+
+LEVELS = (0.01, 0.1, 1.0, 10.0, 60.0)
+HISTOGRAM_RESOLUTION = 1.0
+# Inter-arrival histogram edges: 1 µs to 100 s, 4 bins per decade, plus
+# one bin below (including 0) and one above
+IAT_EDGES = np.logspace(-6, 2, 33)
+IAT_BINS = len(IAT_EDGES) + 1
+COUNT_COLUMNS = ("packets", "bytes", "packets_out", "bytes_out", "packets_in", "bytes_in")
+MIN_RESOLUTION, MAX_RESOLUTION = 0.001, 3600.0
+MAX_BINS = 10_000_000       # finest bins (about 28 hours at 10 ms, 480 MB of counts)
+
+
+def iat_labels():
+    """Names of the inter-arrival histogram bins, e.g. '<1e-06', '1e-06-1.78e-06', ..., '>=100'."""
+    labels = ["<%.3g" % IAT_EDGES[0]]
+    labels += ["%.3g-%.3g" % (low, high) for low, high in zip(IAT_EDGES[:-1], IAT_EDGES[1:])]
+    return labels + [">=%.3g" % IAT_EDGES[-1]]
+
+
+def _ratios(levels):
+    """Number of finest bins in a bin of each level; every level must be a multiple of the previous one."""
+    ratios = []
+    for level in levels:
+        ratio = level / levels[0]
+        if abs(ratio - round(ratio)) > 1e-6 or (ratios and round(ratio) % ratios[-1]):
+            raise ValueError(f"resolution {level} is not a multiple of {levels[len(ratios) - 1]}")
+        ratios.append(int(round(ratio)))
+    return ratios
+
+
+class Timeline:
+    """Packet, byte and direction counts per time bin at several resolutions, plus inter-arrival histograms.
+
+    add() takes arrays of timestamps, lengths and directions (1 sent from a
+    local address, -1 received, 0 not IP), so the same object is filled from
+    a sidecar index in one call or from a packet stream chunk by chunk.
+    """
+
+    def __init__(self, levels=LEVELS, histogram_resolution=HISTOGRAM_RESOLUTION):
+        self.levels = sorted(float(level) for level in levels)
+        if self.levels[0] < MIN_RESOLUTION or self.levels[-1] > MAX_RESOLUTION:
+            raise ValueError(f"resolutions must be between {MIN_RESOLUTION} and {MAX_RESOLUTION} seconds")
+        if histogram_resolution not in self.levels:
+            raise ValueError(f"the histogram resolution {histogram_resolution} must be one of {self.levels}")
+        self.histogram_resolution = float(histogram_resolution)
+        self.ratios = _ratios(self.levels)
+        self.span = self.ratios[-1]
+        self.histogram_ratio = self.ratios[self.levels.index(self.histogram_resolution)]
+        self.origin = None          # finest bin number of counts[:, 0], a multiple of span
+        self.stop = 0               # finest bins in use (a multiple of span)
+        self.counts = np.zeros((len(COUNT_COLUMNS), 0), dtype=np.int64)
+        self.histogram = np.zeros((0, IAT_BINS), dtype=np.int64)
+        self.last_time = None
+        self.window = None          # (first, last) finest bins this timeline may cover
+        self.outliers = 0           # packets skipped for lying outside the window
+        self._rollups = None
+
+    # Accumulation
+
+    def _check_extendable(self):
+        if self._rollups is not None and self.levels[0] not in self._rollups:
+            raise ValueError("this timeline was loaded without its finest resolution and cannot be extended")
+
+    def _window(self, bins):
+        """The finest bins the timeline may cover, centred on its data (or on the median of 'bins')."""
+        if self.window is None:
+            if self.origin is not None:
+                center = self.origin + self.stop // 2
+            else:
+                center = int(bins[len(bins) // 2])
+            size = max(MAX_BINS // self.span, 1) * self.span
+            first = (center - size // 2) // self.span * self.span
+            self.window = (first, first + size - 1)
+        return self.window
+
+    def _reserve(self, first, last):
+        """Make room for finest bins first..last (absolute numbers)."""
+        start = first // self.span * self.span
+        end = -(-(last + 1) // self.span) * self.span
+        if self.origin is None:
+            self.origin = start
+        if start < self.origin:
+            shift = self.origin - start
+            self.counts = np.concatenate([np.zeros((len(COUNT_COLUMNS), shift), dtype=np.int64), self.counts], axis=1)
+            self.histogram = np.concatenate(
+                [np.zeros((shift // self.histogram_ratio, IAT_BINS), dtype=np.int64), self.histogram])
+            self.origin, self.stop = start, self.stop + shift
+        needed = end - self.origin
+        if needed > self.counts.shape[1]:
+            # Grow by at least doubling (up to the window), so a stream of chunks reallocates rarely
+            window = self.window[1] + 1 - self.window[0] if self.window else needed
+            capacity = max(needed, min(2 * self.counts.shape[1], window))
+            capacity = -(-capacity // self.span) * self.span
+            grown = np.zeros((len(COUNT_COLUMNS), capacity), dtype=np.int64)
+            grown[:, :self.counts.shape[1]] = self.counts
+            self.counts = grown
+            histogram = np.zeros((capacity // self.histogram_ratio, IAT_BINS), dtype=np.int64)
+            histogram[:len(self.histogram)] = self.histogram
+            self.histogram = histogram
+        self.stop = max(self.stop, needed)
+
+    def add(self, timestamps, lengths, directions=None):
+        """Count packets given as arrays (timestamps in seconds, NaN = unknown; lengths < 0 = unknown)."""
+        self._check_extendable()
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        directions = np.zeros(len(timestamps), dtype=np.int8) if directions is None else np.asarray(directions)
+        known = ~np.isnan(timestamps)
+        if not known.all():
+            timestamps, lengths, directions = timestamps[known], lengths[known], directions[known]
+        if not len(timestamps):
+            return self
+        if (np.diff(timestamps) < 0).any():
+            order = np.argsort(timestamps, kind="stable")
+            timestamps, lengths, directions = timestamps[order], lengths[order], directions[order]
+        lengths = np.maximum(lengths, 0)
+
+        bins = np.floor(timestamps / self.levels[0]).astype(np.int64)
+        first, last = self._window(bins)
+        if bins[0] < first or bins[-1] > last:
+            inside = (bins >= first) & (bins <= last)
+            self.outliers += int(len(bins) - inside.sum())
+            timestamps, lengths, directions, bins = timestamps[inside], lengths[inside], directions[inside], bins[inside]
+            if not len(timestamps):
+                return self
+        self._rollups = None
+        self._reserve(int(bins[0]), int(bins[-1]))
+        local = bins - self.origin
+        low, size = int(local[0]), int(local[-1] - local[0]) + 1
+        local -= low
+        counts = self.counts[:, low:low + size]
+        counts[0] += np.bincount(local, minlength=size)
+        counts[1] += np.bincount(local, weights=lengths, minlength=size).astype(np.int64)
+        for row, direction in ((2, 1), (4, -1)):
+            mask = directions == direction
+            counts[row] += np.bincount(local[mask], minlength=size)
+            counts[row + 1] += np.bincount(local[mask], weights=lengths[mask], minlength=size).astype(np.int64)
+
+        # Inter-arrival times, each counted in the histogram bin of the later packet
+        previous = timestamps[:-1] if self.last_time is None else np.concatenate([[self.last_time], timestamps[:-1]])
+        later = timestamps[1:] if self.last_time is None else timestamps
+        if len(later):
+            gaps = np.maximum(later - previous, 0.0)
+            rows = (np.floor(later / self.levels[0]).astype(np.int64) - self.origin) // self.histogram_ratio
+            first = int(rows[0])
+            cells = (rows - first) * IAT_BINS + np.searchsorted(IAT_EDGES, gaps, side="right")
+            span = int(rows[-1]) - first + 1
+            self.histogram[first:first + span] += np.bincount(cells, minlength=span * IAT_BINS).reshape(span, IAT_BINS)
+        self.last_time = timestamps[-1] if self.last_time is None else max(self.last_time, timestamps[-1])
+        return self
+
+    def merge(self, other):
+        """Add the counts of another timeline with the same resolutions (e.g. another byte range of a capture)."""
+        if other.levels != self.levels or other.histogram_resolution != self.histogram_resolution:
+            raise ValueError("timelines with different resolutions cannot be merged")
+        self._check_extendable()
+        other._check_extendable()
+        self.outliers += other.outliers
+        if other.origin is None:
+            return self
+        # Only the part of the other timeline inside this window is added
+        bins = np.array([other.origin + other.stop // 2])
+        window_first, window_last = self._window(bins)
+        low = max(window_first, other.origin) - other.origin
+        high = min(window_last + 1, other.origin + other.stop) - other.origin
+        self.outliers += int(other.counts[0, :other.stop].sum() - other.counts[0, low:max(low, high)].sum())
+        if high <= low:
+            return self
+        self._rollups = None
+        self._reserve(other.origin + low, other.origin + high - 1)
+        offset = other.origin + low - self.origin
+        self.counts[:, offset:offset + high - low] += other.counts[:, low:high]
+        rows = slice(low // other.histogram_ratio, high // other.histogram_ratio)
+        first = offset // self.histogram_ratio
+        self.histogram[first:first + rows.stop - rows.start] += other.histogram[rows]
+        if other.last_time is not None:
+            self.last_time = other.last_time if self.last_time is None else max(self.last_time, other.last_time)
+        return self
+
+    # Queries
+
+    def _levels(self):
+        """{resolution: (counts, histogram or None)}, rolled up from the finest bins once."""
+        if self._rollups is None:
+            rollups = {}
+            counts = self.counts[:, :self.stop]
+            histogram = self.histogram[:self.stop // self.histogram_ratio]
+            for level, ratio in zip(self.levels, self.ratios):
+                level_counts = counts.reshape(len(COUNT_COLUMNS), -1, ratio).sum(axis=2)
+                level_histogram = None
+                if ratio >= self.histogram_ratio:
+                    level_histogram = histogram.reshape(-1, ratio // self.histogram_ratio, IAT_BINS).sum(axis=1)
+                rollups[level] = (level_counts, level_histogram)
+            self._rollups = rollups
+        return self._rollups
+
+    def resolutions(self):
+        return sorted(self._levels())
+
+    def _range(self, resolution, start, end):
+        """Slice of the bins of 'resolution' covering [start, end) seconds."""
+        if resolution not in self._levels():
+            raise ValueError(f"no timeline at {resolution} s (available: {self.resolutions()})")
+        ratio = int(round(resolution / self.levels[0]))
+        first_bin = (self.origin or 0) // ratio
+        count = self._levels()[resolution][0].shape[1]
+        low = 0 if start is None else int(np.clip(np.floor(start / resolution) - first_bin, 0, count))
+        high = count if end is None else int(np.clip(np.ceil(end / resolution) - first_bin, low, count))
+        return first_bin, slice(low, high)
+
+    def series(self, resolution=1.0, start=None, end=None):
+        """DataFrame of the bins of 'resolution' between start and end (epoch seconds), indexed by bin start time."""
+        first_bin, rows = self._range(resolution, start, end)
+        counts = self._levels()[resolution][0][:, rows]
+        df = pd.DataFrame(counts.T, columns=list(COUNT_COLUMNS))
+        df.index = (first_bin + np.arange(rows.start, rows.stop)) * resolution
+        df.index.name = "time"
+        df["bits_per_second"] = df["bytes"] * 8 / resolution
+        df["packets_per_second"] = df["packets"] / resolution
+        return df
+
+    def iat_histogram(self, resolution=None, start=None, end=None):
+        """Inter-arrival counts per IAT bin (see iat_labels) between start and end.
+
+        With a resolution (at least HISTOGRAM_RESOLUTION) the result has one
+        row per bin, otherwise the rows are summed.
+        """
+        level = resolution or self.histogram_resolution
+        histogram = self._levels()[level][1]
+        if histogram is None:
+            raise ValueError(f"inter-arrival histograms are kept per {self.histogram_resolution} s or more")
+        _, rows = self._range(level, start, end)
+        return histogram[rows] if resolution else histogram[rows].sum(axis=0)
+
+    def summary(self, resolution=1.0):
+        """Burst metrics of the timeline at 'resolution' (numbers and an inter-arrival histogram dict)."""
+        df = self.series(resolution)
+        active = df[df["packets"] > 0]
+        bits = active["bits_per_second"] if len(active) else pd.Series([0.0])
+        return {
+            "timeline_resolution": resolution,
+            "peak_bits_per_second": float(bits.max()),
+            "p95_bits_per_second": float(bits.quantile(0.95)),
+            "median_bits_per_second": float(bits.median()),
+            "peak_packets_per_second": float(df["packets_per_second"].max()) if len(df) else 0.0,
+            "active_intervals_percent": len(active) / len(df) * 100 if len(df) else 0,
+            "outliers": self.outliers,
+            "inter_arrival_histogram": dict(zip(iat_labels(), (int(v) for v in self.iat_histogram()))),
+        }
+
+    # Storage
+
+    def save(self, path, resolutions=None):
+        """Write the rolled-up levels (all, or 'resolutions') to a compressed .npz file.
+
+        Counts are stored with the smallest unsigned integer type that holds them.
+        """
+        arrays = {
+            "levels": np.array(self.levels),
+            "histogram_resolution": np.array(self.histogram_resolution),
+            "origin": np.array(-1 if self.origin is None else self.origin),
+            "last_time": np.array(np.nan if self.last_time is None else self.last_time),
+            "outliers": np.array(self.outliers),
+        }
+        for level, (counts, histogram) in self._levels().items():
+            if resolutions is not None and level not in resolutions:
+                continue
+            arrays["counts_%r" % level] = counts.astype(np.min_scalar_type(int(counts.max(initial=0))))
+            if histogram is not None:
+                arrays["histogram_%r" % level] = histogram.astype(np.min_scalar_type(int(histogram.max(initial=0))))
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Read a timeline written by save(); queries use the stored levels without recomputing them."""
+        with np.load(path) as data:
+            timeline = cls(data["levels"].tolist(), float(data["histogram_resolution"]))
+            origin = int(data["origin"])
+            timeline.origin = None if origin < 0 else origin
+            last_time = float(data["last_time"])
+            timeline.last_time = None if np.isnan(last_time) else last_time
+            timeline.outliers = int(data["outliers"]) if "outliers" in data else 0
+            rollups = {}
+            for level in timeline.levels:
+                if "counts_%r" % level in data:
+                    histogram = data.get("histogram_%r" % level)
+                    rollups[level] = (data["counts_%r" % level].astype(np.int64),
+                                      None if histogram is None else histogram.astype(np.int64))
+        finest = timeline.levels[0]
+        if finest in rollups:
+            # The finest bins are kept, so the timeline can still be extended and merged
+            timeline.counts = rollups[finest][0]
+            timeline.stop = timeline.counts.shape[1]
+            level = timeline.histogram_resolution
+            timeline.histogram = rollups[level][1] if level in rollups else np.zeros(
+                (timeline.stop // timeline.histogram_ratio, IAT_BINS), dtype=np.int64)
+        timeline._rollups = rollups
+        return timeline
+
+
+class TimelineBuffer:
+    """Collects the packets of a stream and adds them to a Timeline one chunk at a time."""
+
+    CHUNK = 65536
+
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self.timestamps = []
+        self.lengths = []
+        self.directions = []
+
+    def append(self, timestamp, length, direction):
+        self.timestamps.append(timestamp)
+        self.lengths.append(-1 if length is None else length)
+        self.directions.append(direction)
+        if len(self.timestamps) >= self.CHUNK:
+            self.flush()
+
+    def flush(self):
+        if self.timestamps:
+            self.timeline.add(np.array(self.timestamps, dtype=np.float64), self.lengths,
+                              np.array(self.directions, dtype=np.int8))
+            self.timestamps, self.lengths, self.directions = [], [], []
+        return self.timeline
+
+
+def capture_timeline(pcap_file, local, levels=LEVELS, histogram_resolution=HISTOGRAM_RESOLUTION):
+    """Timeline of a capture in one pass ('local' as in local_network.local_network)."""
+    from pcap_reader import read_packets
+
+    is_local = local_network(local).is_local
+    buffer = TimelineBuffer(Timeline(levels, histogram_resolution))
+    for pkt in read_packets(pcap_file):
+        if pkt.timestamp is None:
+            continue
+        direction = 0 if pkt.ip_version is None else (1 if is_local(pkt.src_ip) else -1)
+        buffer.append(pkt.timestamp, pkt.length, direction)
+    return buffer.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-interval timelines of a capture.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="count a capture and save its timeline")
+    build.add_argument("capture")
+    build.add_argument("-o", "--output", help="file to write (default: CAPTURE.timeline.npz)")
+    build.add_argument("--local-ip", nargs="+", metavar="PREFIX",
+                       help="local addresses or CIDR prefixes, for the direction counts "
+                            "(default: LOCAL_PREFIXES of local_network.py)")
+    build.add_argument("--levels", type=float, nargs="+", default=list(LEVELS),
+                       help="resolutions in seconds, each a multiple of the previous (default: %(default)s)")
+    build.add_argument("--histogram-resolution", type=float, default=HISTOGRAM_RESOLUTION)
+    build.add_argument("--keep", type=float, nargs="+", help="resolutions to save (default: all)")
+    show = commands.add_parser("show", help="print a saved timeline as CSV")
+    show.add_argument("timeline")
+    show.add_argument("--resolution", type=float, default=1.0)
+    show.add_argument("--start", type=float, help="epoch seconds")
+    show.add_argument("--end", type=float, help="epoch seconds")
+    show.add_argument("--histogram", action="store_true", help="print the inter-arrival histogram instead")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        local = args.local_ip or LOCAL_PREFIXES
+        timeline = capture_timeline(args.capture, local, args.levels, args.histogram_resolution)
+        output = args.output or args.capture + ".timeline.npz"
+        timeline.save(output, args.keep)
+        print(f"Saved the timeline of {args.capture} to {output}", file=sys.stderr)
+        if timeline.outliers:
+            print(f"Skipped {timeline.outliers} packets with timestamps far from the rest", file=sys.stderr)
+        return
+
+    timeline = Timeline.load(args.timeline)
+    if args.histogram:
+        counts = timeline.iat_histogram(None, args.start, args.end)
+        pd.Series(counts, index=pd.Index(iat_labels(), name="inter_arrival_s"), name="count").to_csv(sys.stdout)
+    else:
+        timeline.series(args.resolution, args.start, args.end).to_csv(sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import argparse
+import csv
+import sys
+import time
 import warnings
 
 import pandas as pd
@@ -7,33 +11,44 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import accuracy_score
-from imblearn.over_sampling import SMOTE
+import joblib
 
-from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
-from xgboost import XGBClassifier
-from sklearn.ensemble import RandomForestClassifier
+import instrumentation
+from csv_loader import iter_csv, load_csv
+from data_paths import DATASET
+from flow_records import is_flow_records, load_flow_records
+from flow_table import FEATURE_COLUMNS
 
 warnings.filterwarnings("ignore", category=UserWarning, module="xgboost")
+
+
+@instrumentation.timed("read")
 def load_dataset(csv_path):
-    df = pd.read_csv(csv_path)
-    df.columns = df.columns.str.strip()
-    return df
+    # A binary dataset (flow_records.py) is memory-mapped without parsing
+    if is_flow_records(csv_path):
+        return load_flow_records(csv_path).to_frame()
+    # Only the target and feature columns are parsed; repeated runs read the Parquet cache
+    return load_csv(csv_path, usecols=['TYPE'] + FEATURE_COLUMNS, dtype={'TYPE': 'category'})
+
+
+def feature_matrix(df, feature_cols=FEATURE_COLUMNS):
+    """Return the feature columns of a DataFrame as numbers, missing values filled with 0."""
+    features = df[feature_cols]
+    if all(pd.api.types.is_numeric_dtype(t) for t in features.dtypes):
+        # Already numbers (binary datasets, clean CSVs): no conversion or copy unless values are missing
+        return features.fillna(0) if features.isna().to_numpy().any() else features
+    return features.apply(pd.to_numeric, errors='coerce').fillna(0)
 
 
-def prepare_data_for_classification(df):
+@instrumentation.timed("prepare")
+def prepare_data_for_classification(df, return_scaler=False, feature_cols=FEATURE_COLUMNS):
     target_col = 'TYPE'
-    feature_cols = [
-        'BYTES', 'BYTES_REV', 'INTERVALS_MEAN',
-        'INTERVALS_MAX', 'INTERVALS_STD', 'INTERVALS_25', 'INTERVALS_50', 'INTERVALS_75'
-    ]
 
     missing_features = [col for col in feature_cols if col not in df.columns]
     if missing_features:
         print(f"Error: Missing columns: {missing_features}")
         exit(1)
 
-    X = df[feature_cols].copy()
     y = df[target_col].copy()
 
     # Label encoding for target and storing inverse mapping
@@ -43,14 +58,18 @@ def prepare_data_for_classification(df):
     label_mapping_inv = {v: k for k, v in label_mapping.items()}
 
     # Convert all features to numeric and fill missing values
-    X = X.apply(pd.to_numeric, errors='coerce').fillna(0)
+    X = feature_matrix(df, feature_cols)
 
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
 
+    from imblearn.over_sampling import SMOTE
+
     smote = SMOTE(random_state=42)
     X_resampled, y_resampled = smote.fit_resample(X_scaled, y_encoded)
 
+    if return_scaler:
+        return X_resampled, y_resampled, label_mapping_inv, scaler
     return X_resampled, y_resampled, label_mapping_inv
 
 
@@ -58,9 +77,16 @@ def train_and_evaluate_model(clf, X, y, label_mapping_inv):
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.8, random_state=42, stratify=y
     )
-    clf.fit(X_train, y_train)
-    y_pred = clf.predict(X_test)
+    with instrumentation.stage("train"):
+        clf.fit(X_train, y_train)
+    with instrumentation.stage("predict"):
+        y_pred = clf.predict(X_test)
+    instrumentation.count("rows_trained", len(X_train))
+    instrumentation.count("rows_predicted", len(X_test))
+    return per_class_accuracy(y_test, y_pred, label_mapping_inv)
+
 
+def per_class_accuracy(y_test, y_pred, label_mapping_inv):
     accuracies = {}
     for label in np.unique(y_test):
         mask = (y_test == label)
@@ -71,14 +97,36 @@ def train_and_evaluate_model(clf, X, y, label_mapping_inv):
     return accuracies, overall_accuracy
 
 
-def main():
-    csv_path = "data/traffic_dataset.csv"
-    df = load_dataset(csv_path)
-    X, y, label_mapping_inv = prepare_data_for_classification(df)
+# The models of the original report; the approximate SVMs are opt-in
+DEFAULT_MODELS = ["Logistic Regression", "Support Vector Machine", "XGBoost Classifier", "Random Forest"]
+MODEL_NAMES = DEFAULT_MODELS + ["Nystroem Linear SVM", "SGD Linear SVM"]
+
+# Batches up to this size may be scored with the flattened ensemble of tree
+# models (tree_ensemble.py); larger ones are faster in sklearn/xgboost's
+# compiled code. The cutoff of each model is measured when it is flattened
+# and stored in the artifact as 'flat_max_rows'.
+FLAT_MAX_ROWS = 32
+
+
+def build_classifiers(svc_probability=True):
+    # probability=True makes SVC fit an internal 5-fold calibration, which is
+    # only needed when class probabilities are used.
+    # Kernel SVC training is quadratic to cubic in the number of flows; the two
+    # approximate SVMs scale linearly: an RBF kernel approximated with Nystroem
+    # features feeding a hinge-loss (linear SVM) model trained by SGD, and the
+    # same linear SVM on the raw features.
+    # The model libraries are imported here so that loading this module (e.g.
+    # to predict with a saved model) does not pay for xgboost and friends.
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.kernel_approximation import Nystroem
+    from sklearn.linear_model import LogisticRegression, SGDClassifier
+    from sklearn.pipeline import make_pipeline
+    from sklearn.svm import SVC
+    from xgboost import XGBClassifier
 
-    classifiers = {
+    return {
         "Logistic Regression": LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42),
-        "Support Vector Machine": SVC(class_weight='balanced', probability=True, random_state=42),
+        "Support Vector Machine": SVC(class_weight='balanced', probability=svc_probability, random_state=42),
         "XGBoost Classifier": XGBClassifier(use_label_encoder=False, eval_metric='mlogloss', random_state=42),
         "Random Forest": RandomForestClassifier(
             n_estimators=200,
@@ -86,10 +134,189 @@ def main():
             max_depth=None,
             n_jobs=-1,
             class_weight='balanced'
-        )
+        ),
+        "Nystroem Linear SVM": make_pipeline(
+            Nystroem(kernel='rbf', n_components=300, random_state=42),
+            SGDClassifier(loss='hinge', alpha=1e-4, class_weight='balanced', random_state=42)
+        ),
+        "SGD Linear SVM": SGDClassifier(
+            loss='hinge', alpha=1e-4, class_weight='balanced', max_iter=50, tol=1e-4,
+            early_stopping=False, random_state=42
+        ),
     }
 
-    for clf_name, clf in classifiers.items():
+
+class BoosterClassifier:
+    """predict() -> class index for a raw XGBoost Booster (e.g. one trained by incremental_training.py)."""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict_proba(self, X):
+        import xgboost as xgb
+        return self.booster.predict(xgb.DMatrix(np.asarray(X)))
+
+    def predict(self, X):
+        return self.predict_proba(X).argmax(axis=1)
+
+
+def train_model(df, model_name="Random Forest"):
+    """Fit the scaler and one model on the whole dataset and return the artifact to save."""
+    X, y, label_mapping_inv, scaler = prepare_data_for_classification(df, return_scaler=True)
+    clf = build_classifiers()[model_name]
+    with instrumentation.stage("train"):
+        clf.fit(X, y)
+    instrumentation.count("rows_trained", len(X))
+    artifact = {
+        "model_name": model_name,
+        "model": clf,
+        "scaler": scaler,
+        "label_mapping_inv": label_mapping_inv,
+        "feature_columns": list(FEATURE_COLUMNS),
+    }
+    return attach_flat_model(artifact, X)
+
+
+def attach_flat_model(artifact, X=None):
+    """Add the flattened tree ensemble (tree_ensemble.py) of a random forest or XGBoost model to an artifact.
+
+    'flat_max_rows' is the largest batch for which the flattened ensemble was
+    faster than the model itself, timed on scaled rows of X (random rows if
+    X is None).
+    """
+    import tree_ensemble
+
+    model = artifact["model"]
+    if tree_ensemble.exportable(model):
+        flat = tree_ensemble.export(model)
+        if X is None:
+            X = np.random.default_rng(42).standard_normal((FLAT_MAX_ROWS, flat.n_features))
+        artifact["flat_model"] = flat
+        artifact["flat_max_rows"] = tree_ensemble.flat_max_rows(model, flat, X[:FLAT_MAX_ROWS], FLAT_MAX_ROWS)
+    return artifact
+
+
+def flat_max_rows(artifact):
+    """Largest batch scored with the flattened ensemble of an artifact (0 without one)."""
+    if "flat_model" not in artifact:
+        return 0
+    return artifact.get("flat_max_rows", FLAT_MAX_ROWS)
+
+
+def save_model(artifact, path):
+    joblib.dump(artifact, path)
+
+
+def load_model(path):
+    artifact = joblib.load(path)
+    if artifact.get("feature_columns") != list(FEATURE_COLUMNS):
+        raise ValueError(f"{path} was trained on different feature columns: {artifact.get('feature_columns')}")
+    return artifact
+
+
+@instrumentation.timed("predict")
+def predict(artifact, df):
+    """Return the predicted service name of every row (flow record) of a DataFrame."""
+    X_scaled = artifact["scaler"].transform(feature_matrix(df))
+    model = artifact["model"]
+    if len(df) <= flat_max_rows(artifact):
+        model = artifact["flat_model"]
+    y_pred = model.predict(X_scaled)
+    labels = artifact["label_mapping_inv"]
+    instrumentation.count("rows_predicted", len(df))
+    return np.array([labels[int(v)] for v in y_pred], dtype=object)
+
+
+def record_features(record):
+    """Feature vector of one flow record dict, converted like feature_matrix (invalid or missing values are 0)."""
+    values = np.zeros(len(FEATURE_COLUMNS))
+    for i, column in enumerate(FEATURE_COLUMNS):
+        try:
+            value = float(record[column])
+        except (TypeError, ValueError):
+            continue
+        if value == value:
+            values[i] = value
+    return values
+
+
+def predict_record(artifact, record):
+    """Predicted service name of one flow record dict.
+
+    Models with a flattened ensemble skip the DataFrame, the sklearn input
+    checks and the library call, which is most of the time spent on one flow.
+    """
+    if not flat_max_rows(artifact):
+        return predict(artifact, pd.DataFrame([record]))[0]
+    flat = artifact["flat_model"]
+    scaler = artifact["scaler"]
+    x = (record_features(record) - scaler.mean_) / scaler.scale_
+    instrumentation.count("rows_predicted")
+    return artifact["label_mapping_inv"][flat.predict_one(x)]
+
+
+def predict_csv(artifact, csv_path, chunk_size=100_000):
+    """Score a CSV of flow records in chunks, yielding (chunk, predictions) pairs."""
+    for chunk in iter_csv(csv_path, chunksize=chunk_size, use_cache=False):
+        yield chunk, predict(artifact, chunk)
+
+
+def predict_stream(artifact, records, batch_size=256):
+    """Classify an iterable of flow record dicts (e.g. flow_table.iter_flows) as they arrive.
+
+    Records are scored in small batches to amortize the per-call overhead,
+    or one by one as they complete when the model's flattened ensemble is
+    faster for single rows;
+    yields (record, predicted label) pairs in input order.
+    """
+    if flat_max_rows(artifact):
+        for record in records:
+            yield record, predict_record(artifact, record)
+        return
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield from zip(batch, predict(artifact, pd.DataFrame(batch)))
+            batch = []
+    if batch:
+        yield from zip(batch, predict(artifact, pd.DataFrame(batch)))
+
+
+def write_predictions(artifact, out, input_csv=None, capture=None, chunk_size=100_000):
+    """Classify a CSV of flow records or the flows of a capture and write them with a PREDICTED_TYPE column.
+
+    Returns the number of rows written to the file object 'out'.
+    """
+    rows = 0
+    if input_csv:
+        header = True
+        for chunk, labels in predict_csv(artifact, input_csv, chunk_size):
+            chunk = chunk.assign(PREDICTED_TYPE=labels)
+            chunk.to_csv(out, index=False, header=header)
+            header = False
+            rows += len(chunk)
+    else:
+        from flow_table import FLOW_ID_COLUMNS, TCP_COLUMNS, iter_flows
+        from pcap_reader import read_packets
+
+        writer = csv.DictWriter(out, fieldnames=FLOW_ID_COLUMNS + TCP_COLUMNS + FEATURE_COLUMNS + ['PREDICTED_TYPE'])
+        writer.writeheader()
+        for record, label in predict_stream(artifact, iter_flows(read_packets(capture))):
+            writer.writerow(dict(record, PREDICTED_TYPE=label))
+            rows += 1
+    return rows
+
+
+def evaluate_all(csv_path, models=None):
+    """Train and evaluate the classifiers on the dataset (the original report)."""
+    df = load_dataset(csv_path)
+    X, y, label_mapping_inv = prepare_data_for_classification(df)
+
+    classifiers = build_classifiers()
+
+    for clf_name in models or DEFAULT_MODELS:
+        clf = classifiers[clf_name]
         print(f"\n--- {clf_name} ---")
         per_class_acc, overall_acc = train_and_evaluate_model(clf, X, y, label_mapping_inv)
         print("Per-Class Accuracy:")
@@ -98,5 +325,55 @@ def main():
         print(f"Overall Model Accuracy: {overall_acc:.4f}")
 
 
+def run(args):
+    """Run the evaluate (the default), train or predict action of the parsed arguments (main, cli.py classify)."""
+    if args.action in (None, "evaluate"):
+        evaluate_all(getattr(args, "data", DATASET), getattr(args, "models", None))
+        return
+
+    if args.action == "train":
+        artifact = train_model(load_dataset(args.data), args.model)
+        save_model(artifact, args.output)
+        print(f"Saved {args.model} to {args.output}")
+        return
+
+    artifact = load_model(args.model)
+    out = open(args.output, "w", newline="") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        rows = write_predictions(artifact, out, args.input, args.capture, args.chunk_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"Classified {rows} flows in {elapsed:.2f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traffic classification on flow features.")
+    subparsers = parser.add_subparsers(dest="action")
+
+    evaluate_parser = subparsers.add_parser("evaluate", help="train and evaluate every model (default)")
+    evaluate_parser.add_argument("--data", default=DATASET)
+    evaluate_parser.add_argument("--models", nargs="+", choices=MODEL_NAMES,
+                                 help="models to evaluate (default: %s)" % ", ".join(DEFAULT_MODELS))
+
+    train_parser = subparsers.add_parser("train", help="fit one model and save it")
+    train_parser.add_argument("--data", default=DATASET)
+    train_parser.add_argument("--model", default="Random Forest", choices=MODEL_NAMES)
+    train_parser.add_argument("--output", default="traffic_model.joblib")
+
+    predict_parser = subparsers.add_parser("predict", help="classify flow records with a saved model")
+    predict_parser.add_argument("--model", default="traffic_model.joblib", help="file written by 'train'")
+    source = predict_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="CSV of flow records with the feature columns")
+    source.add_argument("--capture", help=".pcap/.pcapng file to turn into flows and classify")
+    predict_parser.add_argument("--output", help="CSV to write the predictions to (default: stdout)")
+    predict_parser.add_argument("--chunk-size", type=int, default=100_000)
+
+    run(parser.parse_args())
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,344 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+# Flattened tree ensembles for low-latency scoring.
+# A trained RandomForestClassifier or XGBoost model is exported into one set
+# of node arrays shared by all its trees (split feature, threshold, the two
+# children, default direction for missing values, leaf values), with the root
+# of each tree in 'roots'. A batch is scored by walking every (row, tree) pair
+# down one level per NumPy step and dropping the pairs that reached a leaf; a
+# single record walks all trees 'depth' steps (leaves point to themselves).
+# Either way there is no input validation, DataFrame or thread pool per call,
+# which dominates sklearn/xgboost latency for one flow or a few flows. Large
+# batches are still faster in the libraries' compiled code.
+# Both libraries compare float32 features: sklearn sends a row left when
+# x <= threshold (float64), XGBoost when x < split (float32). Thresholds are
+# stored as the largest float32 that gives the same decisions with '<=', so
+# the predictions are the same as the original model's.
+
+LEAF = -1
+BLOCK_PAIRS = 1 << 20   # (row, tree) pairs scored at once, bounds the temporary arrays
+
+
+class FlatEnsemble:
+    """Node arrays of a tree ensemble and how leaf values become class probabilities.
+
+    'children[node]' is (right, left); 'output' is 'average' (random forest:
+    mean of the per-tree class probabilities), 'softmax' (multi-class boosting:
+    sum of the leaf values of each class plus 'base') or 'sigmoid' (binary
+    boosting).
+    """
+
+    def __init__(self, feature, threshold, children, default_left, value, roots, depth, output, base, n_features):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = threshold
+        self.children = np.asarray(children, dtype=np.intp)
+        self.default_left = default_left
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.output = output
+        self.base = base
+        self.n_features = n_features
+        self.internal = self.children[:, 0] != np.arange(len(self.children))
+        self.value = value
+
+    def __repr__(self):
+        return "FlatEnsemble(%d trees, %d nodes, depth %d, %s)" % (
+            len(self.roots), len(self.feature), self.depth, self.output)
+
+    def __getstate__(self):
+        # Saved with 32-bit indices and the values of the leaves only
+        state = dict(self.__dict__)
+        del state["internal"]
+        for name in ("feature", "children", "roots"):
+            state[name] = state[name].astype(np.int32)
+        state["value"] = self.value[~self.internal]
+        return state
+
+    def __setstate__(self, state):
+        leaf_values = state.pop("value")
+        self.__init__(value=None, **state)
+        self.value = np.zeros((len(self.feature), leaf_values.shape[1]))
+        self.value[~self.internal] = leaf_values
+
+    def _go_left(self, x, nodes, missing):
+        """1 where the rows with values 'x' at 'nodes' go to the left child, else 0."""
+        go_left = x <= self.threshold[nodes]
+        if missing:
+            go_left = np.where(np.isnan(x), self.default_left[nodes], go_left)
+        return go_left.view(np.uint8)
+
+    def leaves(self, X):
+        """Leaf node reached in every tree by every row: an array of shape (rows, trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        n, trees = len(X), len(self.roots)
+        rows_per_block = max(1, BLOCK_PAIRS // trees)
+        result = np.empty((n, trees), dtype=np.intp)
+        for start in range(0, n, rows_per_block):
+            block = X[start:start + rows_per_block]
+            result[start:start + len(block)] = self._walk(block)
+        return result
+
+    def _walk(self, X):
+        # Pairs are ordered tree by tree, so consecutive pairs read nodes of the same tree
+        n = len(X)
+        flat_x = X.ravel()
+        offsets = np.tile(np.arange(n) * self.n_features, len(self.roots))
+        node = np.repeat(self.roots, n)
+        missing = np.isnan(flat_x).any()
+        active = np.flatnonzero(self.internal[node])
+        while active.size:
+            current = node[active]
+            x = flat_x[offsets[active] + self.feature[current]]
+            following = self.children[current, self._go_left(x, current, missing)]
+            node[active] = following
+            active = active[self.internal[following]]
+        return node.reshape(len(self.roots), n).T
+
+    def _scores(self, leaves):
+        """Class probabilities from the leaves reached, shape (rows, classes)."""
+        totals = self.value[leaves].sum(axis=1)
+        if self.output == "average":
+            return totals / len(self.roots)
+        margins = totals + self.base
+        if self.output == "sigmoid":
+            positive = 1 / (1 + np.exp(-margins[:, 0]))
+            return np.column_stack([1 - positive, positive])
+        margins -= margins.max(axis=1, keepdims=True)
+        exp = np.exp(margins)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, X):
+        return self._scores(self.leaves(X))
+
+    def predict(self, X):
+        """Class index of every row (the classes are 0..k-1, as in traffic_classifier)."""
+        return self.predict_proba(X).argmax(axis=1)
+
+    def predict_one(self, x):
+        """Class index of one feature vector: 'depth' steps over all the trees at once."""
+        x = np.asarray(x, dtype=np.float32)
+        missing = np.isnan(x).any()
+        node = self.roots
+        for _ in range(self.depth):
+            node = self.children[node, self._go_left(x[self.feature[node]], node, missing)]
+        return int(self._scores(node[None, :])[0].argmax())
+
+
+def _float32_at_most(threshold):
+    """Largest float32 t with (x <= t) == (x <= threshold) for every float32 x."""
+    rounded = np.asarray(threshold).astype(np.float32)
+    return np.where(rounded > threshold, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+def _depth(left, right):
+    """Number of levels below the root of one tree."""
+    depth, level = 0, np.array([0])
+    while True:
+        level = level[left[level] != LEAF]
+        if not level.size:
+            return depth
+        level = np.concatenate([left[level], right[level]])
+        depth += 1
+
+
+def _concatenate(trees, output, base, n_features, n_outputs):
+    """Build a FlatEnsemble from per-tree (feature, threshold, left, right, default_left, value) arrays."""
+    offsets = np.cumsum([0] + [len(t[0]) for t in trees[:-1]])
+    children = []
+    for (_, _, left, right, _, _), offset in zip(trees, offsets):
+        own = np.arange(len(left)) + offset
+        is_leaf = left == LEAF
+        children.append(np.column_stack([np.where(is_leaf, own, right + offset),
+                                         np.where(is_leaf, own, left + offset)]))
+    return FlatEnsemble(
+        feature=np.concatenate([np.maximum(t[0], 0) for t in trees]),
+        threshold=np.concatenate([t[1] for t in trees]).astype(np.float32),
+        children=np.concatenate(children),
+        default_left=np.concatenate([t[4] for t in trees]).astype(bool),
+        value=np.concatenate([t[5] for t in trees]).reshape(-1, n_outputs).astype(np.float64),
+        roots=offsets,
+        depth=max(_depth(t[2], t[3]) for t in trees),
+        output=output,
+        base=np.asarray(base, dtype=np.float64),
+        n_features=n_features,
+    )
+
+
+def export_random_forest(forest):
+    """Flatten a fitted sklearn RandomForestClassifier (or ExtraTreesClassifier)."""
+    if getattr(forest, "n_outputs_", 1) != 1:
+        raise ValueError("multi-output forests are not supported")
+    trees = []
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        value = tree.value[:, 0, :forest.n_classes_]
+        normalizer = value.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0] = 1
+        trees.append((tree.feature, _float32_at_most(tree.threshold), tree.children_left, tree.children_right,
+                      tree.missing_go_to_left, value / normalizer))
+    return _concatenate(trees, "average", np.zeros(forest.n_classes_), forest.n_features_in_, forest.n_classes_)
+
+
+def _booster_json(model):
+    booster = model.get_booster() if hasattr(model, "get_booster") else getattr(model, "booster", model)
+    return json.loads(booster.save_raw("json"))
+
+
+def export_xgboost(model):
+    """Flatten an XGBoost model (XGBClassifier, a raw Booster or a BoosterClassifier) with a logistic or softmax objective."""
+    learner = _booster_json(model)["learner"]
+    objective = learner["objective"]["name"]
+    params = learner["learner_model_param"]
+    booster = learner["gradient_booster"]
+    if booster["name"] != "gbtree":
+        raise ValueError(f"unsupported XGBoost booster {booster['name']!r}")
+    base = np.atleast_1d(np.array(json.loads(params["base_score"]), dtype=np.float32)).astype(np.float64)
+    if objective == "binary:logistic":
+        output, n_outputs = "sigmoid", 1
+        base = np.log(base / (1 - base))    # base_score is a probability for this objective
+    elif objective in ("multi:softprob", "multi:softmax"):
+        output, n_outputs = "softmax", int(params["num_class"])
+    else:
+        raise ValueError(f"unsupported XGBoost objective {objective!r}")
+
+    model_trees = booster["model"]["trees"]
+    tree_info = booster["model"]["tree_info"]
+    trees = []
+    for tree, group in zip(model_trees, tree_info):
+        if any(tree["split_type"]):
+            raise ValueError("categorical splits are not supported")
+        left = np.array(tree["left_children"], dtype=np.int64)
+        conditions = np.array(tree["split_conditions"], dtype=np.float32)
+        is_leaf = left == LEAF
+        value = np.zeros((len(left), n_outputs))
+        value[is_leaf, group] = conditions[is_leaf]
+        # x < split  <=>  x <= the largest float32 below split
+        threshold = np.where(is_leaf, 0, np.nextafter(conditions, np.float32(-np.inf)))
+        trees.append((np.array(tree["split_indices"]), threshold, left, np.array(tree["right_children"]),
+                      np.array(tree["default_left"]), value))
+    return _concatenate(trees, output, base, int(params["num_feature"]), n_outputs)
+
+
+def export(model):
+    """FlatEnsemble of a fitted random forest or XGBoost model."""
+    if hasattr(model, "estimators_") and hasattr(model, "n_classes_"):
+        return export_random_forest(model)
+    return export_xgboost(model)
+
+
+def exportable(model):
+    """True if 'model' can be exported (a random forest or an XGBoost model)."""
+    name = type(model).__name__
+    return name in ("RandomForestClassifier", "ExtraTreesClassifier", "XGBClassifier", "Booster", "BoosterClassifier")
+
+
+def verify(model, flat, X):
+    """Compare the flattened model with the original on X: (predictions that differ, largest probability difference)."""
+    expected = np.asarray(model.predict(X))
+    mismatches = int((flat.predict(X) != expected).sum())
+    difference = float(np.abs(flat.predict_proba(X) - model.predict_proba(X)).max()) if len(X) else 0.0
+    return mismatches, difference
+
+
+def _latencies_us(predict, rows):
+    latencies = []
+    for row in rows:
+        start = time.perf_counter()
+        predict(row)
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1e6, np.percentile(latencies, 99) * 1e6
+
+
+def benchmark(model, flat, X, samples=200, batch_sizes=(1, 16, 256, 4096)):
+    """Single-record latency (p50/p99 µs) and batch throughput (rows/s) of the original and flattened model."""
+    rows = X[:samples]
+    report = {
+        "single_record_us": {
+            "original": _latencies_us(lambda row: model.predict(row.reshape(1, -1)), rows),
+            "flat": _latencies_us(flat.predict_one, rows),
+        },
+        "batch_rows_s": {},
+    }
+    for size in batch_sizes:
+        batch = X[:size]
+        if len(batch) < size:
+            break
+        rates = []
+        for predict in (model.predict, flat.predict):
+            start = time.perf_counter()
+            predict(batch)
+            rates.append(size / (time.perf_counter() - start))
+        report["batch_rows_s"][size] = tuple(rates)
+    return report
+
+
+def flat_max_rows(model, flat, X, max_rows, repeats=3):
+    """Largest batch size (1, 2, 4, ... max_rows) up to which the flattened model predicted faster
+    than the original on rows of X (best of 'repeats' runs), 0 if it was slower even for one row."""
+    X = np.asarray(X)
+    for predict in (model.predict, flat.predict):
+        predict(X[:1])      # warm up (thread pools, lazy initialization)
+    fastest = 0
+    size = 1
+    while size <= max_rows:
+        batch = X[np.arange(size) % len(X)]
+        times = []
+        for predict in (model.predict, flat.predict):
+            best = float("inf")
+            for _ in range(repeats):
+                start = time.perf_counter()
+                predict(batch)
+                best = min(best, time.perf_counter() - start)
+            times.append(best)
+        if times[1] >= times[0]:
+            break
+        fastest = size
+        size *= 2
+    return fastest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the tree ensemble of a saved model to flat arrays, verify and benchmark it.")
+    parser.add_argument("model", help="file written by 'traffic_classifier.py train'")
+    parser.add_argument("--output", help="save the model with the flattened ensemble here (default: overwrite 'model')")
+    parser.add_argument("--data", help="flow CSV or '.flows' dataset to verify and benchmark on")
+    parser.add_argument("--rows", type=int, default=10_000, help="rows of --data used (default: %(default)s)")
+    args = parser.parse_args()
+
+    import traffic_classifier as tc
+
+    artifact = tc.load_model(args.model)
+    if not exportable(artifact["model"]):
+        parser.error(f"{artifact['model_name']} is not a tree ensemble")
+    X = None
+    if args.data:
+        df = tc.load_dataset(args.data)[:args.rows]
+        X = artifact["scaler"].transform(tc.feature_matrix(df))
+    start = time.perf_counter()
+    flat = tc.attach_flat_model(artifact, X)["flat_model"]
+    print(f"Exported {flat} in {time.perf_counter() - start:.2f}s; "
+          f"used for batches of up to {artifact['flat_max_rows']} rows")
+
+    if args.data:
+        mismatches, difference = verify(artifact["model"], flat, X)
+        print(f"{len(X)} rows: {mismatches} different predictions, largest probability difference {difference:.2e}")
+        if mismatches:
+            raise SystemExit("the flattened model does not match the original; not saved")
+        report = benchmark(artifact["model"], flat, X)
+        print(f"{'single record':<16}{'p50 (µs)':>12}{'p99 (µs)':>12}")
+        for name, (p50, p99) in report["single_record_us"].items():
+            print(f"  {name:<14}{p50:>12,.1f}{p99:>12,.1f}")
+        print(f"{'batch':<16}{'original rows/s':>16}{'flat rows/s':>16}")
+        for size, (original, flat_rate) in report["batch_rows_s"].items():
+            print(f"  {size:<14}{original:>16,.0f}{flat_rate:>16,.0f}")
+
+    tc.save_model(artifact, args.output or args.model)
+    print(f"Saved to {args.output or args.model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The modules in src/ import each other by file name, as when they are run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+CAPTURE_PACKETS = 20_000
+
+
+@pytest.fixture(scope="session")
+def capture(tmp_path_factory):
+    """A synthetic Ethernet .pcapng capture (see synthetic_data.write_pcapng)."""
+    from synthetic_data import write_pcapng
+
+    path = str(tmp_path_factory.mktemp("captures") / "synthetic.pcapng")
+    write_pcapng(path, CAPTURE_PACKETS, seed=1)
+    return path
@@ -0,0 +1,65 @@
+import shutil
+
+import pytest
+
+import analyze_traffic_1
+from analyze_traffic_1 import app_metrics, collect_app_data
+from local_network import LOCAL_PREFIXES
+
+
+@pytest.fixture(scope="module")
+def apps(capture, tmp_path_factory):
+    """Two applications with their own copy of the capture (each gets its own sidecar index)."""
+    directory = tmp_path_factory.mktemp("apps")
+    paths = {}
+    for app in ("chrome", "zoom"):
+        paths[app] = str(directory / f"{app}.pcapng")
+        shutil.copy(capture, paths[app])
+    return paths
+
+
+@pytest.fixture(scope="module")
+def serial(apps):
+    return app_metrics(collect_app_data(apps, backend="native", timeline=True))
+
+
+def test_serial_metrics(serial):
+    metrics = serial["chrome"]
+    assert metrics == serial["zoom"]
+    assert metrics["total_packets"] == metrics["incoming"] + metrics["outgoing"]
+    assert sum(metrics["protocol_counts"].values()) == metrics["total_packets"]
+    assert metrics["outliers"] == 0
+
+
+def test_index_matches_reading_the_capture(apps, serial):
+    first = app_metrics(collect_app_data(apps, backend="native", use_index=True, timeline=True))
+    again = app_metrics(collect_app_data(apps, backend="native", use_index=True, timeline=True))
+    assert first == serial
+    assert again == serial
+
+
+def test_split_capture_matches_serial(apps, serial, monkeypatch):
+    # Small captures are only split when they are larger than SPLIT_BYTES
+    monkeypatch.setattr(analyze_traffic_1, "SPLIT_BYTES", 64 * 1024)
+    tasks = analyze_traffic_1._capture_tasks(apps, "native", 3, False, LOCAL_PREFIXES)
+    assert len(tasks) == 6
+    split = app_metrics(collect_app_data(apps, backend="native", workers=3, timeline=True))
+    for app in apps:
+        for key, value in serial[app].items():
+            if key == "inter_arrival_histogram":
+                # The gap between the last packet of one range and the first of the next is not seen
+                assert sum(value.values()) - sum(split[app][key].values()) == 2
+            elif isinstance(value, float):
+                assert split[app][key] == pytest.approx(value, rel=1e-9), key
+            else:
+                assert split[app][key] == value, key
+
+
+def test_streaming_matches_exact(apps, serial):
+    streaming = app_metrics(collect_app_data(apps, backend="native", streaming=True, timeline=True))
+    for app in apps:
+        for key, value in serial[app].items():
+            if isinstance(value, float):
+                assert streaming[app][key] == pytest.approx(value, rel=1e-9), key
+            else:
+                assert streaming[app][key] == value, key
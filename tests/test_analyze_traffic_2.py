@@ -0,0 +1,46 @@
+import functools
+from collections import Counter
+
+import pytest
+
+import analyze_traffic_2
+from analyze_traffic_2 import _count_chunk, analyze_csv, collect_results, csv_metrics
+from csv_loader import CAPTURE_CSV_SCHEMA, iter_csv, load_csv
+from synthetic_data import write_capture_csv
+
+
+@pytest.fixture(scope="module")
+def export(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("csv") / "service.csv")
+    write_capture_csv(path, 20_000, seed=2)
+    return path
+
+
+def _exact_endpoints(df):
+    ports = df["Info"].str.extract(r"> (\d+)", expand=False)
+    rows = ports.notna()
+    return Counter("%s:%s" % pair for pair in zip(df.loc[rows, "Destination"], ports[rows]))
+
+
+def test_counts_match_the_export(export):
+    df = load_csv(export, dtype=CAPTURE_CSV_SCHEMA, use_cache=False)
+    result = analyze_csv(export)
+    assert result["push_count"] == int((df["Protocol"] == "TCP").mul(df["Info"].str.contains("PSH")).sum())
+    assert result["tls_version_counts"] == Counter(p for p in df["Protocol"] if p.startswith("TLS"))
+    assert result["endpoints"].top() == dict(_exact_endpoints(df))
+    assert result["destination_ips"].top() == Counter(df["Destination"])
+
+
+def test_endpoints_of_a_column_with_many_categories(export):
+    df = load_csv(export, dtype=CAPTURE_CSV_SCHEMA, use_cache=False)
+    # Categories of addresses that are not in this chunk (e.g. the categories of a whole export)
+    unused = ["172.16.%d.%d" % (i // 250, i % 250) for i in range(50_000)]
+    df["Destination"] = df["Destination"].cat.add_categories(unused)
+    endpoints = _count_chunk(df)["endpoints"]
+    assert endpoints.top() == dict(_exact_endpoints(df))
+
+
+def test_chunked_export_matches_whole(export, monkeypatch):
+    whole = csv_metrics(collect_results({"service": export}))
+    monkeypatch.setattr(analyze_traffic_2, "iter_csv", functools.partial(iter_csv, chunksize=3_000, use_cache=False))
+    assert csv_metrics(collect_results({"service": export})) == whole
@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from csv_loader import iter_csv, load_csv
+
+
+def _write(tmp_path, df):
+    path = os.path.join(tmp_path, "flows.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def _cache_files(path):
+    cache_dir = os.path.join(os.path.dirname(path), ".cache")
+    return sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []
+
+
+def test_integer_column_with_late_decimal_and_missing_value(tmp_path):
+    # The first chunk of each column is read as int64, a later one as float64
+    df = pd.DataFrame({
+        "TYPE": list("abcdefghijkl"),
+        "BYTES": [str(v) for v in range(1, 13)],
+        "INTERVALS_MEAN": ["1", "2", "3", "4", "5", "6", "7", "1.5", "9", "10", "11", "12"],
+        "INTERVALS_MAX": ["1", "2", "3", "4", "5", "6", "7", "8", "9", "10", "", "12"],
+    })
+    path = _write(tmp_path, df)
+    expected = pd.read_csv(path)
+    assert [str(chunk["INTERVALS_MEAN"].dtype) for chunk in pd.read_csv(path, chunksize=5)][:2] == ["int64", "float64"]
+
+    parsed = pd.concat(iter_csv(path, chunksize=5), ignore_index=True)
+    assert len(_cache_files(path)) == 1
+    cached = pd.concat(iter_csv(path, chunksize=5), ignore_index=True)
+    for result in (parsed, cached):
+        assert list(result["TYPE"]) == list(expected["TYPE"])
+        for column in ["BYTES", "INTERVALS_MEAN", "INTERVALS_MAX"]:
+            np.testing.assert_array_equal(result[column].to_numpy(float), expected[column].to_numpy(float))
+
+
+def test_text_in_numeric_column_is_read_without_cache(tmp_path):
+    df = pd.DataFrame({"TYPE": list("abcdefgh"), "BYTES": ["1", "2", "3", "4", "5", "x", "7", "8"]})
+    path = _write(tmp_path, df)
+
+    result = pd.concat(iter_csv(path, chunksize=5), ignore_index=True)
+    assert [str(v) for v in result["BYTES"]] == list(df["BYTES"])
+    assert not [name for name in _cache_files(path) if name.endswith(".parquet")]
+    assert [str(v) for v in load_csv(path)["BYTES"]] == list(df["BYTES"])
+
+
+def test_caches_of_other_columns_are_kept(tmp_path):
+    df = pd.DataFrame({"TYPE": list("abc"), "BYTES": [1, 2, 3], "BYTES_REV": [4, 5, 6]})
+    path = _write(tmp_path, df)
+    load_csv(path)
+    load_csv(path, usecols=["TYPE", "BYTES"], dtype={"TYPE": "category"})
+    assert len(_cache_files(path)) == 2
+
+    df.assign(BYTES=[7, 8, 9]).to_csv(path, index=False)
+    os.utime(path, ns=(0, 0))
+    assert list(load_csv(path)["BYTES"]) == [7, 8, 9]
+    assert len(_cache_files(path)) == 2
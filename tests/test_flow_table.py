@@ -0,0 +1,90 @@
+from conftest import CAPTURE_PACKETS
+from flow_table import FIN_GRACE, FlowTable, iter_flows
+from pcap_reader import PacketRecord, iter_packets
+
+SYN, FIN, RST, ACK = 0x02, 0x01, 0x04, 0x10
+
+CLIENT = ("10.0.0.1", 50000)
+SERVER = ("10.0.0.2", 443)
+
+
+def _tcp(ts, flags, forward=True, length=60):
+    (src, sport), (dst, dport) = (CLIENT, SERVER) if forward else (SERVER, CLIENT)
+    return PacketRecord(ts, length, src, dst, 4, 64, "TCP", sport, dport, 100, flags, "TCP")
+
+
+def _connection(start=0.0):
+    """Handshake, one data packet each way and a FIN from each side."""
+    return [
+        _tcp(start, SYN),
+        _tcp(start + 0.1, SYN | ACK, forward=False),
+        _tcp(start + 0.2, ACK),
+        _tcp(start + 0.3, ACK, length=1000),
+        _tcp(start + 0.4, ACK, forward=False, length=1500),
+        _tcp(start + 0.5, FIN | ACK),
+        _tcp(start + 0.6, FIN | ACK, forward=False),
+    ]
+
+
+def _feed(table, packets):
+    finished = []
+    for pkt in packets:
+        finished += table.add(pkt)
+    return finished
+
+
+def test_fin_from_both_sides_closes_after_grace():
+    table = FlowTable()
+    assert _feed(table, _connection()) == []
+    # The last ACK and a retransmitted FIN are absorbed into the closing flow
+    assert _feed(table, [_tcp(0.7, ACK), _tcp(0.8, FIN | ACK, forward=False)]) == []
+    assert not table.flows and len(table.closing) == 1
+
+    [row] = table.expire(0.8 + FIN_GRACE + 0.1)
+    assert row['CLOSE'] == "FIN"
+    assert (row['SRC_IP'], row['SRC_PORT']) == CLIENT
+    assert (row['PACKETS'], row['PACKETS_REV']) == (5, 4)
+    assert (row['BYTES'], row['BYTES_REV']) == (60 * 4 + 1000, 60 * 3 + 1500)
+    assert abs(row['HANDSHAKE_RTT'] - 0.1) < 1e-9
+    assert abs(row['TEARDOWN'] - 0.3) < 1e-9
+    assert row['TCP_FLAGS'] == SYN | FIN | ACK
+
+
+def test_fin_from_one_side_keeps_the_flow_open():
+    table = FlowTable()
+    _feed(table, _connection()[:-1] + [_tcp(0.6, FIN | ACK)])
+    assert len(table.flows) == 1 and not table.closing
+    [row] = table.flush()
+    assert row['CLOSE'] == "END"
+
+
+def test_new_syn_during_grace_starts_a_new_flow():
+    table = FlowTable()
+    _feed(table, _connection())
+    finished = _feed(table, _connection(start=1.0))
+    assert [row['CLOSE'] for row in finished] == ["FIN"]
+    assert finished[0]['PACKETS'] + finished[0]['PACKETS_REV'] == 7
+    [row] = table.flush()
+    assert row['START'] == 1.0 and row['CLOSE'] == "FIN"
+
+
+def test_rst_closes_at_once():
+    table = FlowTable()
+    finished = _feed(table, _connection()[:4] + [_tcp(0.4, RST, forward=False)])
+    assert [row['CLOSE'] for row in finished] == ["RST"]
+    assert not table.flows and not table.closing
+
+
+def test_timeouts():
+    table = FlowTable(idle_timeout=5.0, active_timeout=10.0)
+    # A packet every 4 seconds never idles out, but the flow is cut after 10 seconds
+    finished = _feed(table, [_tcp(float(ts), ACK) for ts in range(0, 16, 4)])
+    assert [(row['CLOSE'], row['PACKETS']) for row in finished] == [("ACTIVE", 3)]
+    finished = table.expire(12.0 + 5.1)
+    assert [(row['CLOSE'], row['START'], row['PACKETS']) for row in finished] == [("IDLE", 12.0, 1)]
+
+
+def test_every_packet_is_in_one_flow(capture):
+    rows = list(iter_flows(iter_packets(capture)))
+    assert sum(row['PACKETS'] + row['PACKETS_REV'] for row in rows) == CAPTURE_PACKETS
+    assert {row['CLOSE'] for row in rows} <= {"FIN", "RST", "IDLE", "ACTIVE", "END"}
@@ -0,0 +1,207 @@
+import socket
+import struct
+
+import pytest
+
+from handshake import (
+    HandshakeParser, initial_keys, ja3, ja4, parse_client_hello, parse_server_hello, quic_decryption_available,
+)
+from pcap_reader import LINKTYPE_ETHERNET, FrameDecoder
+
+CLIENT = ("10.0.0.1", 50000)
+SERVER = ("10.0.0.2", 443)
+
+JA4_CIPHERS = [0x002f, 0x0035, 0x009c, 0x009d, 0x1301, 0x1302, 0x1303, 0xc013,
+               0xc014, 0xc02b, 0xc02c, 0xc02f, 0xc030, 0xcca8, 0xcca9]
+JA4_EXTENSIONS = [0x0005, 0x000a, 0x000b, 0x000d, 0x0012, 0x0015, 0x0017,
+                  0x001b, 0x0023, 0x002b, 0x002d, 0x0033, 0x4469, 0xff01]
+JA4_SIGNATURE_ALGORITHMS = [0x0403, 0x0804, 0x0401, 0x0503, 0x0805, 0x0501, 0x0806, 0x0601]
+
+
+def _u16s(values):
+    return b"".join(struct.pack("!H", v) for v in values)
+
+
+def _vector(data, length_bytes=2):
+    return len(data).to_bytes(length_bytes, "big") + data
+
+
+def _extension(ext_type, data=b""):
+    return struct.pack("!H", ext_type) + _vector(data)
+
+
+def _sni(name):
+    return _extension(0x0000, _vector(b"\x00" + _vector(name.encode())))
+
+
+def _alpn(*protocols):
+    return _extension(0x0010, _vector(b"".join(_vector(p.encode(), 1) for p in protocols)))
+
+
+def _client_hello(version, ciphers, extensions):
+    body = (struct.pack("!H", version) + b"\x11" * 32 + _vector(b"", 1) + _vector(_u16s(ciphers))
+            + _vector(b"\x00", 1) + _vector(b"".join(extensions)))
+    return b"\x01" + len(body).to_bytes(3, "big") + body
+
+
+def _server_hello(cipher, extensions=()):
+    body = struct.pack("!H", 0x0303) + b"\x22" * 32 + _vector(b"", 1) + struct.pack("!HB", cipher, 0)
+    body += _vector(b"".join(extensions))
+    return b"\x02" + len(body).to_bytes(3, "big") + body
+
+
+def _ja4_hello():
+    """The ClientHello of the JA4 specification's example (with GREASE values, which are ignored)."""
+    extensions = [_extension(0x0a0a), _sni("example.com"), _alpn("h2", "http/1.1")]
+    for ext_type in JA4_EXTENSIONS:
+        if ext_type == 0x000d:
+            extensions.append(_extension(ext_type, _vector(_u16s(JA4_SIGNATURE_ALGORITHMS))))
+        elif ext_type == 0x000a:
+            extensions.append(_extension(ext_type, _vector(_u16s([0x001d, 0x0017]))))
+        elif ext_type == 0x000b:
+            extensions.append(_extension(ext_type, _vector(b"\x00", 1)))
+        elif ext_type == 0x002b:
+            extensions.append(_extension(ext_type, _vector(_u16s([0x3a3a, 0x0304, 0x0303]), 1)))
+        else:
+            extensions.append(_extension(ext_type))
+    return _client_hello(0x0303, [0x1a1a] + JA4_CIPHERS[::-1], extensions)
+
+
+def test_ja3_known_answer():
+    hello = _client_hello(769, [0x2a2a, 47, 53, 5, 10, 49161, 49162, 49171, 49172, 50, 56, 19, 4], [
+        _sni("example.com"),
+        _extension(10, _vector(_u16s([0x4a4a, 23, 24, 25]))),
+        _extension(11, _vector(b"\x00", 1)),
+        _extension(0xfafa),
+    ])
+    assert ja3(parse_client_hello(hello[4:])) == (
+        "769,47-53-5-10-49161-49162-49171-49172-50-56-19-4,0-10-11,23-24-25,0",
+        "ada70206e40642a3e4461f35503241d5",
+    )
+
+
+def test_ja4_known_answer():
+    hello = parse_client_hello(_ja4_hello()[4:])
+    assert hello["sni"] == "example.com" and hello["alpn"] == ["h2", "http/1.1"]
+    assert ja4(hello) == "t13d1516h2_8daaf6152771_e5627efa2ab1"
+    assert ja4(hello, quic=True).startswith("q13d1516h2_")
+
+
+def test_server_hello():
+    hello = parse_server_hello(_server_hello(0x1301, [_extension(0x002b, b"\x03\x04"), _alpn("h2")])[4:])
+    assert (hello["cipher"], hello["selected_version"], hello["alpn"]) == (0x1301, 0x0304, ["h2"])
+
+
+def test_quic_initial_keys_known_answer():
+    # RFC 9001, appendix A.1
+    key, iv, hp = initial_keys(0x00000001, bytes.fromhex("8394c8f03e515708"))
+    assert (key.hex(), iv.hex(), hp.hex()) == (
+        "1f369613dd76d5467730efcbe3b1a22d", "fa044b2f42a3fd3b46fb255c", "9f50449e04a0e810283a1e9933adedd2")
+    key, iv, hp = initial_keys(0x00000001, bytes.fromhex("8394c8f03e515708"), server=True)
+    assert (key.hex(), iv.hex(), hp.hex()) == (
+        "cf3a5331653c364c88f0f379b6067e37", "0ac1493ca1905853b0bba03e", "c206b8d9b9f0f37644430b490eeaa314")
+
+
+# ---- the parser fed by the capture reader ----
+
+def _frame(src, dst, proto, transport):
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(transport), 0, 0, 64, proto, 0,
+                     socket.inet_aton(src[0]), socket.inet_aton(dst[0]))
+    return b"\x00" * 12 + b"\x08\x00" + ip + transport
+
+
+def _tcp(src, dst, payload, flags=0x18):
+    return _frame(src, dst, 6, struct.pack("!HHIIBBHHH", src[1], dst[1], 0, 0, 5 << 4, flags, 100, 0, 0) + payload)
+
+
+def _udp(src, dst, payload):
+    return _frame(src, dst, 17, struct.pack("!HHHH", src[1], dst[1], 8 + len(payload), 0) + payload)
+
+
+def _feed(decoder, ts, frame):
+    decoder.decode(LINKTYPE_ETHERNET, frame, 0, len(frame), ts, len(frame))
+
+
+def _record(message):
+    return b"\x16\x03\x01" + _vector(message)
+
+
+def test_tls_hello_split_over_segments():
+    parser = HandshakeParser(decrypt_quic=False)
+    decoder = FrameDecoder(parser)
+    record = _record(_ja4_hello())
+    _feed(decoder, 1.0, _tcp(CLIENT, SERVER, record[:40]))
+    assert (CLIENT + SERVER) in parser.pending
+    _feed(decoder, 1.1, _tcp(CLIENT, SERVER, record[40:]))
+    _feed(decoder, 1.2, _tcp(SERVER, CLIENT, _record(_server_hello(0x1301, [_extension(0x002b, b"\x03\x04")]))))
+    # Application data of a finished direction is not parsed again
+    _feed(decoder, 1.3, _tcp(CLIENT, SERVER, b"\x17\x03\x03" + _vector(b"\x00" * 50)))
+
+    [row] = parser.handshakes()
+    assert (row['CLIENT_IP'], row['CLIENT_PORT'], row['SERVER_IP'], row['SERVER_PORT']) == CLIENT + SERVER
+    assert (row['TRANSPORT'], row['TIME'], row['SNI'], row['ALPN']) == ("TLS", 1.1, "example.com", "h2,http/1.1")
+    assert (row['TLS_VERSION'], row['CIPHER']) == ("1.3", "0x1301")
+    assert row['JA4'] == "t13d1516h2_8daaf6152771_e5627efa2ab1"
+    assert not parser.pending and not parser.errors
+    assert set(parser.done) == {CLIENT + SERVER, SERVER + CLIENT}
+
+
+def test_state_is_forgotten_after_idle_timeout():
+    parser = HandshakeParser(decrypt_quic=False, idle_timeout=30.0)
+    decoder = FrameDecoder(parser)
+    record = _record(_ja4_hello())
+    _feed(decoder, 0.0, _tcp(CLIENT, SERVER, record[:40]))
+    other = ("10.0.0.3", 50001)
+    _feed(decoder, 10.0, _tcp(other, SERVER, b"\x17\x03\x03" + _vector(b"\x00" * 10)))
+    assert list(parser.pending) == [CLIENT + SERVER] and list(parser.done) == [other + SERVER]
+    _feed(decoder, 35.0, _tcp(other, SERVER, b"\x17\x03\x03" + _vector(b"\x00" * 10)))
+    assert not parser.pending and list(parser.done) == [other + SERVER]
+    _feed(decoder, 70.0, _tcp(SERVER, other, b"\x17\x03\x03" + _vector(b"\x00" * 10)))
+    assert list(parser.done) == [SERVER + other]
+
+
+def _protect_initial(version, dcid, keys, packet_number, payload):
+    """Build a QUIC Initial packet (4-byte packet number, no token) as in RFC 9001, section 5."""
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+    key, iv, hp = keys
+    pn = packet_number.to_bytes(4, "big")
+    length = len(pn) + len(payload) + 16
+    header = (bytes([0xC3]) + version.to_bytes(4, "big") + _vector(dcid, 1) + b"\x00" + b"\x00"
+              + (0x4000 | length).to_bytes(2, "big") + pn)
+    nonce = bytes(a ^ b for a, b in zip(iv, packet_number.to_bytes(12, "big")))
+    ciphertext = AESGCM(key).encrypt(nonce, payload, header)
+    encryptor = Cipher(algorithms.AES(hp), modes.ECB()).encryptor()
+    mask = encryptor.update(ciphertext[:16]) + encryptor.finalize()
+    pn_offset = len(header) - 4
+    protected = bytearray(header)
+    protected[0] ^= mask[0] & 0x0F
+    for i in range(4):
+        protected[pn_offset + i] ^= mask[1 + i]
+    return bytes(protected) + ciphertext
+
+
+def _crypto_frame(offset, data):
+    return b"\x06" + (0x4000 | offset).to_bytes(2, "big") + (0x4000 | len(data)).to_bytes(2, "big") + data
+
+
+@pytest.mark.skipif(not quic_decryption_available(), reason="needs the 'cryptography' package")
+def test_quic_hello_in_two_initials():
+    parser = HandshakeParser()
+    decoder = FrameDecoder(parser)
+    dcid = bytes.fromhex("8394c8f03e515708")
+    client_keys, server_keys = initial_keys(1, dcid), initial_keys(1, dcid, server=True)
+    hello = _ja4_hello()
+    # The second half of the CRYPTO stream arrives first
+    for pn, frame in ((1, _crypto_frame(60, hello[60:])), (0, _crypto_frame(0, hello[:60]))):
+        _feed(decoder, 1.0 + pn, _udp(CLIENT, SERVER, _protect_initial(1, dcid, client_keys, pn, frame + b"\x00" * 40)))
+    assert parser.quic
+    server_hello = _server_hello(0x1301, [_extension(0x002b, b"\x03\x04")])
+    _feed(decoder, 3.0, _udp(SERVER, CLIENT, _protect_initial(1, dcid, server_keys, 0, _crypto_frame(0, server_hello))))
+
+    [row] = parser.handshakes()
+    assert (row['TRANSPORT'], row['SNI'], row['TLS_VERSION']) == ("QUIC", "example.com", "1.3")
+    assert row['JA4'] == "q13d1516h2_8daaf6152771_e5627efa2ab1"
+    # The decryption state goes once both hellos are parsed
+    assert not parser.quic and not parser.errors
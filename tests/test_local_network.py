@@ -0,0 +1,23 @@
+import local_network
+from local_network import LocalNetwork
+
+
+def test_prefixes():
+    network = LocalNetwork(["192.168.1.0/24", "192.168.2.7", "2001:db8::/32"])
+    assert network.is_local("192.168.1.200") and network.is_local("192.168.2.7")
+    assert not network.is_local("192.168.2.8") and not network.is_local("10.0.0.1")
+    assert network.is_local("2001:db8::1") and not network.is_local("2001:db9::1")
+    assert network.is_local("::ffff:192.168.1.1")
+    assert not network.is_local("not an address") and not network.is_local(None)
+    assert network.direction("192.168.1.1") == "out" and network.direction("8.8.8.8") == "in"
+    assert network.direction(None) is None
+    assert network.local_mask(["192.168.1.1", "8.8.8.8"]).tolist() == [True, False]
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(local_network, "MAX_CACHED", 100)
+    network = LocalNetwork("10.0.0.0/8")
+    for i in range(1000):
+        assert network.is_local("10.0.%d.%d" % (i // 256, i % 256))
+        assert not network.is_local("172.16.%d.%d" % (i // 256, i % 256))
+    assert len(network._cache) <= 100
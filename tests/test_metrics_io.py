@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+import render_figures
+from analyze_traffic_1 import app_metrics, collect_app_data
+from analyze_traffic_2 import collect_results, csv_metrics
+from metrics_io import read_metrics, write_metrics
+from synthetic_data import write_capture_csv
+
+
+@pytest.fixture(scope="module")
+def pcap_metrics(capture):
+    return app_metrics(collect_app_data({"chrome": capture}, backend="native", timeline=True))
+
+
+@pytest.fixture(scope="module")
+def service_metrics(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("csv")
+    paths = {}
+    for seed, service in enumerate(("netflix", "zoom")):
+        paths[service] = str(directory / f"{service}.csv")
+        write_capture_csv(paths[service], 5_000, seed=seed)
+    return csv_metrics(collect_results(paths))
+
+
+def _as_json(metrics):
+    """The metrics as they come back from JSON (string keys, Python numbers)."""
+    return json.loads(json.dumps(metrics, default=lambda value: value.item()))
+
+
+@pytest.mark.parametrize("suffix", [".json", ".parquet"])
+def test_round_trip(pcap_metrics, service_metrics, tmp_path, suffix):
+    for metrics in (pcap_metrics, service_metrics):
+        path = str(tmp_path / ("metrics" + suffix))
+        write_metrics(metrics, path)
+        assert read_metrics(path) == _as_json(metrics)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_saved_metrics(pcap_metrics, service_metrics, tmp_path, workers):
+    # As render_figures.main: the figures are drawn from the metrics read back from disk
+    out_dir = str(tmp_path / "res")
+    for figures, metrics in ((render_figures.PCAP_FIGURES, pcap_metrics), (render_figures.CSV_FIGURES, service_metrics)):
+        path = str(tmp_path / "metrics.parquet")
+        write_metrics(metrics, path)
+        render_figures.render(figures, read_metrics(path), out_dir, workers)
+    figures = [name for name in os.listdir(out_dir) if name.endswith(".png")]
+    assert len(figures) == len(render_figures.PCAP_FIGURES) + len(render_figures.CSV_FIGURES)
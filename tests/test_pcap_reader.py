@@ -0,0 +1,110 @@
+import socket
+import struct
+
+import pytest
+
+from conftest import CAPTURE_PACKETS
+from pcap_reader import LINKTYPE_ETHERNET, FrameDecoder, iter_frames, iter_packets, split_capture
+
+
+def _frame(src, sport, dst, dport, flags, window_scale=None, window=100):
+    """Ethernet/IPv4/TCP frame, with a window scale option when 'window_scale' is given."""
+    options = b"" if window_scale is None else bytes([3, 3, window_scale, 0])
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, ((20 + len(options)) // 4) << 4, flags, window, 0, 0) + options
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     socket.inet_aton(src), socket.inet_aton(dst))
+    return b"\x00" * 12 + b"\x08\x00" + ip + tcp
+
+
+def _decode(decoder, frame):
+    return decoder.decode(LINKTYPE_ETHERNET, frame, 0, len(frame), 0.0, len(frame))
+
+
+def _write_pcap(path, capture):
+    """Rewrite a pcapng capture as classic pcap with the same frames and microsecond timestamps."""
+    with open(capture, "rb") as f:
+        buf = f.read()
+    out = [struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET)]
+    for _, ts, off, caplen, origlen in iter_frames(buf):
+        micros = round(ts * 1_000_000)
+        out.append(struct.pack("<IIII", micros // 1_000_000, micros % 1_000_000, caplen, origlen))
+        out.append(buf[off:off + caplen])
+    with open(path, "wb") as f:
+        f.write(b"".join(out))
+
+
+def test_reads_every_packet(capture):
+    packets = list(iter_packets(capture))
+    assert len(packets) == CAPTURE_PACKETS
+    timestamps = [p.timestamp for p in packets]
+    assert timestamps == sorted(timestamps)
+    assert {p.protocol for p in packets} == {"TCP", "TLS", "UDP", "QUIC"}
+    assert all(p.ip_version == 4 and p.ttl is not None for p in packets)
+    assert all((p.tcp_flags is not None) == (p.transport == "TCP") for p in packets)
+
+
+def test_classic_pcap_matches_pcapng(capture, tmp_path):
+    pcap = str(tmp_path / "synthetic.pcap")
+    _write_pcap(pcap, capture)
+    for a, b in zip(iter_packets(capture), iter_packets(pcap), strict=True):
+        assert a.timestamp == pytest.approx(b.timestamp, abs=1e-6)
+        assert a._replace(timestamp=None) == b._replace(timestamp=None)
+
+
+@pytest.mark.parametrize("parts", [2, 3, 7])
+def test_byte_ranges_cover_the_capture(capture, parts):
+    ranges = split_capture(capture, parts)
+    assert 1 < len(ranges) <= parts
+    assert all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+    pieces = [p for byte_range in ranges for p in iter_packets(capture, byte_range)]
+    assert pieces == list(iter_packets(capture))
+
+
+def test_window_scaling_needs_both_sides():
+    decoder = FrameDecoder()
+    _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x02, window_scale=7))
+    assert _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x10)).tcp_window_size == 100
+    _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", 1000, 0x12, window_scale=8))
+    assert _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x10)).tcp_window_size == 100 << 7
+    assert _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", 1000, 0x10)).tcp_window_size == 100 << 8
+
+
+def _handshake(decoder, sport):
+    _decode(decoder, _frame("10.0.0.1", sport, "10.0.0.2", 443, 0x02, window_scale=7))
+    _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", sport, 0x12, window_scale=8))
+
+
+def test_window_scales_are_forgotten_when_connections_end():
+    decoder = FrameDecoder()
+    _handshake(decoder, 1000)
+    _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x11))
+    assert len(decoder.window_scales) == 2
+    # The peer keeps sending after a half-close, with its scaled window
+    assert _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", 1000, 0x10)).tcp_window_size == 100 << 8
+    _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", 1000, 0x11))
+    assert decoder.window_scales == {} and decoder.fins == set()
+
+    _handshake(decoder, 1001)
+    _decode(decoder, _frame("10.0.0.2", 443, "10.0.0.1", 1001, 0x14))
+    assert decoder.window_scales == {} and decoder.fins == set()
+
+
+def test_new_syn_clears_fin_state():
+    decoder = FrameDecoder()
+    _handshake(decoder, 1000)
+    _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x11))
+    assert decoder.fins
+    # The 4-tuple is reused by a connection without window scaling
+    _decode(decoder, _frame("10.0.0.1", 1000, "10.0.0.2", 443, 0x02))
+    assert not decoder.fins
+
+
+def test_window_scale_table_is_bounded(monkeypatch):
+    import pcap_reader
+
+    monkeypatch.setattr(pcap_reader, "MAX_WINDOW_SCALES", 10)
+    decoder = FrameDecoder()
+    for port in range(100):
+        _decode(decoder, _frame("10.0.0.1", 2000 + port, "10.0.0.2", 443, 0x02, window_scale=7))
+    assert len(decoder.window_scales) == 10
+    assert ("10.0.0.1", 2099, "10.0.0.2", 443) in decoder.window_scales
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from packet_table import inter_arrival_stats
+from streaming_stats import (
+    CountMinSketch, HeavyHitters, InterArrivalTracker, IntervalStats, P2Quantile, RunningStats, SpaceSaving,
+)
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(3).exponential(0.01, 5000)
+
+
+def test_running_stats_match_numpy(values):
+    one_by_one = RunningStats()
+    for value in values:
+        one_by_one.append(value)
+    batched = RunningStats()
+    for chunk in np.array_split(values, 7):
+        batched.extend(chunk)
+    merged = RunningStats().merge(RunningStats()).merge(batched)
+    for stats in (one_by_one, batched, merged):
+        assert stats.count == len(values)
+        assert stats.mean() == pytest.approx(values.mean(), rel=1e-12)
+        assert stats.std() == pytest.approx(values.std(), rel=1e-9)
+        assert stats.sum() == pytest.approx(values.sum(), rel=1e-12)
+        assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+def test_empty_running_stats():
+    stats = RunningStats()
+    assert not stats and stats.mean() == 0 and stats.variance() == 0
+
+
+def test_p2_quantile_is_exact_for_short_streams(values):
+    quantile = P2Quantile(0.75)
+    for value in values[:20]:
+        quantile.append(value)
+    assert quantile.value() == pytest.approx(np.percentile(values[:20], 75))
+
+
+@pytest.mark.parametrize("p", [0.25, 0.5, 0.75])
+def test_p2_quantile_estimates(values, p):
+    quantile = P2Quantile(p)
+    halves = [P2Quantile(p), P2Quantile(p)]
+    for i, value in enumerate(values):
+        quantile.append(value)
+        halves[i * 2 // len(values)].append(value)
+    exact = np.percentile(values, p * 100)
+    assert quantile.value() == pytest.approx(exact, rel=0.05)
+    assert halves[0].merge(halves[1]).value() == pytest.approx(exact, rel=0.05)
+
+
+def test_inter_arrival_tracker_matches_exact(values):
+    timestamps = 1.7e9 + np.cumsum(values)
+    mean, duration = inter_arrival_stats(timestamps)
+
+    # Slightly out of order packets are put back in order by the reorder window
+    shuffled = timestamps.copy()
+    for i in range(0, len(shuffled) - 4, 5):
+        shuffled[i:i + 4] = shuffled[i:i + 4][::-1]
+    tracker = InterArrivalTracker()
+    for timestamp in shuffled:
+        tracker.append(timestamp)
+    assert tracker.mean() == pytest.approx(mean, rel=1e-9)
+    assert tracker.duration() == pytest.approx(duration, rel=1e-12)
+    assert tracker.late_packets == 0
+
+    first, second = InterArrivalTracker(), InterArrivalTracker()
+    for timestamp in timestamps[:1000]:
+        first.append(timestamp)
+    for timestamp in timestamps[1000:]:
+        second.append(timestamp)
+    merged = first.merge(second)
+    assert len(merged) == len(timestamps)
+    assert merged.mean() == pytest.approx(mean, rel=1e-9)
+
+
+def test_interval_features_are_scaled():
+    stats = IntervalStats()
+    for value in [0.001, 0.002, 0.003, 0.004]:
+        stats.append(value)
+    features = stats.features(scale=1000)
+    assert features["INTERVALS_MEAN"] == pytest.approx(2.5)
+    assert features["INTERVALS_MAX"] == pytest.approx(4)
+    assert features["INTERVALS_50"] == pytest.approx(2.5)
+
+
+# ---- heavy hitters ----
+
+@pytest.fixture
+def stream():
+    """A skewed stream of 100k port numbers (a few very frequent ones and a long tail)."""
+    return np.random.default_rng(4).zipf(1.3, 100_000) % 50_000
+
+
+def _chunk_counts(stream, chunks=10):
+    for chunk in np.array_split(stream, chunks):
+        items, counts = np.unique(chunk, return_counts=True)
+        yield items, counts
+
+
+def test_count_min_never_under_counts(stream):
+    sketch = CountMinSketch(width=512)
+    for items, counts in _chunk_counts(stream):
+        sketch.add(items, counts)
+    items, counts = np.unique(stream, return_counts=True)
+    estimates = sketch.estimate(items)
+    assert sketch.total == len(stream)
+    assert (estimates >= counts).all()
+    assert (estimates - counts).max() <= 3 * len(stream) / 512
+
+
+def test_count_min_merge(stream):
+    whole, first, second = CountMinSketch(), CountMinSketch(), CountMinSketch()
+    half = len(stream) // 2
+    for sketch, part in ((whole, stream), (first, stream[:half]), (second, stream[half:])):
+        items, counts = np.unique(part, return_counts=True)
+        sketch.add(items, counts)
+    first.merge(second)
+    assert (first.table == whole.table).all() and first.total == whole.total
+    with pytest.raises(ValueError):
+        first.merge(CountMinSketch(seed=1))
+
+
+def test_space_saving_bounds(stream):
+    summary = SpaceSaving(k=50)
+    for items, counts in _chunk_counts(stream):
+        summary.add(items.tolist(), counts)
+    items, counts = np.unique(stream, return_counts=True)
+    exact = dict(zip(items.tolist(), counts.tolist()))
+    for item, upper, lower in summary.top():
+        assert lower <= exact[item] <= upper
+    untracked = set(exact) - set(summary.counts)
+    assert max(exact[item] for item in untracked) <= summary.dropped
+
+
+def test_space_saving_is_exact_for_few_items():
+    summary = SpaceSaving(k=10)
+    summary.add(["a", "b"], [3, 1])
+    summary.merge(SpaceSaving(k=10).add(["b", "c"], [4, 2]))
+    assert summary.top() == [("b", 5, 5), ("a", 3, 3), ("c", 2, 2)]
+    assert summary.dropped == 0
+
+
+def test_heavy_hitters_top_matches_exact(stream):
+    # Two workers with half of the chunks each, merged
+    first, second = HeavyHitters(k=200), HeavyHitters(k=200)
+    for i, (items, counts) in enumerate(_chunk_counts(stream)):
+        (first if i % 2 else second).add(items.tolist(), counts)
+    first.merge(second)
+    items, counts = np.unique(stream, return_counts=True)
+    order = np.argsort(-counts, kind="stable")[:10]
+    top = first.top(10)
+    assert set(top) == set(items[order].tolist())
+    assert all(top[item] == count for item, count in zip(items[order].tolist(), counts[order].tolist()))
+    assert first.total() == len(stream)
+
+
+def test_heavy_hitters_add_values_skips_unused_categories():
+    values = pd.Categorical(["x", "y", "x", None], categories=["x", "y", "z"])
+    hitters = HeavyHitters().add_values(values)
+    assert hitters.top() == {"x": 2, "y": 1}
+    assert hitters.estimate("z") == 0
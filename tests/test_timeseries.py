@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+import timeseries
+from conftest import CAPTURE_PACKETS
+from local_network import my_local_ip
+from timeseries import IAT_BINS, IAT_EDGES, LEVELS, Timeline, capture_timeline
+
+START = 1_700_000_000.0
+
+
+@pytest.fixture(scope="module")
+def packets():
+    """Timestamps over about 3 minutes (with bursts), lengths and directions of 20k packets."""
+    rng = np.random.default_rng(6)
+    gaps = rng.exponential(0.01, 20_000) * rng.choice([0.1, 1.0, 5.0], 20_000)
+    timestamps = START + 0.37 + np.cumsum(gaps)
+    lengths = rng.integers(60, 1500, 20_000)
+    directions = rng.choice(np.array([1, -1, 0], dtype=np.int8), 20_000)
+    return timestamps, lengths, directions
+
+
+@pytest.fixture(scope="module")
+def whole(packets):
+    return Timeline().add(*packets)
+
+
+def _assert_same(timeline, other):
+    for resolution in LEVELS:
+        assert timeline.series(resolution).equals(other.series(resolution))
+    assert (timeline.iat_histogram(1.0) == other.iat_histogram(1.0)).all()
+
+
+@pytest.mark.parametrize("resolution", LEVELS)
+def test_counts_match_bincount(packets, whole, resolution):
+    timestamps, lengths, directions = packets
+    df = whole.series(resolution)
+    bins = np.floor(timestamps / resolution).astype(np.int64)
+    first = int(round(df.index[0] / resolution))
+    local = bins - first
+    assert df.index[0] <= timestamps[0] and df.index[-1] + resolution > timestamps[-1]
+    assert (df["packets"].to_numpy()[:local[-1] + 1] == np.bincount(local)).all()
+    assert (df["bytes"].to_numpy()[:local[-1] + 1] == np.bincount(local, weights=lengths)).all()
+    out = directions == 1
+    assert (df["bytes_out"].to_numpy()[:local[-1] + 1] == np.bincount(local[out], weights=lengths[out],
+                                                                      minlength=local[-1] + 1)).all()
+    assert df["packets"].sum() == len(timestamps)
+    assert (df["bits_per_second"] == df["bytes"] * 8 / resolution).all()
+
+
+def test_iat_histogram(packets, whole):
+    timestamps = packets[0]
+    expected = np.bincount(np.searchsorted(IAT_EDGES, np.diff(timestamps), side="right"), minlength=IAT_BINS)
+    assert (whole.iat_histogram() == expected).all()
+    per_second = whole.iat_histogram(1.0)
+    assert len(per_second) == len(whole.series(1.0))
+    assert (per_second.sum(axis=0) == expected).all()
+
+
+def test_chunks_match_whole(packets, whole):
+    timeline = Timeline()
+    chunks = [np.array_split(column, 7) for column in packets]
+    for timestamps, lengths, directions in zip(*chunks):
+        timeline.add(timestamps, lengths, directions)
+    _assert_same(timeline, whole)
+
+
+def test_unsorted_and_unknown_values(packets, whole):
+    timestamps, lengths, directions = packets
+    order = np.random.default_rng(7).permutation(len(timestamps))
+    timeline = Timeline().add(np.append(timestamps[order], np.nan), np.append(lengths[order], 100),
+                              np.append(directions[order], 0))
+    for resolution in LEVELS:
+        assert timeline.series(resolution).equals(whole.series(resolution))
+
+
+def test_merge(packets, whole):
+    half = len(packets[0]) // 2
+    first = Timeline().add(*(column[:half] for column in packets))
+    second = Timeline().add(*(column[half:] for column in packets))
+    merged = first.merge(second)
+    for resolution in LEVELS:
+        assert merged.series(resolution).equals(whole.series(resolution))
+    # The gap between the two halves is in neither
+    assert merged.iat_histogram().sum() == whole.iat_histogram().sum() - 1
+    with pytest.raises(ValueError):
+        merged.merge(Timeline(levels=(0.1, 1.0)))
+
+
+def test_save_and_load(whole, tmp_path):
+    path = str(tmp_path / "capture.timeline.npz")
+    whole.save(path)
+    loaded = Timeline.load(path)
+    _assert_same(loaded, whole)
+    assert loaded.summary() == whole.summary()
+
+    # Without the finest bins the stored levels are still queried, but not extended
+    whole.save(path, resolutions=(1.0, 60.0))
+    partial = Timeline.load(path)
+    assert partial.resolutions() == [1.0, 60.0]
+    assert partial.series(60.0).equals(whole.series(60.0))
+    with pytest.raises(ValueError):
+        partial.series(0.01)
+    with pytest.raises(ValueError):
+        partial.add([START], [100])
+
+
+def test_window_and_outliers(monkeypatch):
+    monkeypatch.setattr(timeseries, "MAX_BINS", 60_000)
+    timeline = Timeline()
+    # A zero timestamp and one far in the future around packets of one minute
+    timeline.add([0.0, START, START + 30, START + 60], [100, 100, 100, 100])
+    timeline.add([START + 1e6], [100])
+    assert timeline.outliers == 2
+    assert timeline.series(60.0)["packets"].sum() == 3
+    assert timeline.counts.shape[1] <= 60_000
+    assert timeline.summary()["outliers"] == 2
+
+
+def test_capture_timeline(capture):
+    timeline = capture_timeline(capture, my_local_ip)
+    df = timeline.series(1.0)
+    assert df["packets"].sum() == CAPTURE_PACKETS
+    assert (df["packets_out"] + df["packets_in"] == df["packets"]).all()
+    assert df["packets_out"].sum() and df["packets_in"].sum()
+    assert timeline.iat_histogram().sum() == CAPTURE_PACKETS - 1
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import tree_ensemble
+from synthetic_data import write_flow_dataset
+from traffic_classifier import (
+    FLAT_MAX_ROWS, feature_matrix, flat_max_rows, load_dataset, load_model, predict, save_model, train_model,
+)
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("flows") / "traffic_dataset.csv")
+    write_flow_dataset(path, 3_000, seed=5)
+    return load_dataset(path)
+
+
+@pytest.fixture(scope="module", params=["Random Forest", "XGBoost Classifier"])
+def artifact(request, dataset):
+    return train_model(dataset, request.param)
+
+
+@pytest.fixture(scope="module")
+def X(artifact, dataset):
+    return artifact["scaler"].transform(feature_matrix(dataset))
+
+
+def test_flat_model_matches_the_model(artifact, X):
+    mismatches, difference = tree_ensemble.verify(artifact["model"], artifact["flat_model"], X)
+    assert mismatches == 0
+    assert difference < 1e-5
+
+
+def test_predict_one_matches_predict(artifact, X):
+    flat = artifact["flat_model"]
+    rows = X[:50]
+    assert [flat.predict_one(row) for row in rows] == flat.predict(rows).tolist()
+    assert np.allclose([flat.predict_proba(row.reshape(1, -1))[0] for row in rows], flat.predict_proba(rows))
+
+
+def test_flat_max_rows_is_stored(artifact):
+    assert 0 <= artifact["flat_max_rows"] <= FLAT_MAX_ROWS
+    assert flat_max_rows(artifact) == artifact["flat_max_rows"]
+    assert flat_max_rows({"model": artifact["model"]}) == 0
+
+
+def test_saved_artifact_predicts_the_same(artifact, dataset, tmp_path):
+    path = str(tmp_path / "traffic_model.joblib")
+    save_model(artifact, path)
+    loaded = load_model(path)
+    # Small batches go through the flattened model, large ones through the model itself
+    for rows in (dataset.head(1), dataset.head(FLAT_MAX_ROWS), dataset):
+        assert (predict(loaded, rows) == predict(artifact, rows)).all()
+    one = dataset.head(1)
+    expected = artifact["label_mapping_inv"][int(artifact["model"].predict(artifact["scaler"].transform(feature_matrix(one)))[0])]
+    assert predict(loaded, one)[0] == expected